@@ -13,19 +13,20 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import pbr.version
+"""The OpenStack Identity client library.
 
-from keystoneclient import access
-from keystoneclient import client
-from keystoneclient import exceptions
-from keystoneclient import generic
-from keystoneclient import httpclient
-from keystoneclient import service_catalog
-from keystoneclient import v2_0
-from keystoneclient import v3
+The modules and subpackages listed in __all__, and __version__, are imported
+when they are first used so that importing keystoneclient is fast.
+"""
 
+from keystoneclient import _lazy
+
+
+def _get_version():
+    import pbr.version
+
+    return pbr.version.VersionInfo('python-keystoneclient').version_string()
 
-__version__ = pbr.version.VersionInfo('python-keystoneclient').version_string()
 
 __all__ = [
     # Modules
@@ -40,3 +41,8 @@ __all__ = [
     'httpclient',
     'service_catalog',
 ]
+
+_attributes = dict((name, 'keystoneclient.%s' % name) for name in __all__)
+_attributes['__version__'] = _get_version
+
+_lazy.install(__name__, _attributes)
@@ -0,0 +1,136 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Encode and decode JSON with the fastest implementation available.
+
+Tokens, catalogs and cache entries are encoded and decoded on every request,
+so this uses the first of these that is installed:
+
+* ``orjson``
+* ``ujson``, which is only used to decode.
+* ``simplejson``, if its C speedups are available. It is only used to decode.
+* ``json`` from the standard library, through jsonutils.
+
+loads() accepts the bytes of a response body as well as text, so responses
+don't have to be decoded, and their character set detected, first. Values
+that the faster implementations can't decode are decoded by jsonutils.
+
+dumps() returns text of ASCII characters, as jsonutils does. Anything other
+than the plain types that JSON can represent is converted with
+jsonutils.to_primitive, and values that aren't ASCII or that need options
+such as sort_keys are encoded by jsonutils.
+"""
+
+from keystoneclient.openstack.common import jsonutils
+
+
+def _orjson():
+    import orjson
+
+    # datetimes are converted by to_primitive, as jsonutils does.
+    option = orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(value):
+        data = orjson.dumps(value, default=jsonutils.to_primitive,
+                            option=option)
+        # orjson doesn't escape other characters.
+        if not data.isascii():
+            return None
+        return data.decode('ascii')
+
+    return orjson.loads, dumps
+
+
+def _ujson():
+    import ujson
+    return ujson.loads, None
+
+
+def _simplejson():
+    import simplejson
+    import simplejson.scanner
+
+    if simplejson.scanner.c_make_scanner is None:
+        raise ImportError('simplejson speedups are not available')
+    return simplejson.loads, None
+
+
+def _json():
+    return jsonutils.loads, None
+
+
+# the implementations in order of preference.
+BACKENDS = [('orjson', _orjson),
+            ('ujson', _ujson),
+            ('simplejson', _simplejson),
+            ('json', _json)]
+
+backend = None
+_loads = None
+_dumps = None
+
+
+def use(name=None):
+    """Select the implementation to use.
+
+    :param string name: The name of one of BACKENDS, or None to use the
+                        first that is available.
+    :raises ImportError: if the implementation isn't available.
+    :raises ValueError: if name isn't one of BACKENDS.
+    """
+    global backend, _loads, _dumps
+
+    for backend_name, load in BACKENDS:
+        if name is None or name == backend_name:
+            try:
+                _loads, _dumps = load()
+            except ImportError:
+                if name is not None:
+                    raise
+                continue
+
+            backend = backend_name
+            return
+
+    raise ValueError('Unknown JSON backend: %s' % name)
+
+
+def loads(s):
+    """Decode a JSON document given as text or UTF-8 encoded bytes."""
+    try:
+        return _loads(s)
+    except ValueError:
+        if _loads is jsonutils.loads:
+            raise
+        # documents the standard library accepts, such as very large
+        # integers, or that are invalid anyway.
+        return jsonutils.loads(s)
+
+
+def dumps(value, **kwargs):
+    """Encode a value as JSON text.
+
+    :param kwargs: Options of json.dumps, such as sort_keys.
+    """
+    if _dumps is not None and not kwargs:
+        try:
+            data = _dumps(value)
+        except (TypeError, ValueError, OverflowError):
+            data = None
+
+        if data is not None:
+            return data
+
+    return jsonutils.dumps(value, **kwargs)
+
+
+use()
@@ -0,0 +1,105 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Import the parts of keystoneclient that are used, when they are used.
+
+Importing every client, manager and their dependencies makes short lived
+processes such as the keystone command slow to start. Packages install a
+LazyModule so that their public attributes are imported on first access,
+and clients declare their managers with LazyManager.
+
+Targets are given as ``'module'`` or ``'module:attribute'`` strings.
+"""
+
+import sys
+import types
+
+
+def _resolve(target):
+    module_name, _sep, attr = target.partition(':')
+    __import__(module_name)
+    value = sys.modules[module_name]
+    if attr:
+        value = getattr(value, attr)
+    return value
+
+
+class LazyModule(types.ModuleType):
+    """A module whose attributes are resolved when first accessed.
+
+    Install it with :py:func:`install` rather than constructing it.
+    """
+
+    def __getattr__(self, name):
+        try:
+            target = self._lazy_attributes[name]
+        except KeyError:
+            raise AttributeError("'module' object has no attribute '%s'" %
+                                 name)
+
+        value = target() if callable(target) else _resolve(target)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(self._lazy_attributes))
+
+
+def install(name, attributes):
+    """Replace the module called name with a LazyModule.
+
+    This is called at the end of the module that is replaced.
+
+    :param string name: The name of the module, ie __name__.
+    :param dict attributes: A map of attribute name to its target, or to a
+                            function that returns its value.
+    """
+    module = sys.modules[name]
+
+    lazy = LazyModule(name, module.__doc__)
+    lazy.__dict__.update(module.__dict__)
+    lazy._lazy_attributes = attributes
+    # the globals of a module are cleared when it is garbage collected on
+    # python 2, keep the original alive for the functions defined in it.
+    lazy._lazy_module = module
+
+    sys.modules[name] = lazy
+
+
+class LazyManager(object):
+    """A manager of a client that is created when first accessed.
+
+    :param string target: The manager class, or a function that takes the
+                          client and returns the manager.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self._name = None
+
+    def _find_name(self, owner):
+        for cls in owner.__mro__:
+            for name, value in vars(cls).items():
+                if value is self:
+                    return name
+
+    def __get__(self, client, owner):
+        if client is None:
+            return self
+
+        if self._name is None:
+            self._name = self._find_name(owner)
+
+        manager = _resolve(self.target)(client)
+        # the manager is found on the instance from now on.
+        client.__dict__[self._name] = manager
+        return manager
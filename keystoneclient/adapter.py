@@ -26,7 +26,7 @@ class Adapter(object):
     @utils.positional()
     def __init__(self, session, service_type=None, service_name=None,
                  interface=None, region_name=None, auth=None,
-                 user_agent=None):
+                 user_agent=None, retry_policy=None, endpoint_selector=None):
         """Create a new adapter.
 
         :param Session session: The session object to wrap.
@@ -37,6 +37,14 @@ class Adapter(object):
         :param auth.BaseAuthPlugin auth: An auth plugin to use instead of the
                                          session one.
         :param str user_agent: The User-Agent string to set.
+        :param retry_policy: The policy used to retry requests instead of the
+                             session one.
+        :type retry_policy: :py:class:`keystoneclient.retry.RetryPolicy`
+        :param endpoint_selector: The selector used to choose between
+                                  matching endpoints instead of the session
+                                  one.
+        :type endpoint_selector:
+            :py:class:`keystoneclient.endpoint_selection.EndpointSelector`
         """
 
         self.session = session
@@ -46,6 +54,8 @@ class Adapter(object):
         self.region_name = region_name
         self.user_agent = user_agent
         self.auth = auth
+        self.retry_policy = retry_policy
+        self.endpoint_selector = endpoint_selector
 
     def request(self, url, method, **kwargs):
         endpoint_filter = kwargs.setdefault('endpoint_filter', {})
@@ -63,6 +73,10 @@ class Adapter(object):
             kwargs.setdefault('auth', self.auth)
         if self.user_agent:
             kwargs.setdefault('user_agent', self.user_agent)
+        if self.retry_policy:
+            kwargs.setdefault('retry_policy', self.retry_policy)
+        if self.endpoint_selector:
+            kwargs.setdefault('endpoint_selector', self.endpoint_selector)
 
         return self.session.request(url, method, **kwargs)
 
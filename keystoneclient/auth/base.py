@@ -56,6 +56,23 @@ class BaseAuthPlugin(object):
                          required service or None if not available.
         """
 
+    def get_endpoints(self, session, **kwargs):
+        """Return every endpoint for the client that matches kwargs.
+
+        This is used to choose between endpoints, for example with an
+        endpoint selector on the session. The keyword arguments are the same
+        as for ``get_endpoint``. The default implementation returns the
+        endpoint from ``get_endpoint``.
+
+        :param Session session: The session object that the auth_plugin
+                                belongs to.
+
+        :returns list: The base URLs that could be used to talk to the
+                       required service, empty if none are available.
+        """
+        endpoint = self.get_endpoint(session, **kwargs)
+        return [endpoint] if endpoint else []
+
     def invalidate(self):
         """Invalidate the current authentication data.
 
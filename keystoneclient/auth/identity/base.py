@@ -12,6 +12,8 @@
 
 import abc
 import logging
+import threading
+import time
 
 import six
 
@@ -28,19 +30,54 @@ class BaseIdentityPlugin(base.BaseAuthPlugin):
     # we count a token as valid if it is valid for at least this many seconds
     MIN_TOKEN_LIFE_SECONDS = 1
 
+    # seconds between attempts to renew a token early, so that a failing
+    # identity server isn't asked for a token on every request.
+    REFRESH_RETRY_DELAY = 10
+
+    # seconds that an endpoint whose discovery failed is used as its own
+    # versioned URL before discovery is tried again, so that an unreachable
+    # endpoint doesn't delay every request.
+    DISCOVERY_RETRY_DELAY = 60
+
+    # attributes that identify the token that is fetched.
+    _CACHE_ID_ATTRIBUTES = ('auth_url', 'username', 'token', 'trust_id')
+
     def __init__(self,
                  auth_url=None,
                  username=None,
                  password=None,
                  token=None,
-                 trust_id=None):
-
+                 trust_id=None,
+                 refresh_lead_time=0,
+                 background_refresh=False,
+                 token_cache=None):
+        """Construct an identity plugin.
+
+        :param string auth_url: Identity service endpoint for authorization.
+        :param int refresh_lead_time: Renew the token when it expires within
+                                      this many seconds, while it can still
+                                      be used. 0 to renew it only once it has
+                                      expired. (optional, default 0)
+        :param bool background_refresh: Renew the token early in a separate
+                                        thread, so that no request waits for
+                                        it. (optional, default False)
+        :param token_cache: A keystoneclient.token_cache.FileTokenCache to
+                            share tokens with other processes. (optional)
+        """
         super(BaseIdentityPlugin, self).__init__()
 
         self.auth_url = auth_url
         self.auth_ref = None
+        self.refresh_lead_time = refresh_lead_time
+        self.background_refresh = background_refresh
+        self.token_cache = token_cache
+
+        self._refresh_lock = threading.Lock()
+        self._refresh_not_before = 0
 
         self._endpoint_cache = {}
+        # the URLs whose discovery failed and when to try them again.
+        self._discovery_failures = {}
 
         # NOTE(jamielennox): DEPRECATED. The following should not really be set
         # here but handled by the individual auth plugin.
@@ -84,20 +121,111 @@ class BaseIdentityPlugin(base.BaseAuthPlugin):
         """Fetch or return a current AccessInfo object.
 
         If a valid AccessInfo is present then it is returned otherwise a new
-        one will be fetched.
+        one will be fetched. Only one thread fetches a new AccessInfo at a
+        time, the others wait for it.
+
+        If the AccessInfo expires within refresh_lead_time a new one is
+        fetched early by a single caller, or in a background thread if
+        background_refresh is set, while the current one is returned to
+        everyone else.
 
         :raises HttpError: An error from an invalid HTTP response.
 
         :returns AccessInfo: Valid AccessInfo
         """
-        if (not self.auth_ref or
-                self.auth_ref.will_expire_soon(self.MIN_TOKEN_LIFE_SECONDS)):
-            self.auth_ref = self.get_auth_ref(session)
+        auth_ref = self.auth_ref
+
+        if (auth_ref and
+                not auth_ref.will_expire_soon(self.MIN_TOKEN_LIFE_SECONDS)):
+            if (self.refresh_lead_time and
+                    auth_ref.will_expire_soon(self.refresh_lead_time) and
+                    time.time() >= self._refresh_not_before):
+                self._refresh_early(session)
+
+            return self.auth_ref
+
+        with self._refresh_lock:
+            # another thread may have fetched a token while we waited.
+            auth_ref = self.auth_ref
+            if (not auth_ref or
+                    auth_ref.will_expire_soon(self.MIN_TOKEN_LIFE_SECONDS)):
+                self.auth_ref = self._get_new_auth_ref(session)
+
+            return self.auth_ref
+
+    def _get_new_auth_ref(self, session):
+        if not self.token_cache:
+            return self.get_auth_ref(session)
+
+        # a token from the cache must be valid for as long as one we keep.
+        stale_duration = max(self.MIN_TOKEN_LIFE_SECONDS,
+                             self.refresh_lead_time)
+        key = self.token_cache.make_key(**self.get_cache_id_elements())
+
+        # another process may have fetched a token while we waited.
+        with self.token_cache.lock(key):
+            auth_ref = self.token_cache.get(key, stale_duration)
+            if auth_ref is None:
+                auth_ref = self.get_auth_ref(session)
+                self.token_cache.set(key, auth_ref)
+
+        return auth_ref
+
+    def get_cache_id_elements(self):
+        """Return the parameters that identify the token this plugin fetches.
+
+        Tokens are stored in a token cache under a hash of these parameters,
+        the attributes named by _CACHE_ID_ATTRIBUTES. The password is not
+        included.
+
+        :return dict: The parameters of the plugin.
+        """
+        elements = {'plugin': '%s.%s' % (type(self).__module__,
+                                         type(self).__name__)}
+
+        for name in self._CACHE_ID_ATTRIBUTES:
+            elements[name] = getattr(self, name, None)
 
-        return self.auth_ref
+        return elements
+
+    def _refresh_early(self, session):
+        # if another thread is already renewing the token there is nothing
+        # to do, the current token is still valid.
+        if not self._refresh_lock.acquire(False):
+            return
+
+        if self.background_refresh:
+            t = threading.Thread(target=self._refresh_locked, args=(session,))
+            t.daemon = True
+            t.start()
+        else:
+            self._refresh_locked(session)
+
+    def _refresh_locked(self, session):
+        try:
+            self._refresh_not_before = time.time() + self.REFRESH_RETRY_DELAY
+
+            auth_ref = self.auth_ref
+            if (auth_ref and
+                    not auth_ref.will_expire_soon(self.refresh_lead_time)):
+                # renewed by another thread since the caller checked.
+                return
+
+            self.auth_ref = self._get_new_auth_ref(session)
+        except Exception:
+            # the current token can still be used until renewal succeeds.
+            LOG.warning('Failed to renew token, will retry', exc_info=True)
+        finally:
+            self._refresh_lock.release()
 
     def invalidate(self):
         self.auth_ref = None
+
+        # the token was rejected, don't let another process load it.
+        if self.token_cache:
+            key = self.token_cache.make_key(**self.get_cache_id_elements())
+            self.token_cache.delete(key)
+
         return True
 
     def get_endpoint(self, session, service_type=None, interface=None,
@@ -146,6 +274,37 @@ class BaseIdentityPlugin(base.BaseAuthPlugin):
             # defaulting to the most recent version.
             return sc_url
 
+        return self._get_versioned_url(session, sc_url, version)
+
+    def get_endpoints(self, session, service_type=None, interface=None,
+                      region_name=None, service_name=None, version=None,
+                      **kwargs):
+        """Return every endpoint in the catalog that matches the filter.
+
+        The arguments are the same as for :py:meth:`get_endpoint`.
+
+        :raises HttpError: An error from an invalid HTTP response.
+
+        :return list: The endpoint URLs in the order the catalog lists them.
+        """
+        if not service_type:
+            return []
+
+        service_catalog = self.get_access(session).service_catalog
+        sc_urls = service_catalog.get_urls(service_type=service_type,
+                                           endpoint_type=interface or 'public',
+                                           region_name=region_name,
+                                           service_name=service_name) or []
+
+        urls = []
+        for sc_url in sc_urls:
+            if version:
+                sc_url = self._get_versioned_url(session, sc_url, version)
+            if sc_url and sc_url not in urls:
+                urls.append(sc_url)
+        return urls
+
+    def _get_versioned_url(self, session, sc_url, version):
         disc = None
 
         # NOTE(jamielennox): we want to cache endpoints on the session as well
@@ -165,6 +324,9 @@ class BaseIdentityPlugin(base.BaseAuthPlugin):
             if disc:
                 break
         else:
+            if time.time() < self._discovery_failures.get(sc_url, 0):
+                return sc_url
+
             try:
                 disc = _discover.Discover(session, sc_url)
             except (exceptions.HTTPError, exceptions.ConnectionError):
@@ -172,6 +334,8 @@ class BaseIdentityPlugin(base.BaseAuthPlugin):
                          'Fallback to using that endpoint as the '
                          'base url.', sc_url)
 
+                self._discovery_failures[sc_url] = (
+                    time.time() + self.DISCOVERY_RETRY_DELAY)
                 return sc_url
             else:
                 self._endpoint_cache[sc_url] = disc
@@ -23,19 +23,34 @@ from keystoneclient import utils
 @six.add_metaclass(abc.ABCMeta)
 class Auth(base.BaseIdentityPlugin):
 
+    _CACHE_ID_ATTRIBUTES = base.BaseIdentityPlugin._CACHE_ID_ATTRIBUTES + (
+        'tenant_id', 'tenant_name')
+
     @utils.positional()
     def __init__(self, auth_url,
                  trust_id=None,
                  tenant_id=None,
-                 tenant_name=None):
+                 tenant_name=None,
+                 refresh_lead_time=0,
+                 background_refresh=False,
+                 token_cache=None):
         """Construct an Identity V2 Authentication Plugin.
 
         :param string auth_url: Identity service endpoint for authorization.
         :param string trust_id: Trust ID for trust scoping.
         :param string tenant_id: Tenant ID for project scoping.
         :param string tenant_name: Tenant name for project scoping.
+        :param int refresh_lead_time: Seconds before expiry to renew the
+                                      token. (optional)
+        :param bool background_refresh: Renew the token early in a separate
+                                        thread. (optional)
+        :param token_cache: A FileTokenCache to share tokens with other
+                            processes. (optional)
         """
-        super(Auth, self).__init__(auth_url=auth_url)
+        super(Auth, self).__init__(auth_url=auth_url,
+                                   refresh_lead_time=refresh_lead_time,
+                                   background_refresh=background_refresh,
+                                   token_cache=token_cache)
 
         self.trust_id = trust_id
         self.tenant_id = tenant_id
@@ -25,6 +25,13 @@ _logger = logging.getLogger(__name__)
 
 class Auth(base.BaseIdentityPlugin):
 
+    _CACHE_ID_ATTRIBUTES = ('auth_url', 'trust_id', 'domain_id', 'domain_name',
+                            'project_id', 'project_name', 'project_domain_id',
+                            'project_domain_name')
+
+    # method parameters that don't change which token is fetched.
+    _NOT_CACHE_ID = ('password',)
+
     @utils.positional()
     def __init__(self, auth_url, auth_methods,
                  trust_id=None,
@@ -33,7 +40,10 @@ class Auth(base.BaseIdentityPlugin):
                  project_id=None,
                  project_name=None,
                  project_domain_id=None,
-                 project_domain_name=None):
+                 project_domain_name=None,
+                 refresh_lead_time=0,
+                 background_refresh=False,
+                 token_cache=None):
         """Construct an Identity V3 Authentication Plugin.
 
         :param string auth_url: Identity service endpoint for authentication.
@@ -45,9 +55,18 @@ class Auth(base.BaseIdentityPlugin):
         :param string project_name: Project name for project scoping.
         :param string project_domain_id: Project's domain ID for project.
         :param string project_domain_name: Project's domain name for project.
+        :param int refresh_lead_time: Seconds before expiry to renew the
+                                      token. (optional)
+        :param bool background_refresh: Renew the token early in a separate
+                                        thread. (optional)
+        :param token_cache: A FileTokenCache to share tokens with other
+                            processes. (optional)
         """
 
-        super(Auth, self).__init__(auth_url=auth_url)
+        super(Auth, self).__init__(auth_url=auth_url,
+                                   refresh_lead_time=refresh_lead_time,
+                                   background_refresh=background_refresh,
+                                   token_cache=token_cache)
 
         self.auth_methods = auth_methods
         self.trust_id = trust_id
@@ -63,6 +82,17 @@ class Auth(base.BaseIdentityPlugin):
         """The full URL where we will send authentication data."""
         return '%s/auth/tokens' % self.auth_url.rstrip('/')
 
+    def get_cache_id_elements(self):
+        elements = super(Auth, self).get_cache_id_elements()
+
+        for method in self.auth_methods:
+            name = type(method).__name__
+            for param in method._method_parameters:
+                if param not in self._NOT_CACHE_ID:
+                    elements['%s.%s' % (name, param)] = getattr(method, param)
+
+        return elements
+
     def get_auth_ref(self, session, **kwargs):
         headers = {'Accept': 'application/json'}
         body = {'auth': {'identity': {}}}
@@ -17,18 +17,34 @@ subprocess or eventlet.green.subprocess can be used.
 
 If set_subprocess() is not called, this module will pick Python's subprocess
 or eventlet.green.subprocess based on if os module is patched by eventlet.
+
+A Signer signs documents in process, rather than with the openssl command,
+if the cryptography library is installed.
 """
 
 import base64
+import binascii
 import errno
 import hashlib
 import logging
+import multiprocessing
+import string
+import threading
 import zlib
 
 import six
 
 from keystoneclient import exceptions
 
+# cryptography is only needed to sign documents in process with a Signer.
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes as crypto_hashes
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.serialization import pkcs7
+except ImportError:
+    pkcs7 = None
+
 
 subprocess = None
 LOG = logging.getLogger(__name__)
@@ -37,6 +53,16 @@ PKIZ_PREFIX = 'PKIZ_'
 PKIZ_CMS_FORM = 'DER'
 PKI_ASN1_FORM = 'PEM'
 
+_CMS_BEGIN = '-----BEGIN CMS-----'
+_CMS_END = '-----END CMS-----'
+_CMS_LINE_LENGTH = 64
+
+_maketrans = getattr(bytes, 'maketrans', None) or string.maketrans
+# PKI tokens are base64 with '/' replaced by '-', PKIZ tokens are URL safe
+# base64.
+_TOKEN_TO_BASE64 = _maketrans(b'-', b'/')
+_URLSAFE_TO_BASE64 = _maketrans(b'-_', b'+/')
+
 
 def _ensure_subprocess():
     # NOTE(vish): late loading subprocess so we can
@@ -197,15 +223,39 @@ def pkiz_sign(text,
                            signing_key_file_name,
                            PKIZ_CMS_FORM)
 
+    return _pkiz_encode(signed, compression_level)
+
+
+def _pkiz_encode(signed, compression_level):
     compressed = zlib.compress(signed, compression_level)
     encoded = PKIZ_PREFIX + base64.urlsafe_b64encode(
         compressed).decode('utf-8')
     return encoded
 
 
+def _to_bytes(text):
+    if isinstance(text, six.text_type):
+        return text.encode('utf-8')
+    return text
+
+
+def _view(data, start=0):
+    """Return data from start, without copying it where possible.
+
+    Python 2 can't join memoryviews, so the bytes are sliced there.
+    """
+    if six.PY3:
+        return memoryview(data)[start:]
+    return data[start:]
+
+
 def pkiz_uncompress(signed_text):
-    text = signed_text[len(PKIZ_PREFIX):].encode('utf-8')
-    unencoded = base64.urlsafe_b64decode(text)
+    """Return the CMS document of a PKIZ token.
+
+    :param signed_text: The token, as text or bytes.
+    """
+    data = _to_bytes(signed_text).translate(_URLSAFE_TO_BASE64)
+    unencoded = binascii.a2b_base64(_view(data, len(PKIZ_PREFIX)))
     uncompressed = zlib.decompress(unencoded)
     return uncompressed
 
@@ -219,26 +269,40 @@ def pkiz_verify(signed_text, signing_cert_file_name, ca_file_name):
 # This function is deprecated and will be removed once the ASN1 token format
 # is no longer required. It is only here to be used for testing.
 def token_to_cms(signed_text):
-    copy_of_text = signed_text.replace('-', '/')
-
-    formatted = '-----BEGIN CMS-----\n'
-    line_length = 64
-    while len(copy_of_text) > 0:
-        if (len(copy_of_text) > line_length):
-            formatted += copy_of_text[:line_length]
-            copy_of_text = copy_of_text[line_length:]
-        else:
-            formatted += copy_of_text
-            copy_of_text = ''
-        formatted += '\n'
+    text = signed_text.replace('-', '/')
+    lines = [_CMS_BEGIN]
+    lines.extend(text[i:i + _CMS_LINE_LENGTH]
+                 for i in range(0, len(text), _CMS_LINE_LENGTH))
+    lines.append(_CMS_END)
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def token_to_pem(signed_text):
+    """Return the PEM encoded CMS document of a PKI token as bytes.
+
+    This is what token_to_cms() returns, but the token is encoded once and
+    the lines are joined straight from it, so it can be given to
+    cms_verify() as it is.
+
+    :param signed_text: The token, as text or bytes.
+    """
+    return _format_pem(_to_bytes(signed_text).translate(_TOKEN_TO_BASE64))
 
-    formatted += '-----END CMS-----\n'
 
-    return formatted
+def _format_pem(data):
+    """Return the PEM document of base64 encoded CMS data as bytes."""
+    view = _view(data)
+    lines = [_CMS_BEGIN.encode('ascii')]
+    lines.extend(view[i:i + _CMS_LINE_LENGTH]
+                 for i in range(0, len(data), _CMS_LINE_LENGTH))
+    lines.append(_CMS_END.encode('ascii'))
+    lines.append(b'')
+    return b'\n'.join(lines)
 
 
 def verify_token(token, signing_cert_file_name, ca_file_name):
-    return cms_verify(token_to_cms(token),
+    return cms_verify(token_to_pem(token),
                       signing_cert_file_name,
                       ca_file_name)
 
@@ -361,16 +425,15 @@ def cms_sign_token(text, signing_cert_file_name, signing_key_file_name):
 
 
 def cms_to_token(cms_text):
+    # take the text between the delimiters rather than replacing them.
+    start = cms_text.find(_CMS_BEGIN)
+    start = 0 if start < 0 else start + len(_CMS_BEGIN)
+    end = cms_text.rfind(_CMS_END)
+    if end < start:
+        end = len(cms_text)
 
-    start_delim = '-----BEGIN CMS-----'
-    end_delim = '-----END CMS-----'
-    signed_text = cms_text
-    signed_text = signed_text.replace('/', '-')
-    signed_text = signed_text.replace(start_delim, '')
-    signed_text = signed_text.replace(end_delim, '')
-    signed_text = signed_text.replace('\n', '')
-
-    return signed_text
+    signed_text = cms_text[start:end].replace('\n', '')
+    return signed_text.replace('/', '-')
 
 
 def cms_hash_token(token_id, mode='md5'):
@@ -379,13 +442,154 @@ def cms_hash_token(token_id, mode='md5'):
     return: for asn1 or pkiz tokens, returns the hash of the passed in token
             otherwise, returns what it was passed in.
     """
-    if token_id is None:
-        return None
-    if is_asn1_token(token_id) or is_pkiz(token_id):
+    return cms_hash_token_modes(token_id, [mode])[0]
+
+
+def cms_hash_token_modes(token_id, modes):
+    """Hash PKI tokens with each of several algorithms.
+
+    The token is only encoded once however many algorithms there are.
+
+    return: a list with what cms_hash_token() returns for each of modes,
+            in the same order.
+    """
+    if token_id is None or not (is_asn1_token(token_id) or
+                                is_pkiz(token_id)):
+        return [token_id] * len(modes)
+
+    data = _to_bytes(token_id)
+    hashes = []
+    for mode in modes:
         hasher = hashlib.new(mode)
-        if isinstance(token_id, six.text_type):
-            token_id = token_id.encode('utf-8')
-        hasher.update(token_id)
-        return hasher.hexdigest()
-    else:
-        return token_id
+        hasher.update(data)
+        hashes.append(hasher.hexdigest())
+    return hashes
+
+
+_worker_signer = None
+
+
+def _init_worker(signing_cert_file_name, signing_key_file_name):
+    global _worker_signer
+    _worker_signer = Signer(signing_cert_file_name, signing_key_file_name)
+
+
+def _sign_in_worker(args):
+    return _worker_signer._sign_token(*args)
+
+
+class Signer(object):
+    """Sign documents in this process with a key that is only loaded once.
+
+    cms_sign_data() and the functions that use it start openssl, which loads
+    the certificate and key again, for every document. A Signer signs with
+    the cryptography library instead. Its documents are those openssl
+    produces, so cms_verify() verifies them as before.
+
+    :param signing_cert_file_name: path to the X509 certificate containing
+        the public key associated with the private key used to sign the data
+    :param signing_key_file_name: path to the private key used to sign
+        the data
+    :param int processes: The number of processes that sign_many() signs
+        with. With 0, the default, it signs in this process.
+    :raises ImportError: if cryptography is not available.
+    :raises CertificateConfigError: if the certificate or key can't be
+        loaded.
+    """
+
+    def __init__(self, signing_cert_file_name, signing_key_file_name,
+                 processes=0):
+        if pkcs7 is None:
+            raise ImportError('cryptography is required to sign in process')
+
+        self.signing_cert_file_name = signing_cert_file_name
+        self.signing_key_file_name = signing_key_file_name
+        self.processes = processes
+        self._pool = None
+        self._lock = threading.Lock()
+
+        try:
+            with open(signing_cert_file_name, 'rb') as f:
+                self._cert = x509.load_pem_x509_certificate(f.read())
+            with open(signing_key_file_name, 'rb') as f:
+                self._key = serialization.load_pem_private_key(f.read(),
+                                                               None)
+        except (IOError, ValueError, TypeError) as e:
+            raise exceptions.CertificateConfigError(str(e))
+
+    def _sign(self, data_to_sign):
+        """Return the DER encoded CMS document of data_to_sign."""
+        builder = pkcs7.PKCS7SignatureBuilder().set_data(
+            _to_bytes(data_to_sign)).add_signer(self._cert, self._key,
+                                                crypto_hashes.SHA256())
+        # as openssl cms -nocerts -noattr. Without -binary, openssl makes
+        # the line breaks of the data CRLF and so does this.
+        options = [pkcs7.PKCS7Options.NoAttributes,
+                   pkcs7.PKCS7Options.NoCerts]
+        return builder.sign(serialization.Encoding.DER, options)
+
+    def sign_data(self, data_to_sign, outform=PKI_ASN1_FORM):
+        """Sign a document, as cms_sign_data() does.
+
+        :param data_to_sign: data to sign
+        :param outform: Format for the signed document PKIZ_CMS_FORM or
+            PKI_ASN1_FORM
+        """
+        pem = _format_pem(base64.b64encode(self._sign(data_to_sign)))
+        if outform == PKI_ASN1_FORM:
+            return pem.decode('utf-8')
+        else:
+            return pem
+
+    def sign_token(self, text):
+        """Sign a PKI token, as cms_sign_token() does."""
+        encoded = base64.b64encode(self._sign(text)).decode('utf-8')
+        return encoded.replace('/', '-')
+
+    def pkiz_sign(self, text, compression_level=6):
+        """Sign a PKIZ token, as pkiz_sign() does."""
+        return _pkiz_encode(self.sign_data(text, PKIZ_CMS_FORM),
+                            compression_level)
+
+    def _sign_token(self, text, pkiz, compression_level):
+        if pkiz:
+            return self.pkiz_sign(text, compression_level)
+        return self.sign_token(text)
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(
+                    self.processes, _init_worker,
+                    (self.signing_cert_file_name, self.signing_key_file_name))
+            return self._pool
+
+    def sign_many(self, texts, pkiz=False, compression_level=6):
+        """Sign a batch of tokens.
+
+        With processes, the batch is split between that many processes,
+        which are started on first use and each load the certificate and key
+        once.
+
+        :param texts: The data of each token.
+        :param bool pkiz: Sign PKIZ tokens rather than PKI tokens.
+        :returns: A list of the tokens, in the order of texts.
+        """
+        texts = list(texts)
+        if not self.processes or len(texts) < 2:
+            return [self._sign_token(text, pkiz, compression_level)
+                    for text in texts]
+
+        chunksize = max(1, len(texts) // (self.processes * 4))
+        return self._get_pool().map(
+            _sign_in_worker,
+            [(text, pkiz, compression_level) for text in texts],
+            chunksize)
+
+    def close(self):
+        """Stop the processes that sign_many() started."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.terminate()
+            pool.join()
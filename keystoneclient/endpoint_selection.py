@@ -0,0 +1,126 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Strategies that choose between the catalog endpoints of a service.
+
+A service catalog can list several endpoints that match the service type,
+interface and region of a request, for example an endpoint in each
+availability zone. By default the first one is always used. An endpoint
+selector passed to a :py:class:`keystoneclient.session.Session` or
+:py:class:`keystoneclient.adapter.Adapter` is given every matching endpoint
+instead::
+
+    selector = endpoint_selection.LatencySelector()
+    sess = session.Session(auth=auth, endpoint_selector=selector)
+
+The session sends the request to the first endpoint in the selector's order,
+fails over to the next if a connection can't be made, and reports the
+outcome of each attempt back to the selector. A request whose connection is
+lost or that times out is only failed over if its method is idempotent, but
+the failure is always reported.
+"""
+
+import random
+import threading
+import time
+
+
+class EndpointSelector(object):
+    """Use matching endpoints in the order the catalog lists them.
+
+    This is the interface that selectors implement.
+    """
+
+    def order(self, urls):
+        """Return the URLs in the order they should be tried."""
+        return list(urls)
+
+    def record(self, url, elapsed=None, failed=False):
+        """Report the outcome of a request to the endpoint at url.
+
+        :param string url: The base URL of the endpoint.
+        :param float elapsed: Seconds until the response was received, or
+                              None if there was no response.
+        :param bool failed: True if the endpoint couldn't be reached or
+                            responded with a server error.
+        """
+        pass
+
+
+class _Stats(object):
+
+    def __init__(self):
+        self.ewma = None
+        self.unhealthy_until = 0
+
+
+class LatencySelector(EndpointSelector):
+    """Prefer the healthy endpoint with the lowest response time.
+
+    The selector keeps an exponentially weighted moving average of the
+    response times of each endpoint. An endpoint that hasn't been used yet is
+    tried first so that every endpoint is measured. An endpoint that fails is
+    unhealthy for cooldown seconds, during which it is only used once the
+    healthy endpoints have failed.
+
+    :param float decay: The weight of the latest response time in the moving
+                        average, between 0 and 1.
+    :param float cooldown: Seconds that an endpoint is avoided for after it
+                           fails.
+    """
+
+    def __init__(self, decay=0.3, cooldown=30.0):
+        self.decay = decay
+        self.cooldown = cooldown
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _key(self, url, now):
+        stats = self._stats.get(url)
+        if stats is None:
+            return (False, 0.0)
+        return (stats.unhealthy_until > now, stats.ewma or 0.0)
+
+    def order(self, urls):
+        urls = list(urls)
+        # shuffle first so that endpoints with the same key share the load.
+        random.shuffle(urls)
+        now = time.time()
+
+        with self._lock:
+            urls.sort(key=lambda url: self._key(url, now))
+
+        return urls
+
+    def record(self, url, elapsed=None, failed=False):
+        with self._lock:
+            stats = self._stats.setdefault(url, _Stats())
+
+            if elapsed is not None:
+                if stats.ewma is None:
+                    stats.ewma = elapsed
+                else:
+                    stats.ewma = (self.decay * elapsed +
+                                  (1 - self.decay) * stats.ewma)
+
+            if failed:
+                stats.unhealthy_until = time.time() + self.cooldown
+            else:
+                stats.unhealthy_until = 0
+
+    def get_stats(self):
+        """Return a dict of URL to its average response time and health."""
+        now = time.time()
+        with self._lock:
+            return dict((url, {'ewma': s.ewma,
+                               'healthy': s.unhealthy_until <= now})
+                        for url, s in self._stats.items())
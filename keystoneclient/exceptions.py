@@ -54,6 +54,13 @@ class SSLError(ConnectionRefused):
     """An SSL error occurred."""
 
 
+class ConnectFailure(ConnectionRefused):
+    """A connection to the server couldn't be established.
+
+    Unlike other connection errors, the request was never sent.
+    """
+
+
 class DiscoveryFailure(ClientException):
     """Discovery of client versions failed."""
 
@@ -0,0 +1,167 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Collectors of request events that can be added to a session.
+
+Each collector is a hook that can be passed to
+:py:meth:`keystoneclient.session.Session.add_hook`::
+
+    timings = hooks.TimingLog()
+    sess = session.Session(hooks=[timings])
+    ...
+    for name, start, end in timings.get_timings():
+        ...
+
+"""
+
+import bisect
+import threading
+
+import six
+from six.moves import urllib
+
+from keystoneclient.openstack.common import importutils
+from keystoneclient import session
+
+
+profiler = importutils.try_import('osprofiler.profiler')
+
+# histogram bucket upper bounds, in seconds.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+
+class TimingLog(object):
+    """Record the start and end time of every response.
+
+    This provides the get_timings() and reset_timings() interface of the
+    older HTTPClient. Times are taken from a monotonic clock so only the
+    difference between them is meaningful.
+    """
+
+    def __init__(self):
+        self._timings = []
+
+    def __call__(self, event, info):
+        if event == session.POST_RESPONSE:
+            self._timings.append(('%s %s' % (info['method'], info['url']),
+                                  info['start'],
+                                  info['start'] + info['elapsed']))
+
+    def get_timings(self):
+        """Return a list of (request, start, end) tuples."""
+        return self._timings
+
+    def reset_timings(self):
+        self._timings = []
+
+
+class _Histogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.errors = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self):
+        return {'count': self.count,
+                'errors': self.errors,
+                'sum': self.sum,
+                'min': self.min,
+                'max': self.max,
+                'buckets': list(zip(self.buckets + (float('inf'),),
+                                    self.counts))}
+
+
+class LatencyHistogram(object):
+    """Aggregate response times by method and endpoint.
+
+    The endpoint is the scheme, host and port of the request URL so that
+    requests for different resources of the same service are aggregated
+    together.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._buckets = tuple(sorted(buckets))
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _endpoint(url):
+        parts = urllib.parse.urlparse(url)
+        return '%s://%s' % (parts.scheme, parts.netloc)
+
+    def _histogram(self, info):
+        key = (info['method'], self._endpoint(info['url']))
+        try:
+            return self._histograms[key]
+        except KeyError:
+            return self._histograms.setdefault(key,
+                                               _Histogram(self._buckets))
+
+    def __call__(self, event, info):
+        if event == session.POST_RESPONSE:
+            with self._lock:
+                self._histogram(info).observe(info['elapsed'])
+        elif event == session.ERROR:
+            with self._lock:
+                self._histogram(info).errors += 1
+
+    def get_stats(self):
+        """Return a dict of (method, endpoint) to statistics.
+
+        The statistics contain the number of responses and errors, the sum,
+        minimum and maximum of the response times in seconds, and a list of
+        (upper bound, count) buckets.
+        """
+        with self._lock:
+            return dict((key, h.to_dict())
+                        for key, h in six.iteritems(self._histograms))
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+
+class OSProfilerHook(object):
+    """Report each request as a trace point to osprofiler.
+
+    Nothing is reported if osprofiler is not installed or no profiler has
+    been initialized.
+    """
+
+    def __init__(self, name='keystoneclient.http'):
+        self.name = name
+
+    def __call__(self, event, info):
+        if profiler is None:
+            return
+
+        if event == session.PRE_REQUEST:
+            profiler.start(self.name, {'request': {'method': info['method'],
+                                                   'url': info['url']}})
+        elif event == session.POST_RESPONSE:
+            profiler.stop({'response': {
+                'status_code': info['response'].status_code}})
+        elif event == session.ERROR:
+            profiler.stop({'error': six.text_type(info['exception'])})
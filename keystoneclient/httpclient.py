@@ -19,6 +19,7 @@
 OpenStack Client interface. Handles the REST calls and responses.
 """
 
+import contextlib
 import logging
 
 from six.moves.urllib import parse as urlparse
@@ -37,6 +38,7 @@ if not hasattr(urlparse, 'parse_qsl'):
     urlparse.parse_qsl = cgi.parse_qsl
 
 
+from keystoneclient import _json
 from keystoneclient import access
 from keystoneclient.auth import base
 from keystoneclient import baseclient
@@ -66,7 +68,7 @@ class HTTPClient(baseclient.Client, base.BaseAuthPlugin):
                  user_domain_id=None, user_domain_name=None, domain_id=None,
                  domain_name=None, project_id=None, project_name=None,
                  project_domain_id=None, project_domain_name=None,
-                 trust_id=None, session=None, **kwargs):
+                 trust_id=None, session=None, token_cache=None, **kwargs):
         """Construct a new http client
 
         :param string user_id: User ID for authentication. (optional)
@@ -112,8 +114,12 @@ class HTTPClient(baseclient.Client, base.BaseAuthPlugin):
                                        request for new token.
                                        default: False (optional)
         :param integer stale_duration: Gap in seconds to determine if token
-                                       from keyring is about to expire.
+                                       from keyring or token_cache is about
+                                       to expire.
                                        default: 30 (optional)
+        :param token_cache: A keystoneclient.token_cache.FileTokenCache that
+                            tokens are stored in and retrieved from, so
+                            that other processes can reuse them. (optional)
         :param string tenant_name: Tenant name. (optional)
                                    The tenant_name keyword argument is
                                    deprecated, use project_name instead.
@@ -240,6 +246,7 @@ class HTTPClient(baseclient.Client, base.BaseAuthPlugin):
         self.force_new_token = force_new_token
         self.stale_duration = stale_duration or access.STALE_TOKEN_DURATION
         self.stale_duration = int(self.stale_duration)
+        self.token_cache = token_cache
 
     def get_token(self, session, **kwargs):
         return self.auth_token
@@ -338,14 +345,14 @@ class HTTPClient(baseclient.Client, base.BaseAuthPlugin):
                  the existing authorization token
         :raises: ValueError if insufficient parameters are used.
 
-        If keyring is used, token is retrieved from keyring instead.
-        Authentication will only be necessary if any of the following
-        conditions are met:
+        If keyring or token_cache is used, token is retrieved from there
+        instead. Authentication will only be necessary if any of the
+        following conditions are met:
 
-        * keyring is not used
-        * if token is not found in keyring
-        * if token retrieved from keyring is expired or about to
-          expired (as determined by stale_duration)
+        * neither keyring nor token_cache is used
+        * if token is not found in keyring or token_cache
+        * if token retrieved from keyring or token_cache is expired or about
+          to expired (as determined by stale_duration)
         * if force_new_token is true
 
         """
@@ -387,7 +394,31 @@ class HTTPClient(baseclient.Client, base.BaseAuthPlugin):
             'token': token,
             'trust_id': trust_id,
         }
+        cache_key = None
+        if self.token_cache:
+            cache_key = self.token_cache.make_key(**kwargs)
+
+        with self._token_cache_lock(cache_key):
+            return self._authenticate(kwargs, password, region_name,
+                                      cache_key)
+
+    @contextlib.contextmanager
+    def _token_cache_lock(self, cache_key):
+        if cache_key is None:
+            yield
+        else:
+            # processes authenticating at the same time wait for the first
+            # one's token rather than all fetching their own.
+            with self.token_cache.lock(cache_key):
+                yield
+
+    def _authenticate(self, kwargs, password, region_name, cache_key=None):
         (keyring_key, auth_ref) = self.get_auth_ref_from_keyring(**kwargs)
+        if auth_ref is None and cache_key and not self.force_new_token:
+            auth_ref = self.token_cache.get(cache_key, self.stale_duration)
+            if auth_ref and region_name:
+                auth_ref.service_catalog._region_name = region_name
+
         new_token_needed = False
         if auth_ref is None or self.force_new_token:
             new_token_needed = True
@@ -410,6 +441,8 @@ class HTTPClient(baseclient.Client, base.BaseAuthPlugin):
         self.process_token(region_name=region_name)
         if new_token_needed:
             self.store_auth_ref_into_keyring(keyring_key)
+            if cache_key:
+                self.token_cache.set(cache_key, self.auth_ref)
         return True
 
     def _build_keyring_key(self, **kwargs):
@@ -537,9 +570,11 @@ class HTTPClient(baseclient.Client, base.BaseAuthPlugin):
 
     @staticmethod
     def _decode_body(resp):
-        if resp.text:
+        if resp.content:
             try:
-                body_resp = jsonutils.loads(resp.text)
+                # JSON is decoded from the bytes so that requests doesn't
+                # have to detect the character set of the body.
+                body_resp = _json.loads(resp.content)
             except (ValueError, TypeError):
                 body_resp = None
                 _logger.debug("Could not decode JSON from body: %s",
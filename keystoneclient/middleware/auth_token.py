@@ -145,12 +145,16 @@ keystone.token_info
 
 """
 
+import binascii
 import contextlib
 import datetime
+import hashlib
 import logging
 import os
+import random
 import stat
 import tempfile
+import threading
 import time
 
 import netaddr
@@ -159,13 +163,25 @@ import requests
 import six
 from six.moves import urllib
 
+from keystoneclient import _json
 from keystoneclient import access
+from keystoneclient.auth import base as auth_base
+from keystoneclient.auth.identity import v2 as v2_auth
+from keystoneclient.auth.identity import v3 as v3_auth
 from keystoneclient.common import cms
 from keystoneclient import exceptions
+from keystoneclient.middleware import cache_backends
+from keystoneclient.middleware import circuit_breaker
+from keystoneclient.middleware import endpoints
 from keystoneclient.middleware import memcache_crypt
+from keystoneclient.middleware import metrics
+from keystoneclient.middleware import offload
+from keystoneclient.middleware import revocation
+from keystoneclient.middleware import validation_daemon
 from keystoneclient.openstack.common import jsonutils
-from keystoneclient.openstack.common import memorycache
 from keystoneclient.openstack.common import timeutils
+from keystoneclient import retry
+from keystoneclient import session as client_session
 
 
 # alternative middleware configuration in the main application's
@@ -222,7 +238,22 @@ opts = [
                default=None,
                help='Complete admin Identity API endpoint. This should '
                     'specify the unversioned root endpoint '
-                    'e.g. https://localhost:35357/'),
+                    'e.g. https://localhost:35357/. A comma separated list '
+                    'of endpoints may be given, in which case requests are '
+                    'balanced between them.'),
+    cfg.StrOpt('identity_uri_picker',
+               default='p2c',
+               help='(optional) How the endpoint is chosen when identity_uri'
+               ' is a list. Acceptable values are p2c or ewma. If p2c, the'
+               ' faster of two random endpoints is used. If ewma, the'
+               ' endpoint with the lowest average response time is used.'
+               ' Failed requests are retried on the other endpoints.'),
+    cfg.BoolOpt('hedge_requests',
+                default=False,
+                help='(optional) If identity_uri is a list, send a second'
+                ' GET request to another endpoint when the first hasn\'t'
+                ' responded within its 99th percentile response time, and'
+                ' use whichever response arrives first.'),
     cfg.StrOpt('auth_version',
                default=None,
                help='API version of the admin Identity API endpoint'),
@@ -239,6 +270,31 @@ opts = [
                default=3,
                help='How many times are we trying to reconnect when'
                ' communicating with Identity API Server.'),
+    cfg.BoolOpt('circuit_breaker_enabled',
+                default=True,
+                help='(optional) Stop sending requests to the Identity API'
+                ' server while it is failing, so that requests with tokens'
+                ' that are not cached are rejected with 503 straight away'
+                ' rather than after retries.'),
+    cfg.FloatOpt('circuit_breaker_error_rate',
+                 default=0.5,
+                 help='(optional) The proportion of failed requests to the'
+                 ' Identity API server, between 0 and 1, at which requests'
+                 ' are stopped.'),
+    cfg.IntOpt('circuit_breaker_min_requests',
+               default=10,
+               help='(optional) The number of requests within'
+               ' circuit_breaker_window needed before requests can be'
+               ' stopped.'),
+    cfg.IntOpt('circuit_breaker_window',
+               default=30,
+               help='(optional) The number of seconds of requests used to'
+               ' calculate the error rate.'),
+    cfg.IntOpt('circuit_breaker_reset_timeout',
+               default=30,
+               help='(optional) The number of seconds requests are stopped'
+               ' for before a single trial request is made to see if the'
+               ' Identity API server has recovered.'),
     cfg.StrOpt('admin_token',
                secret=True,
                help='This option is deprecated and may be removed in a future'
@@ -256,6 +312,38 @@ opts = [
                default='admin',
                help='Keystone service account tenant name to validate'
                ' user tokens'),
+    cfg.StrOpt('admin_user_domain_name',
+               default=None,
+               help='(optional) Domain of the Keystone service account. If'
+               ' this or admin_project_domain_name is set the admin token is'
+               ' fetched with the v3 Identity API, otherwise the v2 API is'
+               ' used.'),
+    cfg.StrOpt('admin_project_domain_name',
+               default=None,
+               help='(optional) Domain of admin_tenant_name when the admin'
+               ' token is fetched with the v3 Identity API.'),
+    cfg.IntOpt('admin_token_refresh_time',
+               default=300,
+               help='(optional) How long, in seconds, before the admin token'
+               ' expires to renew it. Each worker picks a random point in the'
+               ' second half of this period so that workers do not all renew'
+               ' at once. Only one renewal is made at a time and other'
+               ' requests continue to use the current token while it is'
+               ' valid. Set to 0 to only renew the token when it is about'
+               ' to expire.'),
+    cfg.BoolOpt('admin_token_background_refresh',
+                default=False,
+                help='(optional) Renew the admin token in a background thread'
+                ' rather than as part of the request that notices it is due'
+                ' for renewal.'),
+    cfg.BoolOpt('share_admin_token',
+                default=False,
+                help='(optional) Share the admin token with other workers'
+                ' through the token cache. Workers will use a token that'
+                ' another worker has fetched rather than authenticating with'
+                ' the Identity service themselves. As the admin token is'
+                ' privileged memcache_security_strategy must be ENCRYPT or'
+                ' AEAD when this is enabled.'),
     cfg.StrOpt('cache',
                default=None,
                help='Env key for the swift cache'),
@@ -274,6 +362,27 @@ opts = [
                 help='Optionally specify a list of memcached server(s) to'
                 ' use for caching. If left undefined, tokens will instead be'
                 ' cached in-process.'),
+    cfg.StrOpt('cache_backend',
+               default='memcache',
+               help='(optional) The backend used to cache tokens. Acceptable'
+               ' values are memcache, shared or redis. If memcache, tokens'
+               ' are cached in memcached_servers or in-process if they are'
+               ' not defined. If shared, tokens are cached in files in'
+               ' shared_cache_dir that are shared by every process on the'
+               ' host. If redis, tokens are cached in the Redis server at'
+               ' redis_url. The cache from the environment is always used if'
+               ' the cache option is set.'),
+    cfg.StrOpt('shared_cache_dir',
+               default=None,
+               help='(optional) Directory used by the shared cache_backend.'
+               ' It should be on a memory backed filesystem and writable by'
+               ' every worker process on the host, and have mode 0700.'
+               ' Defaults to a directory in /dev/shm.'),
+    cfg.StrOpt('redis_url',
+               default=None,
+               help='(optional, mandatory if cache_backend is redis) The'
+               ' Redis server to use for caching, e.g.'
+               ' redis://localhost:6379/0'),
     cfg.IntOpt('token_cache_time',
                default=300,
                help='In order to prevent excessive effort spent validating'
@@ -286,15 +395,34 @@ opts = [
                ' tokens is retrieved from the Identity service (in seconds). A'
                ' high number of revocation events combined with a low cache'
                ' duration may significantly reduce performance.'),
+    cfg.BoolOpt('revocation_events',
+                default=False,
+                help='(optional) Check PKI tokens against the revocation'
+                ' events of the OS-REVOKE extension rather than the'
+                ' revocation list. Every revocation_cache_time seconds only'
+                ' the events that are new since the previous fetch are'
+                ' downloaded, and every revocation_reconcile_time seconds'
+                ' every event is.'),
+    cfg.IntOpt('revocation_reconcile_time',
+               default=3600,
+               help='(optional) How often, in seconds, every revocation event'
+               ' is fetched to replace those fetched incrementally.'),
+    cfg.IntOpt('max_token_lifetime',
+               default=86400,
+               help='(optional) The longest, in seconds, that the Identity'
+               ' service issues tokens for. Revocation events are kept for'
+               ' this long after the tokens they revoke were issued.'),
     cfg.StrOpt('memcache_security_strategy',
                default=None,
                help='(optional) if defined, indicate whether token data'
                ' should be authenticated or authenticated and encrypted.'
-               ' Acceptable values are MAC or ENCRYPT.  If MAC, token data is'
-               ' authenticated (with HMAC) in the cache. If ENCRYPT, token'
-               ' data is encrypted and authenticated in the cache. If the'
-               ' value is not one of these options or empty, auth_token will'
-               ' raise an exception on initialization.'),
+               ' Acceptable values are MAC, ENCRYPT or AEAD.  If MAC, token'
+               ' data is authenticated (with HMAC) in the cache. If ENCRYPT,'
+               ' token data is encrypted and authenticated in the cache. If'
+               ' AEAD, token data is encrypted and authenticated in a single'
+               ' pass with ChaCha20-Poly1305 and stored without base64'
+               ' encoding. If the value is not one of these options or empty,'
+               ' auth_token will raise an exception on initialization.'),
     cfg.StrOpt('memcache_secret_key',
                default=None,
                secret=True,
@@ -320,6 +448,67 @@ opts = [
                 help='If true, the revocation list will be checked for cached'
                 ' tokens. This requires that PKI tokens are configured on the'
                 ' Keystone server.'),
+    cfg.StrOpt('metrics_backend',
+               default='noop',
+               help='(optional) Where to report metrics about token'
+               ' validation, such as cache hits and misses and the time spent'
+               ' in each phase of validation. Acceptable values are noop,'
+               ' statsd or prometheus. If noop, no metrics are kept. If'
+               ' statsd, metrics are sent to the statsd server at statsd_host'
+               ' and statsd_port. If prometheus, metrics are kept in process'
+               ' and can be rendered in the Prometheus text format. The'
+               ' emitter is available from the WSGI environment as'
+               ' keystone.token_metrics.'),
+    cfg.StrOpt('metrics_prefix',
+               default='keystone.auth_token',
+               help='(optional) Prefix of the name of every metric.'),
+    cfg.StrOpt('statsd_host',
+               default='localhost',
+               help='(optional) Host of the statsd server.'),
+    cfg.IntOpt('statsd_port',
+               default=8125,
+               help='(optional) Port of the statsd server.'),
+    cfg.StrOpt('validation_daemon_socket',
+               default=None,
+               help='(optional) The UNIX domain socket of a'
+               ' keystone-token-validator daemon. If set, tokens are sent to'
+               ' the daemon to be validated so that every worker on the host'
+               ' shares its admin token, certificates, revocation list, cache'
+               ' and connections. Tokens are validated in process while the'
+               ' daemon is unavailable.'),
+    cfg.IntOpt('validation_daemon_timeout',
+               default=10,
+               help='(optional) How long, in seconds, to wait for the'
+               ' validation daemon to answer before validating the token in'
+               ' process.'),
+    cfg.IntOpt('offload_workers',
+               default=0,
+               help='(optional) The number of processes to verify and decode'
+               ' large PKI tokens and cache entries in, so that they don\'t'
+               ' hold up the other requests the process is serving. 0, the'
+               ' default, does all the work in the process serving the'
+               ' request.'),
+    cfg.IntOpt('offload_threshold',
+               default=8192,
+               help='(optional) The smallest token or cache entry, in bytes,'
+               ' that is sent to the offload processes. Smaller ones are'
+               ' handled in the process serving the request.'),
+    cfg.IntOpt('offload_max_pending',
+               help='(optional) The most tokens and cache entries that can'
+               ' be waiting for the offload processes. Beyond this they are'
+               ' handled in the process serving the request. Defaults to'
+               ' twice offload_workers.'),
+    cfg.IntOpt('offload_timeout',
+               default=10,
+               help='(optional) How long, in seconds, to wait for the offload'
+               ' processes before doing the work in the process serving the'
+               ' request.'),
+    cfg.BoolOpt('warm_up', default=False,
+                help='(optional) Choose the Identity API version and fetch the'
+                ' admin token, signing certificates and revocation list when'
+                ' the middleware is loaded rather than on the first requests.'
+                ' Worker processes forked after the middleware is loaded'
+                ' inherit this state.'),
     cfg.ListOpt('hash_algorithms', default=['md5'],
                 help='Hash algorithms to use for hashing PKI tokens. This may'
                 ' be a single algorithm or multiple. The algorithms are those'
@@ -338,6 +527,17 @@ CONF.register_opts(opts, group='keystone_authtoken')
 LIST_OF_VERSIONS_TO_ATTEMPT = ['v2.0', 'v3.0']
 CACHE_KEY_TEMPLATE = 'tokens/%s'
 
+# How long, in seconds, to wait before retrying a failed admin token renewal
+# while the current admin token is still valid.
+ADMIN_TOKEN_RETRY_DELAY = 5
+
+# The most threads that hedged requests are made in. Requests aren't hedged
+# while every thread is busy.
+HEDGE_THREADS = 10
+
+# used by the token cache when it isn't given a metrics emitter.
+_NO_METRICS = metrics.Metrics()
+
 
 class BIND_MODE:
     DISABLED = 'disabled'
@@ -423,6 +623,11 @@ def safe_quote(s):
     return urllib.parse.quote(s) if s == urllib.parse.unquote(s) else s
 
 
+def _sent_token(response):
+    """Return the token that was sent with the request of a response."""
+    return response.request.headers.get('X-Auth-Token')
+
+
 class InvalidUserToken(Exception):
     pass
 
@@ -439,6 +644,10 @@ class NetworkError(Exception):
     pass
 
 
+class CircuitOpenError(ServiceError):
+    pass
+
+
 class MiniResp(object):
     def __init__(self, error_message, env, headers=[]):
         # The HEAD method is unique: it must never return a body, even if
@@ -452,6 +661,89 @@ class MiniResp(object):
         self.headers.append(('Content-type', 'text/plain'))
 
 
+class _AdminTokenPlugin(auth_base.BaseAuthPlugin):
+    """Authenticate session requests with the middleware's admin token.
+
+    The admin token is managed by the middleware so that it can be renewed
+    ahead of expiry and shared between workers. This plugin lets the session
+    attach it to requests and discard it if keystone rejects it.
+    """
+
+    def __init__(self, auth_protocol):
+        self._auth_protocol = auth_protocol
+        # the token each thread last sent, which is the one it invalidates.
+        self._local = threading.local()
+
+    def get_token(self, session, **kwargs):
+        token = self._auth_protocol.get_admin_token()
+        self._local.token = token
+        return token
+
+    def invalidate(self):
+        self._auth_protocol.LOG.info(
+            'Keystone rejected admin token, resetting')
+        self._auth_protocol._reject_admin_token(
+            getattr(self._local, 'token', None))
+        return True
+
+
+class _HedgeThreads(object):
+    """A bounded set of threads that hedged requests are made in.
+
+    The threads are started as they are needed and then reused. Work isn't
+    queued: spawn() returns False if every thread is busy so that the caller
+    can make the request itself instead.
+
+    :param log: The logger that unexpected errors are reported to.
+    :param int size: The most threads that are started.
+    """
+
+    def __init__(self, log, size):
+        self.LOG = log
+        self.size = size
+        self.reset()
+
+    def reset(self):
+        """Forget the threads, such as in a forked process."""
+        self._tasks = six.moves.queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = 0
+        self._idle = 0
+
+    def spawn(self, func, *args):
+        """Call func in a thread if one is free.
+
+        :returns: True if func will be called.
+        """
+        with self._lock:
+            if self._idle:
+                self._idle -= 1
+            elif self._threads < self.size:
+                self._threads += 1
+                t = threading.Thread(target=self._run, args=(self._tasks,))
+                t.daemon = True
+                t.start()
+            else:
+                return False
+
+        self._tasks.put((func, args))
+        return True
+
+    def _run(self, tasks):
+        while True:
+            func, args = tasks.get()
+            try:
+                func(*args)
+            except Exception:
+                self.LOG.exception('Unexpected error in hedged request')
+
+            with self._lock:
+                if tasks is not self._tasks:
+                    # reset() replaced this thread.
+                    return
+                self._idle += 1
+
+
 class AuthProtocol(object):
     """Auth Middleware that handles authenticating client calls."""
 
@@ -497,6 +789,13 @@ class AuthProtocol(object):
         else:
             self.identity_uri = self.identity_uri.rstrip('/')
 
+        # identity_uri may be a list of servers, the first of which is used
+        # wherever a single URI is needed.
+        self.identity_uris = [uri.strip().rstrip('/')
+                              for uri in self.identity_uri.split(',')
+                              if uri.strip()]
+        self.identity_uri = self.identity_uris[0]
+
         if self.auth_uri is None:
             self.LOG.warning(
                 'Configuring auth_uri to point to the public identity '
@@ -544,9 +843,48 @@ class AuthProtocol(object):
         self.admin_user = self._conf_get('admin_user')
         self.admin_password = self._conf_get('admin_password')
         self.admin_tenant_name = self._conf_get('admin_tenant_name')
+        self.admin_user_domain_name = self._conf_get('admin_user_domain_name')
+        self.admin_project_domain_name = self._conf_get(
+            'admin_project_domain_name')
+
+        self._admin_token_refresh_time = int(
+            self._conf_get('admin_token_refresh_time'))
+        self._admin_token_background_refresh = self._conf_get(
+            'admin_token_background_refresh')
+        self._share_admin_token = self._conf_get('share_admin_token')
+        self._admin_token_refresh_at = None
+        self._admin_token_lock = threading.Lock()
+        self._rejected_admin_token = None
+
+        metrics_backend = self._conf_get('metrics_backend')
+        if metrics_backend not in metrics.BACKENDS:
+            raise ConfigurationError('metrics_backend must be one of: %s' %
+                                     ', '.join(metrics.BACKENDS))
+        self._metrics = metrics.get_metrics(
+            metrics_backend,
+            prefix=self._conf_get('metrics_prefix'),
+            statsd_host=self._conf_get('statsd_host'),
+            statsd_port=self._conf_get('statsd_port'))
+
+        self._offload = None
+        offload_workers = int(self._conf_get('offload_workers'))
+        if offload_workers:
+            max_pending = self._conf_get('offload_max_pending')
+            self._offload = offload.ProcessPool(
+                offload_workers,
+                threshold=int(self._conf_get('offload_threshold')),
+                max_pending=max_pending and int(max_pending),
+                timeout=int(self._conf_get('offload_timeout')),
+                metrics=self._metrics)
 
         memcache_security_strategy = (
             self._conf_get('memcache_security_strategy'))
+        if self._share_admin_token and (
+                (memcache_security_strategy or '').upper() not in
+                ('ENCRYPT', 'AEAD')):
+            raise ConfigurationError('memcache_security_strategy must be '
+                                     'ENCRYPT or AEAD when share_admin_token '
+                                     'is enabled')
 
         self._token_cache = TokenCache(
             self.LOG,
@@ -555,18 +893,55 @@ class AuthProtocol(object):
             env_cache_name=self._conf_get('cache'),
             memcached_servers=self._conf_get('memcached_servers'),
             memcache_security_strategy=memcache_security_strategy,
-            memcache_secret_key=self._conf_get('memcache_secret_key'))
+            memcache_secret_key=self._conf_get('memcache_secret_key'),
+            cache_backend=self._conf_get('cache_backend'),
+            shared_cache_dir=self._conf_get('shared_cache_dir'),
+            redis_url=self._conf_get('redis_url'),
+            metrics=self._metrics,
+            offload=self._offload)
 
         self._token_revocation_list = None
         self._token_revocation_list_fetched_time = None
+        self._revocation_index = None
         self.token_revocation_list_cache_timeout = datetime.timedelta(
             seconds=self._conf_get('revocation_cache_time'))
+
+        self._revocation_events = None
+        if self._conf_get('revocation_events'):
+            self._revocation_events = revocation.RevocationEvents(
+                max_token_lifetime=int(self._conf_get('max_token_lifetime')))
+        self._revocation_events_fetched_time = None
+        self._revocation_events_reconciled_time = None
+        self._revocation_events_lock = threading.Lock()
+        self.revocation_reconcile_timeout = datetime.timedelta(
+            seconds=int(self._conf_get('revocation_reconcile_time')))
         http_connect_timeout_cfg = self._conf_get('http_connect_timeout')
         self.http_connect_timeout = (http_connect_timeout_cfg and
                                      int(http_connect_timeout_cfg))
         self.auth_version = None
         self.http_request_max_retries = (
             self._conf_get('http_request_max_retries'))
+        # used for the backoff between retries, which are counted by
+        # _retry_request so that http_request_max_retries can be changed.
+        self._retry_policy = retry.RetryPolicy(backoff=0.5, max_backoff=30.0)
+
+        picker = self._conf_get('identity_uri_picker')
+        if picker not in endpoints.PICKERS:
+            raise ConfigurationError('identity_uri_picker must be one of: %s' %
+                                     ', '.join(endpoints.PICKERS))
+        self._endpoints = endpoints.EndpointPool(
+            [endpoints.Endpoint(uri, breaker=self._make_circuit_breaker(uri))
+             for uri in self.identity_uris],
+            picker=picker)
+        self._hedge_requests = (len(self.identity_uris) > 1 and
+                                self._conf_get('hedge_requests'))
+        self._hedge_threads = _HedgeThreads(self.LOG, HEDGE_THREADS)
+
+        # All requests to the identity server go through a single session so
+        # that connections are pooled and reused between requests.
+        self._session = self._make_session()
+        self._admin_auths = dict((uri, self._make_admin_auth(uri))
+                                 for uri in self.identity_uris)
 
         self.include_service_catalog = self._conf_get(
             'include_service_catalog')
@@ -574,6 +949,17 @@ class AuthProtocol(object):
         self.check_revocations_for_cached = self._conf_get(
             'check_revocations_for_cached')
 
+        self._validation_daemon = None
+        daemon_socket = self._conf_get('validation_daemon_socket')
+        if daemon_socket:
+            self._validation_daemon = validation_daemon.ValidationClient(
+                daemon_socket,
+                timeout=int(self._conf_get('validation_daemon_timeout')))
+
+        self._pid = os.getpid()
+        if self._conf_get('warm_up'):
+            self.warm_up()
+
     def _conf_get(self, name):
         # try config from paste-deploy first
         if name in self.conf:
@@ -581,6 +967,72 @@ class AuthProtocol(object):
         else:
             return CONF.keystone_authtoken[name]
 
+    def _make_session(self):
+        if self.cert_file and self.key_file:
+            cert = (self.cert_file, self.key_file)
+        else:
+            cert = None
+            if self.cert_file or self.key_file:
+                self.LOG.warn('Cannot use only a cert or key file. '
+                              'Please provide both. Ignoring.')
+
+        verify = self.ssl_ca_file or True
+        if self.ssl_insecure:
+            verify = False
+
+        return client_session.Session(auth=_AdminTokenPlugin(self),
+                                      session=requests.Session(),
+                                      verify=verify,
+                                      cert=cert,
+                                      timeout=self.http_connect_timeout)
+
+    def _make_circuit_breaker(self, identity_uri):
+        if not self._conf_get('circuit_breaker_enabled'):
+            return None
+
+        error_rate = float(self._conf_get('circuit_breaker_error_rate'))
+        min_requests = int(self._conf_get('circuit_breaker_min_requests'))
+        window = int(self._conf_get('circuit_breaker_window'))
+        if not 0 < error_rate <= 1:
+            raise ConfigurationError('circuit_breaker_error_rate must be '
+                                     'greater than 0 and at most 1')
+        if min_requests < 1:
+            raise ConfigurationError('circuit_breaker_min_requests must be '
+                                     'at least 1')
+        if window <= 0:
+            raise ConfigurationError('circuit_breaker_window must be greater '
+                                     'than 0')
+
+        return circuit_breaker.CircuitBreaker(
+            self.LOG,
+            identity_uri,
+            error_rate=error_rate,
+            min_requests=min_requests,
+            window=window,
+            reset_timeout=int(self._conf_get('circuit_breaker_reset_timeout')),
+            metrics=self._metrics)
+
+    def _make_admin_auth(self, identity_uri):
+        """Create the identity plugin that fetches the admin token.
+
+        The v3 Identity API is used if the service account has a domain
+        configured, otherwise the v2 API is used.
+
+        """
+        if self.admin_user_domain_name or self.admin_project_domain_name:
+            return v3_auth.Password(
+                '%s/v3' % identity_uri,
+                username=self.admin_user,
+                password=self.admin_password,
+                user_domain_name=self.admin_user_domain_name,
+                project_name=self.admin_tenant_name,
+                project_domain_name=self.admin_project_domain_name)
+
+        return v2_auth.Password('%s/v2.0' % identity_uri,
+                                username=self.admin_user,
+                                password=self.admin_password,
+                                tenant_name=self.admin_tenant_name)
+
     def _choose_api_version(self):
         """Determine the api version that we should use."""
 
@@ -614,6 +1066,71 @@ class AuthProtocol(object):
                 raise ServiceError('No compatible apis supported by server')
         return version_to_use
 
+    def warm_up(self):
+        """Prepare the state that is otherwise set up by the first requests.
+
+        The Identity API version is chosen and the admin token, signing
+        certificates and revocation list are fetched. A server that calls
+        this before forking its workers, for example from the master process
+        of uWSGI, has each worker inherit the state instead of every worker
+        fetching it at once when they start serving requests.
+
+        Anything that can't be prepared is logged and set up on first use.
+
+        """
+        steps = [self._warm_up_auth_version, self.get_admin_token,
+                 self._warm_up_certs, self._warm_up_revocations]
+        for step in steps:
+            try:
+                step()
+            except (NetworkError, ServiceError,
+                    exceptions.CertificateConfigError) as e:
+                self.LOG.warning('Unable to prepare auth_token middleware, '
+                                 'it will be prepared on first use: %s', e)
+
+        # connections opened by this process aren't inherited by workers.
+        self._session.session.close()
+
+    def _warm_up_auth_version(self):
+        if not self.auth_version:
+            self.auth_version = self._choose_api_version()
+
+    def _warm_up_certs(self):
+        if not os.path.exists(self.signing_cert_file_name):
+            self.fetch_signing_cert()
+        if not os.path.exists(self.signing_ca_file_name):
+            self.fetch_ca_cert()
+
+    def _warm_up_revocations(self):
+        if self._revocation_events is not None:
+            self._sync_revocation_events()
+        else:
+            self._get_revocation_index()
+
+    def _reset_after_fork(self):
+        """Drop the state that a forked process can't share with its parent.
+
+        Connections to the identity server, caches and validation daemon are
+        opened again as they are needed. Locks are replaced in case another
+        thread of the parent held them when it forked.
+
+        """
+        self._pid = os.getpid()
+        self._admin_token_lock = threading.Lock()
+        self._revocation_events_lock = threading.Lock()
+        self._session.session.close()
+        self._token_cache.reset()
+        self._hedge_threads.reset()
+        if self._validation_daemon:
+            self._validation_daemon.reset()
+        if self._offload:
+            self._offload.reset()
+
+        # pick a new time to renew an inherited admin token so that the
+        # workers don't all renew it at the same time.
+        if self.admin_token and self.admin_token_expiry:
+            self._set_admin_token(self.admin_token, self.admin_token_expiry)
+
     def _get_supported_versions(self):
         versions = []
         response, data = self._json_request('GET', '/')
@@ -647,12 +1164,16 @@ class AuthProtocol(object):
         """
         self.LOG.debug('Authenticating user token')
 
+        if os.getpid() != self._pid:
+            self._reset_after_fork()
+
+        env['keystone.token_metrics'] = self._metrics
         self._token_cache.initialize(env)
 
         try:
             self._remove_auth_headers(env)
             user_token = self._get_user_token_from_header(env)
-            token_info = self._validate_user_token(user_token, env)
+            token_info = self._validate_token(user_token, env)
             env['keystone.token_info'] = token_info
             user_headers = self._build_user_headers(token_info)
             self._add_headers(env, user_headers)
@@ -668,6 +1189,12 @@ class AuthProtocol(object):
                 self.LOG.info('Invalid user token - rejecting request')
                 return self._reject_request(env, start_response)
 
+        except CircuitOpenError as e:
+            self.LOG.warn('Unable to validate token: %s', e)
+            resp = MiniResp('Service unavailable', env)
+            start_response('503 Service Unavailable', resp.headers)
+            return resp.body
+
         except ServiceError as e:
             self.LOG.critical('Unable to obtain admin token: %s', e)
             resp = MiniResp('Service unavailable', env)
@@ -744,60 +1271,381 @@ class AuthProtocol(object):
         it for expiration, and request a new token is the existing token
         is about to expire.
 
+        Once the token enters its refresh period a single caller renews it,
+        either inline or in a background thread, while every other caller
+        continues to use the current token. Callers only wait for a new token
+        if there is no valid token available.
+
         :return admin token id
         :raise ServiceError when unable to retrieve token from keystone
 
         """
-        if self.admin_token_expiry:
+        if self.admin_token and self.admin_token_expiry:
             if will_expire_soon(self.admin_token_expiry):
                 self.admin_token = None
+            elif self._admin_token_needs_refresh():
+                if self._admin_token_background_refresh:
+                    self._start_admin_token_refresh()
+                else:
+                    self._refresh_admin_token(blocking=False)
 
         if not self.admin_token:
-            (self.admin_token,
-             self.admin_token_expiry) = self._request_admin_token()
+            self._refresh_admin_token(blocking=True)
 
         return self.admin_token
 
-    def _http_request(self, method, path, **kwargs):
-        """HTTP request helper used to make unspecified content type requests.
+    def _admin_token_needs_refresh(self):
+        return (self._admin_token_refresh_at is not None and
+                timeutils.utcnow() >= self._admin_token_refresh_at)
 
-        :param method: http method
-        :param path: relative request url
-        :return (http response object, response body)
-        :raise ServerError when unable to communicate with keystone
+    def _set_admin_token(self, token, expiry):
+        """Save a new admin token and pick when to start renewing it.
+
+        The renewal time is jittered so that workers started at the same time
+        don't all renew their tokens at the same time.
+        """
+        refresh_time = self._admin_token_refresh_time
+        if refresh_time:
+            # don't spend more than half the token's life renewing it.
+            lifetime = timeutils.delta_seconds(timeutils.utcnow(), expiry)
+            refresh_time = min(refresh_time, lifetime / 2.0)
+            refresh_at = expiry - datetime.timedelta(
+                seconds=refresh_time * random.uniform(0.5, 1.0))
+        else:
+            refresh_at = None
+
+        self._admin_token_refresh_at = refresh_at
+        self.admin_token_expiry = expiry
+        self.admin_token = token
+
+    def _reject_admin_token(self, token):
+        """Forget an admin token that keystone will no longer accept.
+
+        :param token: The token that was rejected. If the admin token has
+                      been renewed since it was sent nothing is done, so
+                      that the new token isn't discarded.
 
         """
-        url = '%s/%s' % (self.identity_uri, path.lstrip('/'))
+        if token is None or token != self.admin_token:
+            return
 
-        kwargs.setdefault('timeout', self.http_connect_timeout)
-        if self.cert_file and self.key_file:
-            kwargs['cert'] = (self.cert_file, self.key_file)
-        elif self.cert_file or self.key_file:
-            self.LOG.warn('Cannot use only a cert or key file. '
-                          'Please provide both. Ignoring.')
+        self._rejected_admin_token = token
+        self.admin_token = None
 
-        kwargs['verify'] = self.ssl_ca_file or True
-        if self.ssl_insecure:
-            kwargs['verify'] = False
+    def _refresh_admin_token(self, blocking=True):
+        """Fetch a new admin token unless one is already being fetched.
+
+        :param blocking: If there is already a fetch in progress wait for it
+                         to complete rather than returning immediately.
+
+        """
+        if not self._admin_token_lock.acquire(blocking):
+            return
+
+        try:
+            if self.admin_token and not will_expire_soon(
+                    self.admin_token_expiry):
+                if blocking or not self._admin_token_needs_refresh():
+                    # someone else fetched a token while we were waiting.
+                    return
+
+            shared = self._get_shared_admin_token()
+            if shared:
+                self.LOG.debug('Using admin token shared by another worker')
+                self._set_admin_token(*shared)
+                return
+
+            try:
+                token, expiry = self._request_admin_token()
+            except (NetworkError, ServiceError):
+                if blocking:
+                    raise
+
+                # the current token is still valid so keep using it and try
+                # renewing it again shortly.
+                self.LOG.warning('Unable to renew admin token, will retry')
+                self._admin_token_refresh_at = (
+                    timeutils.utcnow() +
+                    datetime.timedelta(seconds=ADMIN_TOKEN_RETRY_DELAY))
+                return
+
+            self._set_admin_token(token, expiry)
+            self._store_shared_admin_token(token, expiry)
+        finally:
+            self._admin_token_lock.release()
+
+    def _start_admin_token_refresh(self):
+        """Renew the admin token in a background thread."""
+        def refresh():
+            try:
+                self._refresh_admin_token(blocking=False)
+            except Exception:
+                self.LOG.exception('Failed to renew admin token')
+
+        if self._admin_token_lock.locked():
+            return
+
+        t = threading.Thread(target=refresh)
+        t.daemon = True
+        t.start()
+
+    def _shared_admin_token_id(self):
+        # The key identifies the user and project so that it changes if they
+        # do. The password isn't part of it as the key would then allow the
+        # password to be guessed offline.
+        parts = (self.identity_uri, self.admin_user, self.admin_tenant_name,
+                 self.admin_user_domain_name, self.admin_project_domain_name)
+        key = '\0'.join(p or '' for p in parts)
+        return 'admin/%s' % hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _get_shared_admin_token(self):
+        """Return an admin token stored by another worker.
+
+        :returns: a tuple of the token id and expiry or None if there is no
+                  usable token in the cache.
+
+        """
+        if not (self._share_admin_token and self._token_cache.initialized):
+            return None
+
+        try:
+            cached = self._token_cache.get_entry(
+                self._shared_admin_token_id())
+        except InvalidUserToken:
+            return None
+
+        if not cached or cached['id'] in (self.admin_token,
+                                          self._rejected_admin_token):
+            return None
+
+        expiry = timeutils.normalize_time(
+            timeutils.parse_isotime(cached['expires']))
+        if will_expire_soon(expiry):
+            return None
+
+        # A token in its refresh period will be renewed, and published, by
+        # the first worker to notice.
+        refresh_at = expiry - datetime.timedelta(
+            seconds=self._admin_token_refresh_time / 2.0)
+        if timeutils.utcnow() >= refresh_at:
+            return None
+
+        return cached['id'], expiry
+
+    def _store_shared_admin_token(self, token, expiry):
+        if not (self._share_admin_token and self._token_cache.initialized):
+            return
+
+        expires = timeutils.isotime(at=expiry, subsecond=True)
+        self._token_cache.store(self._shared_admin_token_id(),
+                                {'id': token, 'expires': expires},
+                                expires)
+
+    def _acquire_endpoint(self, pending, guarded):
+        while pending:
+            endpoint = pending.pop(0)
+            if not guarded or endpoint.allow_request():
+                return endpoint
+        return None
+
+    def _attempt(self, endpoint, func, record):
+        """Call func with the endpoint's URL.
+
+        Only a server that can't be reached, times out or responds with a
+        server error has failed, and only those failures are recorded and
+        retried. Any other exception, such as a ServiceError when the admin
+        token can't be fetched, is returned as not failed so that it is
+        raised straight away.
+
+        :returns: a tuple of the result, the exception raised and whether the
+                  attempt failed.
+
+        """
+        result = error = None
+        endpoint.start()
+        start = endpoints._monotonic()
+        try:
+            result = func(endpoint.url)
+        except Exception as e:
+            error = e
+        elapsed = endpoints._monotonic() - start
+
+        if error is None:
+            failed = getattr(result, 'status_code', 0) >= 500
+        elif isinstance(error, (exceptions.ConnectionRefused,
+                                exceptions.RequestTimeout)):
+            failed = True
+        elif isinstance(error, exceptions.HttpError):
+            failed = (error.http_status or 0) >= 500
+        else:
+            # not a failure of the identity server, but not a success either
+            # so a trial request let through by its breaker is given up.
+            endpoint.finish()
+            if record:
+                endpoint.release()
+            return result, error, False
+
+        endpoint.finish(elapsed if error is None else None, failed=failed)
+        if record:
+            endpoint.record(failed)
+        return result, error, failed
+
+    def _return_endpoint(self, endpoint, pending, guarded):
+        """Put back an endpoint that was acquired but not used."""
+        if guarded:
+            endpoint.release()
+        pending.insert(0, endpoint)
+
+    def _hedged_attempt(self, endpoint, pending, func, guarded):
+        """Attempt a request, sending it to a second endpoint if it's slow.
+
+        The request is only hedged if another endpoint can be used, and the
+        attempts are made in _hedge_threads so that a slow server can't
+        cause an unbounded number of threads to be started.
+
+        :returns: the endpoint used and the outcome of its attempt.
+
+        """
+        delay = endpoint.p99()
+        hedge = None
+        if delay is not None:
+            hedge = self._acquire_endpoint(pending, guarded)
+        if hedge is None:
+            return endpoint, self._attempt(endpoint, func, guarded)
+
+        outcomes = six.moves.queue.Queue()
+
+        def attempt(e):
+            outcomes.put((e, self._attempt(e, func, guarded)))
+
+        if not self._hedge_threads.spawn(attempt, endpoint):
+            self._return_endpoint(hedge, pending, guarded)
+            return endpoint, self._attempt(endpoint, func, guarded)
+
+        try:
+            first = outcomes.get(timeout=delay)
+        except six.moves.queue.Empty:
+            pass
+        else:
+            self._return_endpoint(hedge, pending, guarded)
+            return first
+
+        if not self._hedge_threads.spawn(attempt, hedge):
+            self._return_endpoint(hedge, pending, guarded)
+            return outcomes.get()
+
+        self.LOG.debug('%s is slow, also sending the request to %s',
+                       endpoint.url, hedge.url)
+        self._metrics.increment('hedged_requests')
+
+        first = outcomes.get()
+        if not first[1][2]:
+            return first
+        return outcomes.get()
+
+    def _retry_request(self, func, guarded=True, hedge=False):
+        """Call func with the root URL of an identity server.
+
+        The servers are tried in the order chosen by the endpoint picker,
+        failing over to the next one if a server can't be reached or responds
+        with a server error. Servers that couldn't be reached are then
+        retried up to http_request_max_retries times.
+
+        The first attempt on each server is recorded by its circuit breaker
+        and servers with an open breaker are skipped.
 
+        :param func: called with the URL, returns a response or raises.
+        :param guarded: If False the circuit breakers aren't used. The admin
+                        token is fetched without them as it is fetched while a
+                        request that was let through is being made.
+        :param hedge: If True the request may be hedged, see hedge_requests.
+
+        :raise NetworkError when unable to communicate with keystone
+        :raise CircuitOpenError when requests to keystone are stopped
+
+        """
         RETRIES = self.http_request_max_retries
+        pending = self._endpoints.ordered()
+        unreachable = []
+        response = server_error = error = None
+        attempted = False
         retry = 0
+
         while True:
-            try:
-                response = requests.request(method, url, **kwargs)
-                break
-            except Exception as e:
-                if retry >= RETRIES:
-                    self.LOG.error('HTTP connection exception: %s', e)
-                    raise NetworkError('Unable to communicate with keystone')
-                # NOTE(vish): sleep 0.5, 1, 2
-                self.LOG.warn('Retrying on HTTP connection exception: %s', e)
-                time.sleep(2.0 ** retry / 2)
+            endpoint = self._acquire_endpoint(pending, guarded)
+            if endpoint and hedge and self._hedge_requests and not attempted:
+                attempted = True
+                endpoint, outcome = self._hedged_attempt(endpoint, pending,
+                                                         func, guarded)
+            elif endpoint:
+                attempted = True
+                outcome = self._attempt(endpoint, func, guarded)
+            elif not attempted:
+                raise CircuitOpenError('Identity server %s is unavailable' %
+                                       ', '.join(self.identity_uris))
+            elif unreachable and retry < RETRIES:
+                # sleep for up to 0.5, 1, 2... seconds, with jitter so that
+                # workers don't all retry at the same moment.
+                self.LOG.warn('Retrying on HTTP connection exception: %s',
+                              error)
+                time.sleep(self._retry_policy.get_backoff(retry))
+                endpoint = unreachable[retry % len(unreachable)]
                 retry += 1
+                outcome = self._attempt(endpoint, func, False)
+            else:
+                break
+
+            result, exc, failed = outcome
+            if not failed:
+                if exc:
+                    raise exc
+                return result
+
+            if exc is None:
+                response = result
+            elif (isinstance(exc, exceptions.HttpError) and
+                    not isinstance(exc, exceptions.RequestTimeout)):
+                server_error = exc
+            else:
+                error = exc
+                if endpoint not in unreachable:
+                    unreachable.append(endpoint)
+
+            if len(self.identity_uris) > 1:
+                self.LOG.warn('Request to %s failed', endpoint.url)
 
-        return response
+        # every server failed, report the best failure.
+        if response is not None:
+            return response
+        if server_error is not None:
+            raise server_error
+        self.LOG.error('HTTP connection exception: %s', error)
+        raise NetworkError('Unable to communicate with keystone')
+
+    def _http_request(self, method, path, **kwargs):
+        """HTTP request helper used to make unspecified content type requests.
+
+        Requests are not authenticated unless authenticated=True is passed, in
+        which case the admin token is attached to the request and renewed if
+        keystone rejects it.
+
+        :param method: http method
+        :param path: relative request url
+        :return (http response object, response body)
+        :raise ServerError when unable to communicate with keystone
+
+        """
+        kwargs.setdefault('authenticated', False)
+        kwargs['raise_exc'] = False
 
-    def _json_request(self, method, path, body=None, additional_headers=None):
+        def request(identity_uri):
+            url = '%s/%s' % (identity_uri, path.lstrip('/'))
+            return self._session.request(url, method, **kwargs)
+
+        return self._retry_request(request, hedge=method == 'GET')
+
+    def _json_request(self, method, path, body=None, additional_headers=None,
+                      **kwargs):
         """HTTP request helper used to make json requests.
 
         :param method: http method
@@ -809,23 +1657,21 @@ class AuthProtocol(object):
         :raise ServerError when unable to communicate with keystone
 
         """
-        kwargs = {
-            'headers': {
-                'Content-type': 'application/json',
-                'Accept': 'application/json',
-            },
+        kwargs['headers'] = {
+            'Content-type': 'application/json',
+            'Accept': 'application/json',
         }
 
         if additional_headers:
             kwargs['headers'].update(additional_headers)
 
         if body:
-            kwargs['data'] = jsonutils.dumps(body)
+            kwargs['data'] = _json.dumps(body)
 
         response = self._http_request(method, path, **kwargs)
 
         try:
-            data = jsonutils.loads(response.text)
+            data = _json.loads(response.content)
         except ValueError:
             self.LOG.debug('Keystone did not return json-encoded body')
             data = {}
@@ -835,45 +1681,84 @@ class AuthProtocol(object):
     def _request_admin_token(self):
         """Retrieve new token as admin user from keystone.
 
-        :return token id upon success
-        :raises ServerError when unable to communicate with keystone
+        The token is fetched by the admin identity plugin, using the v3 API if
+        a domain is configured for the service account and the v2 API if not.
+        The token is valid for validating user tokens of either version.
 
-        Irrespective of the auth version we are going to use for the
-        user token, for simplicity we always use a v2 admin token to
-        validate the user token.
+        :return (token id, expiry) upon success
+        :raises ServerError when unable to communicate with keystone
 
         """
-        params = {
-            'auth': {
-                'passwordCredentials': {
-                    'username': self.admin_user,
-                    'password': self.admin_password,
-                },
-                'tenantName': self.admin_tenant_name,
-            }
-        }
-
-        response, data = self._json_request('POST',
-                                            '/v2.0/tokens',
-                                            body=params)
+        try:
+            auth_ref = self._retry_request(
+                lambda uri: self._admin_auths[uri].get_auth_ref(self._session),
+                guarded=False)
+        except (exceptions.HttpError, exceptions.InvalidResponse) as e:
+            self.LOG.warn('Unexpected response from keystone service: %s', e)
+            raise ServiceError('invalid json response')
 
         try:
-            token = data['access']['token']['id']
-            expiry = data['access']['token']['expires']
+            token = auth_ref.auth_token
+            expiry = auth_ref.expires
             if not (token and expiry):
                 raise AssertionError('invalid token or expire')
-            datetime_expiry = timeutils.parse_isotime(expiry)
-            return (token, timeutils.normalize_time(datetime_expiry))
+            return (token, timeutils.normalize_time(expiry))
         except (AssertionError, KeyError):
-            self.LOG.warn(
-                'Unexpected response from keystone service: %s', data)
+            self.LOG.warn('Unexpected response from keystone service')
             raise ServiceError('invalid json response')
-        except (ValueError):
-            data['access']['token']['id'] = '<SANITIZED>'
-            self.LOG.warn(
-                'Unable to parse expiration time from token: %s', data)
+        except ValueError:
+            self.LOG.warn('Unable to parse expiration time from token')
             raise ServiceError('invalid json response')
 
+    def _validate_token(self, user_token, env):
+        """Validate a token with the validation daemon if there is one.
+
+        :raise InvalidUserToken if token is rejected
+        :raise ServiceError if the token could not be validated
+
+        """
+        daemon = self._validation_daemon
+        if not daemon or not daemon.available():
+            return self._validate_user_token(user_token, env)
+
+        try:
+            status, data = daemon.validate(user_token, env)
+        except validation_daemon.DaemonUnavailable as e:
+            self.LOG.warning('Unable to reach the validation daemon, '
+                             'validating tokens in process: %s', e)
+            self._metrics.increment('validation_daemon.unavailable')
+            return self._validate_user_token(user_token, env)
+
+        if status == validation_daemon.VALID:
+            return data
+        elif status == validation_daemon.INVALID:
+            raise InvalidUserToken('Token authorization failed')
+        elif status == validation_daemon.CIRCUIT_OPEN:
+            raise CircuitOpenError('The validation daemon is not sending '
+                                   'requests to the identity server')
+        raise ServiceError('The validation daemon was unable to validate '
+                           'the token')
+
+    def validate_for_daemon(self, user_token, env):
+        """Validate a token sent to the validation daemon.
+
+        :returns: The status of the validation daemon's response and the
+                  token data if the token is valid.
+
+        """
+        self._token_cache.initialize(env)
+
+        try:
+            data = self._validate_user_token(user_token, env)
+        except InvalidUserToken:
+            return validation_daemon.INVALID, None
+        except CircuitOpenError:
+            return validation_daemon.CIRCUIT_OPEN, None
+        except ServiceError:
+            return validation_daemon.SERVICE_ERROR, None
+
+        return validation_daemon.VALID, data
+
     def _validate_user_token(self, user_token, env, retry=True):
         """Authenticate user token
 
@@ -903,22 +1788,26 @@ class AuthProtocol(object):
                                 'Token is marked as having been revoked')
                             raise InvalidUserToken(
                                 'Token authorization failed')
-            elif cms.is_pkiz(user_token):
-                verified = self.verify_pkiz_token(user_token, token_ids)
-                data = jsonutils.loads(verified)
-            elif cms.is_asn1_token(user_token):
-                verified = self.verify_signed_token(user_token, token_ids)
-                data = jsonutils.loads(verified)
+                    self._check_revocation_events(data)
+            elif cms.is_pkiz(user_token) or cms.is_asn1_token(user_token):
+                data = self._decode_signed_token(user_token, token_ids)
+                self._check_revocation_events(data)
             else:
                 data = self.verify_uuid_token(user_token, retry)
             expires = confirm_token_not_expired(data)
             self._confirm_token_bind(data, env)
-            self._token_cache.store(token_id, data, expires)
+            if not cached:
+                # TokenCache.get() already took care of making the cached
+                # entry available under the preferred hash.
+                self._token_cache.store(token_id, data, expires)
             return data
         except NetworkError:
             self.LOG.debug('Token validation failure.', exc_info=True)
             self.LOG.warn('Authorization failed for token')
             raise InvalidUserToken('Token authorization failed')
+        except CircuitOpenError:
+            # the token may be valid so it must not be cached as invalid.
+            raise
         except Exception:
             self.LOG.debug('Token validation failure.', exc_info=True)
             if token_id:
@@ -971,7 +1860,7 @@ class AuthProtocol(object):
             catalog = auth_ref.service_catalog.get_data()
             if _token_is_v3(token_info):
                 catalog = _v3_to_v2_catalog(catalog)
-            rval['X-Service-Catalog'] = jsonutils.dumps(catalog)
+            rval['X-Service-Catalog'] = _json.dumps(catalog)
 
         return rval
 
@@ -1075,6 +1964,7 @@ class AuthProtocol(object):
                                'identifier': identifier})
                 self._invalid_user_token()
 
+    @metrics.timed('verify_uuid_token')
     def verify_uuid_token(self, user_token, retry=True):
         """Authenticate user token with keystone.
 
@@ -1091,9 +1981,10 @@ class AuthProtocol(object):
         if not self.auth_version:
             self.auth_version = self._choose_api_version()
 
+        # The session attaches the admin token and, if keystone rejects it,
+        # fetches a new one and retries the request.
         if self.auth_version == 'v3.0':
-            headers = {'X-Auth-Token': self.get_admin_token(),
-                       'X-Subject-Token': safe_quote(user_token)}
+            headers = {'X-Subject-Token': safe_quote(user_token)}
             path = '/v3/auth/tokens'
             if not self.include_service_catalog:
                 # NOTE(gyee): only v3 API support this option
@@ -1101,13 +1992,13 @@ class AuthProtocol(object):
             response, data = self._json_request(
                 'GET',
                 path,
-                additional_headers=headers)
+                additional_headers=headers,
+                authenticated=True)
         else:
-            headers = {'X-Auth-Token': self.get_admin_token()}
             response, data = self._json_request(
                 'GET',
                 '/v2.0/tokens/%s' % safe_quote(user_token),
-                additional_headers=headers)
+                authenticated=True)
 
         if response.status_code == 200:
             return data
@@ -1115,9 +2006,11 @@ class AuthProtocol(object):
             self.LOG.warn('Authorization failed for token')
             raise InvalidUserToken('Token authorization failed')
         if response.status_code == 401:
+            # a freshly fetched admin token was rejected as well.
             self.LOG.info(
                 'Keystone rejected admin token, resetting')
-            self.admin_token = None
+            self._reject_admin_token(_sent_token(response))
+            retry = False
         else:
             self.LOG.error('Bad response code while validating token: %s',
                            response.status_code)
@@ -1139,14 +2032,14 @@ class AuthProtocol(object):
 
     def _is_token_id_in_revoked_list(self, token_id):
         """Indicate whether the token_id appears in the revocation list."""
-        revocation_list = self.token_revocation_list
-        revoked_tokens = revocation_list.get('revoked', None)
-        if not revoked_tokens:
+        if self._revocation_events is not None:
+            # revocation events don't list token IDs, the token data is
+            # checked by _check_revocation_events instead.
             return False
 
-        revoked_ids = (x['id'] for x in revoked_tokens)
-        return token_id in revoked_ids
+        return token_id in self._get_revocation_index()
 
+    @metrics.timed('cms_verify')
     def cms_verify(self, data, inform=cms.PKI_ASN1_FORM):
         """Verifies the signature of the provided data's IAW CMS syntax.
 
@@ -1178,12 +2071,44 @@ class AuthProtocol(object):
                 self.LOG.error('CMS Verify output: %s', err.output)
                 raise
 
+    def _decode_signed_token(self, user_token, token_ids):
+        """Verify a PKI or PKIZ token and return its data.
+
+        Large tokens are verified and decoded in the offload pool, if there
+        is one.
+        """
+        if self._offload is not None:
+            with self._offload.reserve(len(user_token)) as pool:
+                if pool is not None:
+                    return self._offload_signed_token(pool, user_token,
+                                                      token_ids)
+
+        if cms.is_pkiz(user_token):
+            verified = self.verify_pkiz_token(user_token, token_ids)
+        else:
+            verified = self.verify_signed_token(user_token, token_ids)
+        return _json.loads(verified)
+
+    def _offload_signed_token(self, pool, user_token, token_ids):
+        if self.is_signed_token_revoked(token_ids):
+            raise InvalidUserToken('Token has been revoked')
+
+        args = (user_token, self.signing_cert_file_name,
+                self.signing_ca_file_name)
+        try:
+            return pool.apply(offload.verify_signed_token, *args)
+        except exceptions.CertificateConfigError:
+            # the certs might be missing, as in cms_verify.
+            self.fetch_signing_cert()
+            self.fetch_ca_cert()
+            return pool.apply(offload.verify_signed_token, *args)
+
     def verify_signed_token(self, signed_text, token_ids):
         """Check that the token is unrevoked and has a valid signature."""
         if self.is_signed_token_revoked(token_ids):
             raise InvalidUserToken('Token has been revoked')
 
-        formatted = cms.token_to_cms(signed_text)
+        formatted = cms.token_to_pem(signed_text)
         verified = self.cms_verify(formatted)
         return verified
 
@@ -1194,8 +2119,8 @@ class AuthProtocol(object):
             uncompressed = cms.pkiz_uncompress(signed_text)
             verified = self.cms_verify(uncompressed, inform=cms.PKIZ_CMS_FORM)
             return verified
-        # TypeError If the signed_text is not zlib compressed
-        except TypeError:
+        # TypeError or binascii.Error If the signed_text is not base64
+        except (TypeError, binascii.Error):
             raise InvalidUserToken(signed_text)
 
     def verify_signing_dir(self):
@@ -1215,6 +2140,62 @@ class AuthProtocol(object):
         else:
             os.makedirs(self.signing_dirname, stat.S_IRWXU)
 
+    @property
+    def revoked_index_file_name(self):
+        return os.path.splitext(self.revoked_file_name)[0] + '.idx'
+
+    def _get_revocation_index(self):
+        """Return the index of the current revocation list.
+
+        The list is fetched when it is out of date, unless another process
+        sharing the signing_dir has written a current index since.
+
+        """
+        now = timeutils.utcnow()
+        timeout = self.token_revocation_list_cache_timeout
+
+        if now >= self.token_revocation_list_fetched_time + timeout:
+            written = self._revocation_index_written_time()
+            if written and now < written + timeout:
+                self.token_revocation_list_fetched_time = written
+                self._token_revocation_list = None
+                self._revocation_index = None
+            else:
+                try:
+                    self.token_revocation_list = self.fetch_revocation_list()
+                except CircuitOpenError:
+                    if self._revocation_index is None and not written:
+                        raise
+                    # keep checking against the list we have until keystone
+                    # recovers rather than failing every request.
+                    self.LOG.warn('Unable to fetch the revocation list, '
+                                  'using the previously fetched list')
+
+        if self._revocation_index is None:
+            self._revocation_index = self._load_revocation_index()
+        return self._revocation_index
+
+    def _revocation_index_written_time(self):
+        try:
+            mtime = os.path.getmtime(self.revoked_index_file_name)
+        except OSError:
+            return None
+        return datetime.datetime.utcfromtimestamp(mtime)
+
+    def _load_revocation_index(self):
+        try:
+            return revocation.RevocationIndex(self.revoked_index_file_name)
+        except (IOError, OSError, ValueError):
+            # the list on disk may have been written without an index, by an
+            # older version of the middleware.
+            self._write_revocation_index(self.token_revocation_list)
+            return revocation.RevocationIndex(self.revoked_index_file_name)
+
+    def _write_revocation_index(self, revocation_list):
+        token_ids = [x['id'] for x in revocation_list.get('revoked', [])]
+        self._atomic_write_to_signing_dir(self.revoked_index_file_name,
+                                          revocation.encode_index(token_ids))
+
     @property
     def token_revocation_list_fetched_time(self):
         if not self._token_revocation_list_fetched_time:
@@ -1244,9 +2225,17 @@ class AuthProtocol(object):
             if not self._token_revocation_list:
                 open_kwargs = {'encoding': 'utf-8'} if six.PY3 else {}
                 with open(self.revoked_file_name, 'r', **open_kwargs) as f:
-                    self._token_revocation_list = jsonutils.loads(f.read())
+                    self._token_revocation_list = _json.loads(f.read())
         else:
-            self.token_revocation_list = self.fetch_revocation_list()
+            try:
+                self.token_revocation_list = self.fetch_revocation_list()
+            except CircuitOpenError:
+                if self._token_revocation_list is None:
+                    raise
+                # keep checking against the list we have until keystone
+                # recovers rather than failing every request.
+                self.LOG.warn('Unable to fetch the revocation list, using '
+                              'the previously fetched list')
         return self._token_revocation_list
 
     def _atomic_write_to_signing_dir(self, file_name, value):
@@ -1271,29 +2260,124 @@ class AuthProtocol(object):
     def token_revocation_list(self, value):
         """Save a revocation list to memory and to disk.
 
+        The IDs of the revoked tokens are also written to an index that is
+        shared by every process using the same signing_dir.
+
         :param value: A json-encoded revocation list
 
         """
-        self._token_revocation_list = jsonutils.loads(value)
+        self._token_revocation_list = _json.loads(value)
         self.token_revocation_list_fetched_time = timeutils.utcnow()
+        self._metrics.gauge('revocation_list.size',
+                            len(self._token_revocation_list.get('revoked',
+                                                                [])))
         self._atomic_write_to_signing_dir(self.revoked_file_name, value)
+        self._write_revocation_index(self._token_revocation_list)
+        self._revocation_index = None
 
+    @metrics.timed('fetch_revocation_list')
     def fetch_revocation_list(self, retry=True):
-        headers = {'X-Auth-Token': self.get_admin_token()}
+        # retry allows the session to renew a rejected admin token and try
+        # again.
         response, data = self._json_request('GET', '/v2.0/tokens/revoked',
-                                            additional_headers=headers)
+                                            authenticated=True,
+                                            allow_reauth=retry)
         if response.status_code == 401:
-            if retry:
-                self.LOG.info(
-                    'Keystone rejected admin token, resetting admin token')
-                self.admin_token = None
-                return self.fetch_revocation_list(retry=False)
+            self.LOG.info(
+                'Keystone rejected admin token, resetting admin token')
+            self._reject_admin_token(_sent_token(response))
         if response.status_code != 200:
             raise ServiceError('Unable to fetch token revocation list.')
         if 'signed' not in data:
             raise ServiceError('Revocation list improperly formatted.')
         return self.cms_verify(data['signed'])
 
+    def _check_revocation_events(self, data):
+        """Reject the token if a revocation event matches its data."""
+        if self._revocation_events is None:
+            return
+
+        self._sync_revocation_events()
+        if self._revocation_events.is_revoked(data):
+            self.LOG.debug('Token is revoked by a revocation event')
+            raise InvalidUserToken('Token has been revoked')
+
+    def _sync_revocation_events(self):
+        """Fetch the revocation events that are new since the last fetch.
+
+        Every revocation_reconcile_time every event is fetched instead.
+        While one request fetches events the others use the events that have
+        already been fetched, unless none have been.
+
+        """
+        fetched = self._revocation_events_fetched_time
+        now = timeutils.utcnow()
+        timeout = self.token_revocation_list_cache_timeout
+        if fetched and now < fetched + timeout:
+            return
+
+        if not self._revocation_events_lock.acquire(fetched is None):
+            return
+
+        try:
+            if self._revocation_events_fetched_time != fetched:
+                # another request fetched them while this one waited.
+                return
+
+            reconciled = self._revocation_events_reconciled_time
+            reconcile = (reconciled is None or
+                         now >= reconciled + self.revocation_reconcile_timeout)
+            since = None if reconcile else self._revocation_events.since
+
+            try:
+                events = self.fetch_revocation_events(since)
+            except CircuitOpenError:
+                if fetched is None:
+                    raise
+                self.LOG.warn('Unable to fetch revocation events, using '
+                              'the previously fetched events')
+                return
+
+            if reconcile:
+                self._revocation_events.replace(events)
+                self._revocation_events_reconciled_time = now
+            else:
+                self._revocation_events.add(events)
+            self._revocation_events.expire(now)
+            self._revocation_events_fetched_time = now
+
+            self._metrics.gauge('revocation_events.size',
+                                len(self._revocation_events))
+        finally:
+            self._revocation_events_lock.release()
+
+    @metrics.timed('fetch_revocation_events')
+    def fetch_revocation_events(self, since=None, retry=True):
+        """Fetch the revocation events of the OS-REVOKE extension.
+
+        :param datetime since: Only fetch the events revoked after this time.
+        :returns: A list of events.
+
+        """
+        path = '/v3/OS-REVOKE/events'
+        if since:
+            path += '?' + urllib.parse.urlencode(
+                {'since': timeutils.isotime(since)})
+
+        response, data = self._json_request('GET', path,
+                                            authenticated=True,
+                                            allow_reauth=retry)
+        if response.status_code == 401:
+            self.LOG.info(
+                'Keystone rejected admin token, resetting admin token')
+            self._reject_admin_token(_sent_token(response))
+        if response.status_code != 200:
+            raise ServiceError('Unable to fetch revocation events.')
+        try:
+            return data['events']
+        except (KeyError, TypeError):
+            raise ServiceError('Revocation events improperly formatted.')
+
     def _fetch_cert_file(self, cert_file_name, cert_type):
         if not self.auth_version:
             self.auth_version = self._choose_api_version()
@@ -1319,9 +2403,16 @@ class AuthProtocol(object):
 class CachePool(list):
     """A lazy pool of cache references."""
 
-    def __init__(self, cache, memcached_servers):
+    def __init__(self, cache, memcached_servers,
+                 backend=cache_backends.MEMCACHE, metrics=None,
+                 **backend_options):
         self._environment_cache = cache
         self._memcached_servers = memcached_servers
+        self._backend = backend
+        self._backend_options = backend_options
+        self._metrics = metrics or _NO_METRICS
+        self._size = 0
+        self._size_lock = threading.Lock()
 
     @contextlib.contextmanager
     def reserve(self):
@@ -1335,7 +2426,13 @@ class CachePool(list):
             c = self.pop()
         except IndexError:
             # the pool is empty, so we need to create a new client
-            c = memorycache.get_client(self._memcached_servers)
+            c = cache_backends.get_client(
+                self._backend,
+                memcached_servers=self._memcached_servers,
+                **self._backend_options)
+            with self._size_lock:
+                self._size += 1
+                self._metrics.gauge('cache_pool.size', self._size)
 
         try:
             yield c
@@ -1363,12 +2460,19 @@ class TokenCache(object):
 
     def __init__(self, log, cache_time=None, hash_algorithms=None,
                  env_cache_name=None, memcached_servers=None,
-                 memcache_security_strategy=None, memcache_secret_key=None):
+                 memcache_security_strategy=None, memcache_secret_key=None,
+                 cache_backend=None, shared_cache_dir=None, redis_url=None,
+                 metrics=None, offload=None):
         self.LOG = log
+        self._metrics = metrics or _NO_METRICS
+        self._offload = offload
         self._cache_time = cache_time
         self._hash_algorithms = hash_algorithms
         self._env_cache_name = env_cache_name
         self._memcached_servers = memcached_servers
+        self._cache_backend = cache_backend or cache_backends.MEMCACHE
+        self._shared_cache_dir = shared_cache_dir
+        self._redis_url = redis_url
 
         # memcache value treatment, ENCRYPT or MAC
         self._memcache_security_strategy = memcache_security_strategy
@@ -1380,6 +2484,7 @@ class TokenCache(object):
         self._cache_pool = None
         self._initialized = False
 
+        self._assert_valid_cache_backend_config()
         self._assert_valid_memcache_protection_config()
 
     def initialize(self, env):
@@ -1387,9 +2492,22 @@ class TokenCache(object):
             return
 
         self._cache_pool = CachePool(env.get(self._env_cache_name),
-                                     self._memcached_servers)
+                                     self._memcached_servers,
+                                     backend=self._cache_backend,
+                                     shared_cache_dir=self._shared_cache_dir,
+                                     redis_url=self._redis_url,
+                                     metrics=self._metrics)
         self._initialized = True
 
+    @property
+    def initialized(self):
+        return self._initialized
+
+    def reset(self):
+        """Forget the cache clients so that initialize() creates new ones."""
+        self._cache_pool = None
+        self._initialized = False
+
     def get(self, user_token):
         """Check if the token is cached already.
 
@@ -1399,28 +2517,47 @@ class TokenCache(object):
         The second element is the token data from the cache if the token was
         cached, otherwise ``None``.
 
+        All of the token IDs are looked up in a single request to the cache.
+        If the token was only found under one of the secondary hashes it is
+        written back under the preferred hash so that later lookups hit the
+        preferred key first.
+
         :raises InvalidUserToken: if the token is invalid
 
         """
 
         if cms.is_asn1_token(user_token):
             # user_token is a PKI token that's not hashed.
+            token_hashes = cms.cms_hash_token_modes(user_token,
+                                                    self._hash_algorithms)
+        else:
+            # user_token is either a UUID token or a hashed PKI token.
+            token_hashes = [user_token]
 
-            token_hashes = list(cms.cms_hash_token(user_token, mode=algo)
-                                for algo in self._hash_algorithms)
-
-            for token_hash in token_hashes:
-                cached = self._cache_get(token_hash)
-                if cached:
-                    return (token_hashes, cached)
-
+        token_id, cached = self._cache_get_many(token_hashes)
+        if cached is None:
             # The token wasn't found using any hash algorithm.
+            self._metrics.increment('token_cache.miss')
             return (token_hashes, None)
 
-        # user_token is either a UUID token or a hashed PKI token.
-        token_id = user_token
-        cached = self._cache_get(token_id)
-        return ([token_id], cached)
+        self._metrics.increment('token_cache.hit')
+
+        if token_id != token_hashes[0]:
+            self.LOG.debug('Storing cached token under preferred hash')
+            self._cache_store(token_hashes[0], cached)
+
+        return (token_hashes, cached[0])
+
+    def get_entry(self, key):
+        """Return data stored with store() under a key that isn't a token.
+
+        Unlike get() the lookup isn't counted as a token cache hit or miss.
+
+        :returns: the data or None if it isn't cached.
+        :raises InvalidUserToken: if the entry is invalid or has expired
+
+        """
+        return self._cache_get(key)
 
     def store(self, token_id, data, expires):
         """Put token data into the cache.
@@ -1437,68 +2574,98 @@ class TokenCache(object):
         self.LOG.debug('Marking token as unauthorized in cache')
         self._cache_store(token_id, self._INVALID_INDICATOR)
 
+    def _assert_valid_cache_backend_config(self):
+        if self._cache_backend not in cache_backends.BACKENDS:
+            raise ConfigurationError('cache_backend must be one of %s' %
+                                     ', '.join(cache_backends.BACKENDS))
+        if (self._cache_backend == cache_backends.REDIS and
+                not self._redis_url):
+            raise ConfigurationError('redis_url must be defined when the '
+                                     'redis cache_backend is used')
+
     def _assert_valid_memcache_protection_config(self):
         if self._memcache_security_strategy:
-            if self._memcache_security_strategy not in ('MAC', 'ENCRYPT'):
+            if self._memcache_security_strategy not in ('MAC', 'ENCRYPT',
+                                                        'AEAD'):
                 raise ConfigurationError('memcache_security_strategy must be '
-                                         'ENCRYPT or MAC')
+                                         'ENCRYPT, MAC or AEAD')
             if not self._memcache_secret_key:
                 raise ConfigurationError('memcache_secret_key must be defined '
                                          'when a memcache_security_strategy '
                                          'is defined')
 
-    def _cache_get(self, token_id):
-        """Return token information from cache.
+    def _get_cache_key(self, token_id):
+        """Get a unique key for this token id.
 
-        If token is invalid raise InvalidUserToken
-        return token only if fresh (not expired).
-        """
+        Turn the token_id into something that can uniquely identify that token
+        in a key value store.
 
-        if not token_id:
-            # Nothing to do
-            return
+        :returns: a tuple of the cache key and the keys derived for the
+                  memcache security strategy (or ``None`` if no strategy is
+                  configured). The derived keys are needed again to verify or
+                  decrypt the value that is returned from the cache.
 
+        """
         if self._memcache_security_strategy is None:
-            key = CACHE_KEY_TEMPLATE % token_id
-            with self._cache_pool.reserve() as cache:
-                serialized = cache.get(key)
-        else:
-            secret_key = self._memcache_secret_key
-            if isinstance(secret_key, six.string_types):
-                secret_key = secret_key.encode('utf-8')
-            security_strategy = self._memcache_security_strategy
-            if isinstance(security_strategy, six.string_types):
-                security_strategy = security_strategy.encode('utf-8')
-            keys = memcache_crypt.derive_keys(
-                token_id,
-                secret_key,
-                security_strategy)
-            cache_key = CACHE_KEY_TEMPLATE % (
-                memcache_crypt.get_cache_key(keys))
-            with self._cache_pool.reserve() as cache:
-                raw_cached = cache.get(cache_key)
-            try:
-                # unprotect_data will return None if raw_cached is None
-                serialized = memcache_crypt.unprotect_data(keys,
-                                                           raw_cached)
-            except Exception:
-                msg = 'Failed to decrypt/verify cache data'
-                self.LOG.exception(msg)
-                # this should have the same effect as data not
-                # found in cache
-                serialized = None
+            return CACHE_KEY_TEMPLATE % token_id, None
+
+        secret_key = self._memcache_secret_key
+        if isinstance(secret_key, six.string_types):
+            secret_key = secret_key.encode('utf-8')
+        security_strategy = self._memcache_security_strategy
+        if isinstance(security_strategy, six.string_types):
+            security_strategy = security_strategy.encode('utf-8')
+        if isinstance(token_id, six.text_type):
+            token_id = token_id.encode('utf-8')
+        keys = memcache_crypt.derive_keys(
+            token_id,
+            secret_key,
+            security_strategy)
+        cache_key = CACHE_KEY_TEMPLATE % memcache_crypt.get_cache_key(keys)
+        return cache_key, keys
+
+    def _cache_get_multi(self, cache, cache_keys):
+        """Fetch several keys from the cache in as few round trips as possible.
+
+        python-memcached and the cache_backends provide get_multi() which
+        fetches all the keys in a single request. Other caches, like the
+        in-process memorycache or a cache provided by an upstream filter in
+        the environment, are queried a key at a time.
+
+        :returns: a dict of cache key to raw cached value for the keys found.
 
-        if serialized is None:
+        """
+        get_multi = getattr(cache, 'get_multi', None)
+        if len(cache_keys) == 1 or self._env_cache_name or not get_multi:
+            return dict((k, cache.get(k)) for k in cache_keys)
+
+        return get_multi(cache_keys)
+
+    def _deserialize(self, raw_cached, keys):
+        """Turn a raw value from the cache into a cache entry.
+
+        If token is invalid raise InvalidUserToken
+        return the (data, expires) entry only if fresh (not expired).
+        """
+
+        try:
+            cached = self._decode(raw_cached, keys)
+        except offload.ProtectedDataError:
+            msg = 'Failed to decrypt/verify cache data'
+            self.LOG.exception(msg)
+            # this should have the same effect as data not
+            # found in cache
             return None
 
         # Note that _INVALID_INDICATOR and (data, expires) are the only
         # valid types of serialized cache entries, so there is not
-        # a collision with jsonutils.loads(serialized) == None.
-        if not isinstance(serialized, six.string_types):
-            serialized = serialized.decode('utf-8')
-        cached = jsonutils.loads(serialized)
+        # a collision with _json.loads(serialized) == None.
+        if cached is None:
+            return None
+
         if cached == self._INVALID_INDICATOR:
             self.LOG.debug('Cached Token is marked unauthorized')
+            self._metrics.increment('token_cache.invalid')
             raise InvalidUserToken('Token authorization failed')
 
         data, expires = cached
@@ -1515,33 +2682,77 @@ class TokenCache(object):
         utcnow = timeutils.utcnow()
         if utcnow < expires:
             self.LOG.debug('Returning cached token')
-            return data
+            return cached
         else:
             self.LOG.debug('Cached Token seems expired')
             raise InvalidUserToken('Token authorization failed')
 
+    def _decode(self, raw_cached, keys):
+        """Decode a raw value from the cache, in the offload pool if large."""
+        if self._offload is not None and raw_cached is not None:
+            with self._offload.reserve(len(raw_cached)) as pool:
+                if pool is not None:
+                    return pool.apply(offload.decode_cache_entry, keys,
+                                      raw_cached)
+
+        return offload.decode_cache_entry(keys, raw_cached)
+
+    @metrics.timed('token_cache.get')
+    def _cache_get_many(self, token_ids):
+        """Return the first usable cache entry for a list of token ids.
+
+        All the token ids are fetched from the cache in a single request. The
+        results are then checked in the order of token_ids, so the preferred
+        token id should come first.
+
+        :returns: a tuple of the token id that was found and its
+                  (data, expires) cache entry, or (None, None) if none of the
+                  token ids are cached.
+        :raises InvalidUserToken: if the first token id found in the cache is
+                                  marked invalid or has expired.
+
+        """
+        token_ids = [t for t in token_ids if t]
+        if not token_ids:
+            # Nothing to do
+            return (None, None)
+
+        lookups = [self._get_cache_key(token_id) for token_id in token_ids]
+
+        with self._cache_pool.reserve() as cache:
+            raw_cached = self._cache_get_multi(cache,
+                                               [k for k, _ in lookups])
+
+        for token_id, (cache_key, keys) in zip(token_ids, lookups):
+            cached = self._deserialize(raw_cached.get(cache_key), keys)
+            if cached:
+                return (token_id, cached)
+
+        return (None, None)
+
+    def _cache_get(self, token_id):
+        """Return token information from cache.
+
+        If token is invalid raise InvalidUserToken
+        return token only if fresh (not expired).
+        """
+        _, cached = self._cache_get_many([token_id])
+        if cached:
+            return cached[0]
+
     def _cache_store(self, token_id, data):
         """Store value into memcache.
 
         data may be _INVALID_INDICATOR or a tuple like (data, expires)
 
         """
-        serialized_data = jsonutils.dumps(data)
+        serialized_data = _json.dumps(data)
         if isinstance(serialized_data, six.text_type):
             serialized_data = serialized_data.encode('utf-8')
-        if self._memcache_security_strategy is None:
-            cache_key = CACHE_KEY_TEMPLATE % token_id
+        cache_key, keys = self._get_cache_key(token_id)
+        if keys is None:
             data_to_store = serialized_data
         else:
-            secret_key = self._memcache_secret_key
-            if isinstance(secret_key, six.string_types):
-                secret_key = secret_key.encode('utf-8')
-            security_strategy = self._memcache_security_strategy
-            if isinstance(security_strategy, six.string_types):
-                security_strategy = security_strategy.encode('utf-8')
-            keys = memcache_crypt.derive_keys(
-                token_id, secret_key, security_strategy)
-            cache_key = CACHE_KEY_TEMPLATE % memcache_crypt.get_cache_key(keys)
             data_to_store = memcache_crypt.protect_data(keys, serialized_data)
 
         with self._cache_pool.reserve() as cache:
@@ -1564,6 +2775,14 @@ def app_factory(global_conf, **local_conf):
     return AuthProtocol(None, conf)
 
 
+def echo_app(environ, start_response):
+    """A WSGI application that echoes the CGI environment to the user."""
+    start_response('200 OK', [('Content-Type', 'application/json')])
+    environment = dict((k, v) for k, v in six.iteritems(environ)
+                       if k.startswith('HTTP_X_'))
+    yield jsonutils.dumps(environment)
+
+
 if __name__ == '__main__':
     """Run this module directly to start a protected echo service::
 
@@ -1574,13 +2793,6 @@ if __name__ == '__main__':
     module.
 
     """
-    def echo_app(environ, start_response):
-        """A WSGI application that echoes the CGI environment to the user."""
-        start_response('200 OK', [('Content-Type', 'application/json')])
-        environment = dict((k, v) for k, v in six.iteritems(environ)
-                           if k.startswith('HTTP_X_'))
-        yield jsonutils.dumps(environment)
-
     from wsgiref import simple_server
 
     # hardcode any non-default configuration here
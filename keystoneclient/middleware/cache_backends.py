@@ -0,0 +1,339 @@
+# Copyright 2014 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+Cache backends for the auth_token middleware.
+
+Each backend provides the subset of the python-memcached client interface
+that the token cache needs: get(), get_multi(), set() and delete(). Values
+are stored as they are given, so any MAC or ENCRYPT protection applied by
+:py:mod:`keystoneclient.middleware.memcache_crypt` is kept regardless of
+where the data ends up.
+
+The available backends are:
+
+* ``memcache``: memcached if servers are configured, otherwise a cache that
+  is local to the process.
+* ``shared``: a cache of files in a directory on the host, by default in
+  shared memory (``/dev/shm``) where available. Every worker process on the
+  host reads and writes the same entries without any network hops.
+* ``redis``: a Redis server. Lookups of several keys are pipelined into a
+  single round trip.
+
+"""
+
+import hashlib
+import logging
+import os
+import stat
+import tempfile
+
+import six
+
+from keystoneclient.openstack.common import memorycache
+from keystoneclient.openstack.common import timeutils
+
+
+LOG = logging.getLogger(__name__)
+
+MEMCACHE = 'memcache'
+SHARED = 'shared'
+REDIS = 'redis'
+
+BACKENDS = (MEMCACHE, SHARED, REDIS)
+
+
+def default_shared_cache_dir():
+    """Return the default directory used by the shared backend.
+
+    Prefer shared memory so that the cache never touches the disk.
+    """
+    base = '/dev/shm'
+    if not os.path.isdir(base):
+        base = tempfile.gettempdir()
+
+    return os.path.join(base, 'keystone-token-cache-%d' % os.getuid())
+
+
+def get_client(backend=MEMCACHE, memcached_servers=None,
+               shared_cache_dir=None, redis_url=None):
+    """Create a new cache client for the given backend.
+
+    :param string backend: One of BACKENDS.
+    :param list memcached_servers: memcached servers used by the memcache
+                                   backend.
+    :param string shared_cache_dir: directory used by the shared backend.
+    :param string redis_url: location of the server used by the redis
+                             backend, e.g. redis://localhost:6379/0
+
+    :raises ValueError: if the backend is not known.
+    """
+    if backend == MEMCACHE:
+        return memorycache.get_client(memcached_servers)
+    elif backend == SHARED:
+        try:
+            return SharedFileCache(shared_cache_dir or
+                                   default_shared_cache_dir())
+        except InsecureCacheDirError as e:
+            # entries planted by another user would be trusted.
+            LOG.error('Not using the shared token cache: %s. Tokens are '
+                      'cached in process instead.', e)
+            return memorycache.get_client()
+    elif backend == REDIS:
+        return RedisCache(redis_url)
+
+    raise ValueError('Unknown cache backend: %s' % backend)
+
+
+class InsecureCacheDirError(Exception):
+    """The directory of a shared cache could be written by other users."""
+
+
+def _to_bytes(value):
+    if isinstance(value, six.text_type):
+        value = value.encode('utf-8')
+    return value
+
+
+class SharedFileCache(object):
+    """A cache that is shared between all the processes on a host.
+
+    Each entry is stored in its own file, named by a hash of the key, within
+    cache_dir. Entries are written to a temporary file and renamed into place
+    so readers never see a partial value. The expiry time is stored as the
+    first line of the file and expired entries are removed when they are
+    read, or by a periodic sweep of the directory.
+
+    Anyone who can write to cache_dir can add entries to the cache, so it
+    must be a directory, not a symlink, that is owned by the user of this
+    process and only accessible by them.
+
+    :raises InsecureCacheDirError: if cache_dir could be written by others.
+    """
+
+    # how often, in seconds, a process will look for expired entries.
+    SWEEP_INTERVAL = 60
+    # the most files that a sweep looks at.
+    SWEEP_LIMIT = 100
+    # how old, in seconds, a temporary file left by a writer that died must
+    # be before it is removed.
+    TEMP_FILE_AGE = 60
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._last_sweep = timeutils.utcnow_ts()
+        self._unswept = []
+
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir, stat.S_IRWXU)
+            except OSError:
+                # another process may have created it at the same time.
+                if not os.path.isdir(cache_dir):
+                    raise
+
+        self._check_cache_dir()
+
+    def _check_cache_dir(self):
+        # makedirs only sets the mode of a directory it creates, and a
+        # directory with a predictable name may have been created by anyone.
+        st = os.lstat(self.cache_dir)
+        if stat.S_ISLNK(st.st_mode) or not stat.S_ISDIR(st.st_mode):
+            raise InsecureCacheDirError('%s is not a directory' %
+                                        self.cache_dir)
+        if st.st_uid != os.getuid():
+            raise InsecureCacheDirError('%s is owned by another user' %
+                                        self.cache_dir)
+        if stat.S_IMODE(st.st_mode) != stat.S_IRWXU:
+            raise InsecureCacheDirError('%s has mode %o rather than 700' %
+                                        (self.cache_dir,
+                                         stat.S_IMODE(st.st_mode)))
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir,
+                            hashlib.sha1(_to_bytes(key)).hexdigest())
+
+    def _read(self, path, now):
+        try:
+            with open(path, 'rb') as f:
+                contents = f.read()
+        except (IOError, OSError):
+            return None
+
+        timeout, _sep, value = contents.partition(b'\n')
+
+        try:
+            timeout = int(timeout)
+        except ValueError:
+            # a corrupt entry is as good as a missing one.
+            timeout = now
+
+        if timeout and now >= timeout:
+            self._remove(path)
+            return None
+
+        return value
+
+    def _expired(self, path, now):
+        """Return True if the entry at path has expired."""
+        # only the expiry time on the first line is read.
+        try:
+            with open(path, 'rb') as f:
+                timeout = f.readline(32)
+        except (IOError, OSError):
+            return False
+
+        try:
+            timeout = int(timeout)
+        except ValueError:
+            return True
+
+        return bool(timeout) and now >= timeout
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def get(self, key):
+        """Retrieves the value for a key or None."""
+        return self._read(self._path(key), timeutils.utcnow_ts())
+
+    def get_multi(self, keys):
+        """Retrieves the values for several keys.
+
+        :returns: a dict of key to value for the keys that were found.
+        """
+        now = timeutils.utcnow_ts()
+        values = {}
+
+        for key in keys:
+            value = self._read(self._path(key), now)
+            if value is not None:
+                values[key] = value
+
+        return values
+
+    def set(self, key, value, time=0, min_compress_len=0):
+        """Sets the value for a key.
+
+        A time of 0 means that the entry never expires. A negative time
+        means that it has already expired, so it isn't stored.
+        """
+        if time < 0:
+            self.delete(key)
+            return True
+
+        now = timeutils.utcnow_ts()
+        timeout = now + time if time > 0 else 0
+        data = ('%d\n' % timeout).encode('ascii') + _to_bytes(value)
+
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir,
+                                         prefix='.tmp',
+                                         delete=False) as f:
+            f.write(data)
+        os.rename(f.name, self._path(key))
+
+        if now >= self._last_sweep + self.SWEEP_INTERVAL:
+            self._last_sweep = now
+            self.sweep(now)
+
+        return True
+
+    def delete(self, key, time=0):
+        """Deletes the value associated with a key."""
+        self._remove(self._path(key))
+
+    def sweep(self, now=None, limit=None):
+        """Remove expired entries and stale temporary files.
+
+        As this is done while serving a request, only limit files, by default
+        SWEEP_LIMIT, are looked at. The next sweep carries on from there and
+        the directory is listed again once all of its files have been seen.
+        Only the expiry time of an entry is read.
+        """
+        if now is None:
+            now = timeutils.utcnow_ts()
+        if limit is None:
+            limit = self.SWEEP_LIMIT
+
+        if not self._unswept:
+            try:
+                self._unswept = os.listdir(self.cache_dir)
+            except OSError:
+                return
+
+        names = self._unswept[-limit:]
+        del self._unswept[-limit:]
+
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith('.tmp'):
+                try:
+                    stale = os.stat(path).st_mtime < now - self.TEMP_FILE_AGE
+                except OSError:
+                    continue
+                if stale:
+                    self._remove(path)
+            elif not name.startswith('.') and self._expired(path, now):
+                self._remove(path)
+
+
+class RedisCache(object):
+    """A cache stored on a Redis server.
+
+    This requires the redis python module which is imported on first use so
+    that it is only required if this backend is configured.
+    """
+
+    def __init__(self, url):
+        import redis
+
+        self._client = redis.StrictRedis.from_url(url)
+
+    def get(self, key):
+        """Retrieves the value for a key or None."""
+        return self._client.get(key)
+
+    def get_multi(self, keys):
+        """Retrieves the values for several keys in a single round trip.
+
+        :returns: a dict of key to value for the keys that were found.
+        """
+        pipe = self._client.pipeline(transaction=False)
+        for key in keys:
+            pipe.get(key)
+
+        return dict((k, v) for k, v in zip(keys, pipe.execute())
+                    if v is not None)
+
+    def set(self, key, value, time=0, min_compress_len=0):
+        """Sets the value for a key.
+
+        A time of 0 means that the entry never expires. A negative time
+        means that it has already expired, so it isn't stored.
+        """
+        if time < 0:
+            self._client.delete(key)
+            return True
+        if time > 0:
+            return self._client.setex(key, int(time), value)
+
+        return self._client.set(key, value)
+
+    def delete(self, key, time=0):
+        """Deletes the value associated with a key."""
+        self._client.delete(key)
@@ -0,0 +1,154 @@
+# Copyright 2014 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+A circuit breaker that stops requests to an identity server that is failing.
+
+The breaker starts closed and lets every request through, recording whether
+each one failed. When the proportion of failed requests within the last
+window seconds reaches error_rate the breaker opens and requests are refused
+without being attempted. After reset_timeout seconds a single trial request
+is let through while the breaker is half open: if it succeeds the breaker
+closes again, otherwise it stays open for another reset_timeout.
+
+"""
+
+import collections
+import threading
+
+from keystoneclient.openstack.common import timeutils
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# values of the state gauge.
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker(object):
+    """Track the failures of requests to a server.
+
+    :param log: The logger used to report state changes.
+    :param string name: The name of the server, used in log messages.
+    :param float error_rate: The proportion of failed requests, between 0 and
+                             1, that opens the breaker.
+    :param int min_requests: The number of requests within the window needed
+                             before the breaker can open.
+    :param int window: The number of seconds of requests that are considered.
+    :param int reset_timeout: The number of seconds the breaker stays open
+                              before a trial request is made.
+    :param metrics: The emitter that state changes are reported to.
+    """
+
+    def __init__(self, log, name, error_rate=0.5, min_requests=10, window=30,
+                 reset_timeout=30, metrics=None):
+        self.LOG = log
+        self.name = name
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self._metrics = metrics
+
+        self.state = CLOSED
+        self._outcomes = collections.deque()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state, now):
+        if state == OPEN:
+            self._opened_at = now
+            self.LOG.warning('Identity server %s is failing, refusing '
+                             'requests for %d seconds',
+                             self.name, self.reset_timeout)
+        elif state == CLOSED:
+            self.LOG.info('Identity server %s has recovered', self.name)
+
+        self._outcomes.clear()
+        self._failures = 0
+        self._trial_in_progress = False
+        self.state = state
+
+        if self._metrics:
+            self._metrics.increment('circuit_breaker.%s' % state)
+            self._metrics.gauge('circuit_breaker.state', STATE_VALUES[state])
+
+    def allow_request(self):
+        """Return True if a request may be made to the server.
+
+        If True is returned then the result of the request must be reported
+        with record_success() or record_failure(), or with release() if the
+        request ended without showing whether the server works.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+
+            if self.state == OPEN:
+                now = timeutils.utcnow_ts()
+                if now < self._opened_at + self.reset_timeout:
+                    return False
+                self._set_state(HALF_OPEN, now)
+
+            if self._trial_in_progress:
+                return False
+
+            self._trial_in_progress = True
+            return True
+
+    def record_success(self):
+        """Report that a request to the server succeeded."""
+        self._record(False)
+
+    def record_failure(self):
+        """Report that a request to the server failed."""
+        self._record(True)
+
+    def release(self):
+        """Report that a request let through ended without an outcome.
+
+        A trial request is given up so that another request can be let
+        through as the trial.
+        """
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._trial_in_progress = False
+
+    def _record(self, failed):
+        with self._lock:
+            now = timeutils.utcnow_ts()
+
+            if self.state == HALF_OPEN:
+                self._set_state(OPEN if failed else CLOSED, now)
+                return
+            elif self.state == OPEN:
+                # a request that started before the breaker opened.
+                return
+
+            self._outcomes.append((now, failed))
+            self._failures += failed
+
+            while (self._outcomes and
+                   self._outcomes[0][0] <= now - self.window):
+                _t, old_failed = self._outcomes.popleft()
+                self._failures -= old_failed
+
+            count = len(self._outcomes)
+            if (count >= self.min_requests and
+                    self._failures >= self.error_rate * count):
+                self._set_state(OPEN, now)
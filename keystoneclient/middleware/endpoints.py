@@ -0,0 +1,193 @@
+# Copyright 2014 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+Balance requests between the identity servers used by auth_token.
+
+Each server is an Endpoint that keeps a moving average (EWMA) of its response
+times and the number of requests to it that are in progress. The cost of an
+endpoint is its average response time multiplied by the requests in
+progress, plus one, so that a slow or busy server is used less. An endpoint
+that hasn't responded yet has no cost so every server is tried. An endpoint
+that fails is unhealthy for COOLDOWN seconds, during which it is only used
+once the healthy endpoints have failed, whether or not a circuit breaker is
+enabled.
+
+The pickers order the endpoints for a request. The first endpoint is used
+and the others are failed over to in order:
+
+* ``p2c``: the power of two choices. Two endpoints are picked at random, with
+  replacement, and the cheaper one is used first. This spreads requests
+  between servers while avoiding slow ones, even if many processes pick at
+  the same time. As the same endpoint can be picked twice, even with only
+  two endpoints the more expensive one is sometimes used first.
+* ``ewma``: the cheapest endpoint is always used first.
+
+"""
+
+import collections
+import random
+import threading
+import time
+
+
+P2C = 'p2c'
+EWMA = 'ewma'
+
+PICKERS = (P2C, EWMA)
+
+# weight of the latest response time in the moving average.
+DECAY = 0.3
+
+# response times kept to calculate the 99th percentile.
+SAMPLES = 100
+
+# response times needed before the 99th percentile is known.
+MIN_SAMPLES = 20
+
+# seconds that an endpoint is avoided for after it fails.
+COOLDOWN = 30.0
+
+try:
+    _monotonic = time.monotonic
+except AttributeError:
+    # NOTE: python 2 has no monotonic clock in the standard library.
+    _monotonic = time.time
+
+
+class Endpoint(object):
+    """An identity server and the statistics of requests to it.
+
+    :param string url: The unversioned root URL of the server.
+    :param breaker: The CircuitBreaker that ejects the server while it is
+                    failing. (optional)
+    """
+
+    def __init__(self, url, breaker=None):
+        self.url = url
+        self.breaker = breaker
+        self.ewma = None
+        self.in_flight = 0
+        self.unhealthy_until = 0
+        self._samples = collections.deque(maxlen=SAMPLES)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<Endpoint %s>' % self.url
+
+    def cost(self):
+        return (self.ewma or 0.0) * (self.in_flight + 1)
+
+    def healthy(self, now=None):
+        """Return False if a request to the endpoint failed recently."""
+        if now is None:
+            now = _monotonic()
+        return self.unhealthy_until <= now
+
+    def sort_key(self, now):
+        """Order healthy endpoints before unhealthy ones, then by cost."""
+        return (not self.healthy(now), self.cost())
+
+    def allow_request(self):
+        """Return True if the server's circuit breaker allows a request."""
+        return self.breaker is None or self.breaker.allow_request()
+
+    def record(self, failed):
+        """Report the outcome of a request let through by allow_request()."""
+        if self.breaker is not None:
+            if failed:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+
+    def release(self):
+        """Report that a request let through ended without an outcome."""
+        if self.breaker is not None:
+            self.breaker.release()
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(self, seconds=None, failed=False):
+        """Report that a request finished.
+
+        :param float seconds: The response time, or None if the server
+                              didn't respond.
+        :param bool failed: True if the server couldn't be reached, timed out
+                            or responded with a server error. The endpoint is
+                            then unhealthy for COOLDOWN seconds.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if failed:
+                self.unhealthy_until = _monotonic() + COOLDOWN
+            elif seconds is not None:
+                self.unhealthy_until = 0
+
+            if seconds is None:
+                return
+
+            if self.ewma is None:
+                self.ewma = seconds
+            else:
+                self.ewma = DECAY * seconds + (1 - DECAY) * self.ewma
+            self._samples.append(seconds)
+
+    def p99(self):
+        """Return the 99th percentile of recent response times or None."""
+        with self._lock:
+            if len(self._samples) < MIN_SAMPLES:
+                return None
+            samples = sorted(self._samples)
+
+        return samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+class EndpointPool(object):
+    """Order the endpoints to use for each request.
+
+    :param endpoints: A list of Endpoint.
+    :param string picker: One of PICKERS.
+
+    :raises ValueError: if the picker is not known.
+    """
+
+    def __init__(self, endpoints, picker=P2C):
+        if picker not in PICKERS:
+            raise ValueError('Unknown picker: %s' % picker)
+
+        self.endpoints = endpoints
+        self.picker = picker
+
+    def ordered(self):
+        """Return the endpoints in the order they should be tried."""
+        endpoints = list(self.endpoints)
+        # shuffle first so that endpoints of the same cost are tried in a
+        # random order.
+        random.shuffle(endpoints)
+        now = _monotonic()
+
+        def key(e):
+            return e.sort_key(now)
+
+        if self.picker == P2C and len(endpoints) > 1:
+            first = min(random.choice(endpoints), random.choice(endpoints),
+                        key=key)
+            endpoints.remove(first)
+            endpoints.sort(key=key)
+            return [first] + endpoints
+
+        endpoints.sort(key=key)
+        return endpoints
@@ -18,13 +18,23 @@ Utilities for memcache encryption and integrity check.
 
 Data should be serialized before entering these functions. Encryption
 has a dependency on the pycrypto. If pycrypto is not available,
-CryptoUnavailableError will be raised.
+CryptoUnavailableError will be raised. The AEAD strategy uses
+ChaCha20-Poly1305 which requires a Crypto module that provides it, such as
+pycryptodome.
 
 This module will not be called unless signing or encryption is enabled
 in the config. It will always validate signatures, and will decrypt
 data if encryption is enabled. It is not valid to mix protection
 modes.
 
+Data protected with the AEAD strategy is stored as raw bytes prefixed with a
+version marker, so it never needs to be base64 encoded. As the MAC and
+ENCRYPT strategies always produce base64 output the two formats can't be
+confused. The keys are derived from the strategy as well as the secret, so
+unprotect_data() rejects data protected with another strategy. Entries
+written before the strategy was changed are also stored under other cache
+keys, so they are never looked up and are left to expire.
+
 """
 
 import base64
@@ -43,11 +53,22 @@ try:
 except ImportError:
     AES = None
 
+try:
+    from Crypto.Cipher import ChaCha20_Poly1305
+except ImportError:
+    ChaCha20_Poly1305 = None
+
 HASH_FUNCTION = hashlib.sha384
 DIGEST_LENGTH = HASH_FUNCTION().digest_size
 DIGEST_SPLIT = DIGEST_LENGTH // 3
 DIGEST_LENGTH_B64 = 4 * int(math.ceil(DIGEST_LENGTH / 3.0))
 
+# NOTE: the version marker of the AEAD format must be a byte that can never
+# start base64 encoded data.
+AEAD_VERSION = b'\x01'
+AEAD_NONCE_LENGTH = 12
+AEAD_TAG_LENGTH = 16
+
 
 class InvalidMacError(Exception):
     """raise when unable to verify MACed data.
@@ -83,6 +104,17 @@ def assert_crypto_availability(f):
     return wrapper
 
 
+def assert_aead_availability(f):
+    """Ensure a Crypto module with ChaCha20-Poly1305 is available."""
+
+    @functools.wraps(f)
+    def wrapper(*args, **kwds):
+        if ChaCha20_Poly1305 is None:
+            raise CryptoUnavailableError()
+        return f(*args, **kwds)
+    return wrapper
+
+
 if sys.version_info >= (3, 3):
     constant_time_compare = hmac.compare_digest
 else:
@@ -158,11 +190,52 @@ def decrypt_data(key, data):
     return result[:-1 * six.byte2int([result[-1]])]
 
 
+@assert_aead_availability
+def aead_encrypt_data(key, data, associated_data=b''):
+    """Encrypt and authenticate the data with the given 256 bit secret key.
+
+    The associated data is authenticated but not encrypted or included in the
+    result. Returns the nonce, the authentication tag and the ciphertext.
+    """
+    nonce = os.urandom(AEAD_NONCE_LENGTH)
+    cipher = ChaCha20_Poly1305.new(key=key, nonce=nonce)
+    cipher.update(associated_data)
+    ciphertext, tag = cipher.encrypt_and_digest(data)
+    return nonce + tag + ciphertext
+
+
+@assert_aead_availability
+def aead_decrypt_data(key, data, associated_data=b''):
+    """Verify and decrypt the data with the given secret key."""
+    nonce = data[:AEAD_NONCE_LENGTH]
+    tag = data[AEAD_NONCE_LENGTH:AEAD_NONCE_LENGTH + AEAD_TAG_LENGTH]
+    cipher = ChaCha20_Poly1305.new(key=key, nonce=nonce)
+    cipher.update(associated_data)
+    try:
+        return cipher.decrypt_and_verify(
+            data[AEAD_NONCE_LENGTH + AEAD_TAG_LENGTH:], tag)
+    except ValueError:
+        raise InvalidMacError('Invalid MAC; data appears to be corrupted.')
+
+
+def _aead_key(keys):
+    # The AEAD cipher authenticates the data itself so the MAC key is not
+    # otherwise used. Together with the encryption key it makes up the 256
+    # bits that ChaCha20-Poly1305 requires.
+    return keys['MAC'] + keys['ENCRYPTION']
+
+
 def protect_data(keys, data):
     """Given keys and serialized data, returns an appropriately
     protected string suitable for storage in the cache.
 
     """
+    if keys['strategy'] == b'AEAD':
+        # the cache key is bound to the data so that a value can't be moved
+        # to another key.
+        return AEAD_VERSION + aead_encrypt_data(_aead_key(keys), data,
+                                                keys['CACHE_KEY'])
+
     if keys['strategy'] == b'ENCRYPT':
         data = encrypt_data(keys['ENCRYPTION'], data)
 
@@ -182,6 +255,11 @@ def unprotect_data(keys, signed_data):
     if signed_data is None:
         return None
 
+    if signed_data[:1] == AEAD_VERSION:
+        return aead_decrypt_data(_aead_key(keys),
+                                 signed_data[len(AEAD_VERSION):],
+                                 keys['CACHE_KEY'])
+
     # First we calculate the signature
     provided_mac = signed_data[:DIGEST_LENGTH_B64]
     calculated_mac = sign_data(
@@ -0,0 +1,280 @@
+# Copyright 2014 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+Metrics emitters for the auth_token middleware.
+
+The middleware reports three kinds of metric:
+
+* counters, such as the number of token cache hits and misses.
+* timings, in seconds, of the phases of validating a token such as
+  fetching it from the cache or verifying a PKI signature.
+* gauges, such as the size of the revocation list.
+
+The available backends are:
+
+* ``noop``: metrics are discarded. This is the default.
+* ``statsd``: metrics are sent to a statsd server over UDP.
+* ``prometheus``: metrics are kept in an in-process registry that can be
+  rendered in the Prometheus text exposition format.
+
+Whatever the backend, the emitter is available to applications from the WSGI
+environment as ``keystone.token_metrics`` so that counters can be reported
+by a health check.
+
+"""
+
+import bisect
+import contextlib
+import functools
+import socket
+import threading
+import time
+
+import six
+
+
+NOOP = 'noop'
+STATSD = 'statsd'
+PROMETHEUS = 'prometheus'
+
+BACKENDS = (NOOP, STATSD, PROMETHEUS)
+
+try:
+    _monotonic = time.monotonic
+except AttributeError:
+    # NOTE: python 2 has no monotonic clock in the standard library.
+    _monotonic = time.time
+
+# histogram bucket upper bounds, in seconds.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def get_metrics(backend=NOOP, prefix='keystone.auth_token',
+                statsd_host='localhost', statsd_port=8125):
+    """Create a new metrics emitter for the given backend.
+
+    :param string backend: One of BACKENDS.
+    :param string prefix: Prefix added to the name of every metric.
+    :param string statsd_host: Host of the statsd server.
+    :param int statsd_port: Port of the statsd server.
+
+    :raises ValueError: if the backend is not known.
+    """
+    if backend == NOOP:
+        return Metrics()
+    elif backend == STATSD:
+        return StatsdMetrics(statsd_host, int(statsd_port), prefix=prefix)
+    elif backend == PROMETHEUS:
+        return RegistryMetrics(prefix=prefix)
+
+    raise ValueError('Unknown metrics backend: %s' % backend)
+
+
+def timed(name):
+    """Decorate a method so that its duration is reported as name.
+
+    The method's object must have a _metrics attribute holding the emitter.
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(self, *args, **kwargs):
+            with self._metrics.timer(name):
+                return f(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _NullTimer(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics(object):
+    """A metrics emitter that discards everything.
+
+    This is the base of the other emitters, which override increment(),
+    gauge() and observe().
+    """
+
+    def increment(self, name, value=1):
+        """Add value to the counter name."""
+        pass
+
+    def gauge(self, name, value):
+        """Set the gauge name to value."""
+        pass
+
+    def observe(self, name, seconds):
+        """Record a duration of name in seconds."""
+        pass
+
+    def timer(self, name):
+        """Context manager that observes the duration of its block."""
+        return _NULL_TIMER
+
+    def get_counters(self):
+        """Return a dict of counter name to value."""
+        return {}
+
+
+class _TimingMetrics(Metrics):
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        start = _monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, _monotonic() - start)
+
+
+class StatsdMetrics(_TimingMetrics):
+    """Send metrics to a statsd server.
+
+    Sending is fire and forget so a missing server never affects requests.
+    Counters are also kept in process so that get_counters() works.
+    """
+
+    def __init__(self, host, port, prefix=None):
+        self._address = (host, port)
+        self._prefix = '%s.' % prefix if prefix else ''
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _send(self, name, value, metric_type):
+        data = '%s%s:%s|%s' % (self._prefix, name, value, metric_type)
+        try:
+            self._socket.sendto(data.encode('utf-8'), self._address)
+        except (socket.error, socket.gaierror):
+            pass
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        self._send(name, value, 'c')
+
+    def gauge(self, name, value):
+        self._send(name, value, 'g')
+
+    def observe(self, name, seconds):
+        self._send(name, '%.3f' % (seconds * 1000), 'ms')
+
+    def get_counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+
+class _Histogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RegistryMetrics(_TimingMetrics):
+    """Keep metrics in an in-process registry.
+
+    Timings are kept as histograms with cumulative buckets in the same way as
+    Prometheus. render() returns the registry in the Prometheus text format.
+    """
+
+    def __init__(self, prefix=None, buckets=DEFAULT_BUCKETS):
+        self._prefix = prefix
+        self._buckets = tuple(sorted(buckets))
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            try:
+                histogram = self._histograms[name]
+            except KeyError:
+                histogram = self._histograms[name] = _Histogram(self._buckets)
+            histogram.observe(seconds)
+
+    def get_counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def get_gauges(self):
+        """Return a dict of gauge name to value."""
+        with self._lock:
+            return dict(self._gauges)
+
+    def get_histograms(self):
+        """Return a dict of timing name to its count and sum in seconds."""
+        with self._lock:
+            return dict((name, {'count': h.count, 'sum': h.sum})
+                        for name, h in six.iteritems(self._histograms))
+
+    def _metric_name(self, name):
+        if self._prefix:
+            name = '%s.%s' % (self._prefix, name)
+        return name.replace('.', '_').replace('-', '_')
+
+    def render(self):
+        """Return the registry in the Prometheus text exposition format."""
+        lines = []
+
+        with self._lock:
+            for name, value in sorted(six.iteritems(self._counters)):
+                name = self._metric_name(name) + '_total'
+                lines.append('# TYPE %s counter' % name)
+                lines.append('%s %s' % (name, value))
+
+            for name, value in sorted(six.iteritems(self._gauges)):
+                name = self._metric_name(name)
+                lines.append('# TYPE %s gauge' % name)
+                lines.append('%s %s' % (name, value))
+
+            for name, h in sorted(six.iteritems(self._histograms)):
+                name = self._metric_name(name) + '_seconds'
+                lines.append('# TYPE %s histogram' % name)
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append('%s_bucket{le="%s"} %d' %
+                                 (name, bound, cumulative))
+                lines.append('%s_bucket{le="+Inf"} %d' % (name, h.count))
+                lines.append('%s_sum %s' % (name, h.sum))
+                lines.append('%s_count %d' % (name, h.count))
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,246 @@
+# Copyright 2014 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+A pool of processes that the auth_token middleware offloads CPU bound work to.
+
+Verifying and decoding a large PKI token, or decrypting and decoding a large
+cache entry, holds the GIL of the process serving the request for as long
+as it takes, which stalls every other request being served by a threaded or
+eventlet server. With a ProcessPool that work is done by other processes so
+that a service can use every core for it.
+
+Only work on at least threshold bytes is offloaded, as sending small values
+to another process costs more than it saves. Once max_pending calls are
+waiting for the pool, further work is done in the calling process rather
+than queued, and work that the pool doesn't finish within timeout seconds is
+done again in the calling process. The pool can't cancel that work, so it
+keeps its place among the max_pending until the pool finishes it, and new
+work is done in the calling process rather than queued behind it.
+
+The pool is started on first use, so a middleware loaded before a server
+forks its workers doesn't share a pool between them. Nothing is offloaded
+if eventlet has patched threading, as the threads of a multiprocessing pool
+that collect the results would then be green threads, which the pool
+doesn't support.
+
+"""
+
+import contextlib
+import logging
+import multiprocessing
+import pickle
+import threading
+
+from keystoneclient import _json
+from keystoneclient.common import cms
+from keystoneclient.middleware import memcache_crypt
+
+
+LOG = logging.getLogger(__name__)
+
+
+class OffloadError(Exception):
+    """An exception raised in the pool that couldn't be sent back as is."""
+
+
+class ProtectedDataError(Exception):
+    """A protected cache entry could not be decrypted or verified."""
+
+
+def verify_signed_token(signed_text, signing_cert_file_name, ca_file_name):
+    """Verify the signature of a PKI or PKIZ token and decode its data.
+
+    :raises CertificateConfigError: if the certificates are missing.
+    """
+    if cms.is_pkiz(signed_text):
+        data = cms.pkiz_uncompress(signed_text)
+        inform = cms.PKIZ_CMS_FORM
+    else:
+        data = cms.token_to_pem(signed_text)
+        inform = cms.PKI_ASN1_FORM
+
+    verified = cms.cms_verify(data, signing_cert_file_name, ca_file_name,
+                              inform=inform)
+    return _json.loads(verified)
+
+
+def decode_cache_entry(keys, raw_cached):
+    """Decode a cache entry, decrypting or verifying it if it is protected.
+
+    :param dict keys: The keys the entry is protected with, or None.
+    :returns: The decoded entry, or None if raw_cached is None.
+    :raises ProtectedDataError: if the entry couldn't be decrypted or
+                                verified.
+    """
+    serialized = raw_cached
+    if keys is not None:
+        try:
+            # unprotect_data will return None if raw_cached is None
+            serialized = memcache_crypt.unprotect_data(keys, raw_cached)
+        except Exception as e:
+            raise ProtectedDataError(str(e))
+
+    if serialized is None:
+        return None
+
+    return _json.loads(serialized)
+
+
+def _green_threads():
+    """Return True if eventlet has patched the threading module."""
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return False
+    return patcher.is_monkey_patched('thread')
+
+
+def _call(func, args):
+    """Call func in a pool process and return its result or exception."""
+    try:
+        return func(*args), None
+    except Exception as e:
+        # an exception that can't be unpickled would never be returned.
+        try:
+            pickle.loads(pickle.dumps(e))
+        except Exception:
+            e = OffloadError('%s: %s' % (type(e).__name__, e))
+        return None, e
+
+
+class ProcessPool(object):
+    """Run CPU bound functions in a pool of processes.
+
+    :param int size: The number of processes in the pool.
+    :param int threshold: The smallest size, in bytes, of work to offload.
+    :param int max_pending: The most calls that can be waiting for the pool.
+                            Defaults to twice size.
+    :param float timeout: How long, in seconds, to wait for the pool.
+    :param metrics: The emitter that offloaded calls are reported to.
+    """
+
+    def __init__(self, size, threshold=0, max_pending=None, timeout=None,
+                 metrics=None):
+        self.size = size
+        self.threshold = threshold
+        self.max_pending = max_pending or size * 2
+        self.timeout = timeout
+        self._metrics = metrics
+        self._pool = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._green = None
+
+    def _increment(self, name):
+        if self._metrics:
+            self._metrics.increment(name)
+
+    def _disabled(self):
+        if self._green is None:
+            self._green = _green_threads()
+            if self._green:
+                LOG.warning('Work is not offloaded as eventlet has patched '
+                            'threading')
+        return self._green
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(self.size)
+            return self._pool
+
+    def reset(self):
+        """Forget the pool, which belongs to the parent of a forked process.
+
+        A new pool is started on next use.
+        """
+        self._pool = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def close(self):
+        """Stop the processes of the pool."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    @contextlib.contextmanager
+    def reserve(self, size):
+        """Context manager to reserve a place in the pool for some work.
+
+        :param int size: The size, in bytes, of the work.
+        :returns: The pool, or None if the work should be done inline because
+                  it is small, because the pool is saturated or because
+                  eventlet has patched threading.
+        """
+        if size < self.threshold or self._disabled():
+            yield None
+            return  # otherwise the context manager will continue!
+
+        with self._lock:
+            saturated = self._pending >= self.max_pending
+            if not saturated:
+                self._pending += 1
+
+        if saturated:
+            self._increment('offload.saturated')
+            yield None
+            return
+
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def apply(self, func, *args):
+        """Call func(*args) in the pool and return its result.
+
+        func must be a function of a module so that it can be sent to the
+        pool. If the pool can't be started or doesn't answer in time func is
+        called in this process instead. Work that timed out is still done by
+        the pool, so it takes a place in the pool until the pool finishes it.
+        """
+        state = {'done': False, 'abandoned': False}
+
+        def finished(_result):
+            with self._lock:
+                state['done'] = True
+                if state['abandoned']:
+                    self._pending -= 1
+
+        try:
+            result = self._get_pool().apply_async(_call, (func, args),
+                                                  callback=finished)
+            value, error = result.get(self.timeout)
+        except multiprocessing.TimeoutError:
+            LOG.warning('Offloaded work timed out, running it inline')
+            self._increment('offload.timeout')
+            with self._lock:
+                if not state['done']:
+                    state['abandoned'] = True
+                    self._pending += 1
+            return func(*args)
+        except OSError as e:
+            LOG.warning('Unable to start offload pool: %s', e)
+            self._increment('offload.error')
+            return func(*args)
+
+        self._increment('offload.calls')
+        if error is not None:
+            raise error
+        return value
@@ -0,0 +1,295 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+Indexes of revoked tokens used by the auth_token middleware.
+
+The IDs in the revocation list are written to a RevocationIndex file in the
+signing directory: a header followed by the IDs, sorted and padded to the
+same width. Every worker process maps the file into memory and finds IDs by
+binary search, so the pages are shared between processes and nothing is
+parsed to use it. A new index is written to a temporary file and renamed
+into place, so a worker always sees a whole index.
+
+The OS-REVOKE extension of the identity API describes revoked tokens with
+events rather than listing their IDs. An event revokes the tokens issued
+before its issued_before time that match every other attribute the event
+has, such as a user, project, role or audit ID. The middleware fetches the
+events that are new since its last fetch and merges them into a
+RevocationEvents index. Events are dropped once every token they could
+revoke has expired.
+
+"""
+
+import datetime
+import mmap
+import os
+import struct
+
+import six
+
+from keystoneclient import access
+from keystoneclient.openstack.common import timeutils
+
+
+INDEX_MAGIC = b'KSRI'
+INDEX_VERSION = 1
+
+# magic, version, the width of an ID and the number of IDs.
+_INDEX_HEADER = struct.Struct('!4sBHI')
+
+# the attributes of an event that are compared with a token.
+ATTRIBUTES = ('user_id', 'project_id', 'domain_id', 'role_id', 'trust_id',
+              'consumer_id', 'access_token_id', 'audit_id', 'audit_chain_id',
+              'expires_at')
+
+# events are indexed by the first of these attributes that they have.
+_INDEXED = ('audit_id', 'audit_chain_id', 'user_id', 'project_id')
+
+# How far, in seconds, before the latest revoked_at that has been seen the
+# next fetch starts from, so that events committed out of order aren't
+# missed. Events fetched again are ignored.
+FETCH_OVERLAP = 5
+
+
+def _encode_id(token_id):
+    if isinstance(token_id, six.text_type):
+        token_id = token_id.encode('utf-8')
+    return token_id
+
+
+def encode_index(token_ids):
+    """Return the contents of a RevocationIndex of token_ids."""
+    ids = sorted(set(_encode_id(token_id) for token_id in token_ids))
+    width = max(len(token_id) for token_id in ids) if ids else 0
+
+    header = _INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, width, len(ids))
+    return header + b''.join(token_id.ljust(width, b'\0') for token_id in ids)
+
+
+class RevocationIndex(object):
+    """The revoked token IDs in an index file, mapped into memory.
+
+    :param string path: The path of a file written with encode_index.
+    :raises ValueError: If the file isn't a valid index.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _INDEX_HEADER.size:
+                raise ValueError('Invalid revocation index %s' % path)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self._width, self._count = (
+            _INDEX_HEADER.unpack_from(self._map, 0))
+        if (magic != INDEX_MAGIC or version != INDEX_VERSION or
+                size != _INDEX_HEADER.size + self._width * self._count):
+            raise ValueError('Invalid revocation index %s' % path)
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, token_id):
+        token_id = _encode_id(token_id)
+        width = self._width
+        if len(token_id) > width:
+            return False
+
+        key = token_id.ljust(width, b'\0')
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = _INDEX_HEADER.size + mid * width
+            value = self._map[offset:offset + width]
+            if value < key:
+                lo = mid + 1
+            elif value > key:
+                hi = mid
+            else:
+                return True
+
+        return False
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    return timeutils.normalize_time(timeutils.parse_isotime(value))
+
+
+def token_values(data):
+    """Return when a token was issued and its values of ATTRIBUTES.
+
+    :param dict data: The token data returned by the identity server.
+    :returns: The time the token was issued, or None if it isn't known, and a
+              dict mapping each attribute to the set of the token's values.
+    """
+    auth_ref = access.AccessInfo.factory(body=data)
+
+    if auth_ref.version == 'v3':
+        token = data['token']
+        trust = token.get('OS-TRUST:trust', {})
+        trust_users = [trust.get('trustor_user', {}).get('id'),
+                       trust.get('trustee_user', {}).get('id')]
+        oauth = token.get('OS-OAUTH1', {})
+    else:
+        token = data['access']['token']
+        trust = data['access'].get('trust', {})
+        trust_users = [trust.get('trustee_user_id')]
+        oauth = {}
+
+    audit_ids = token.get('audit_ids') or []
+
+    try:
+        issued = timeutils.normalize_time(auth_ref.issued)
+    except (KeyError, ValueError):
+        issued = None
+
+    values = {
+        'user_id': set([auth_ref.user_id] + trust_users),
+        'project_id': set([auth_ref.project_id]),
+        'domain_id': set([auth_ref.domain_id, auth_ref.user_domain_id,
+                          auth_ref.project_domain_id]),
+        'role_id': set(auth_ref.role_ids),
+        'trust_id': set([auth_ref.trust_id]),
+        'consumer_id': set([oauth.get('consumer_id')]),
+        'access_token_id': set([oauth.get('access_token_id')]),
+        'audit_id': set(audit_ids[:1]),
+        'audit_chain_id': set(audit_ids[-1:]),
+        'expires_at': set([timeutils.normalize_time(auth_ref.expires)]),
+    }
+    for value in values.values():
+        value.discard(None)
+
+    return issued, values
+
+
+class _Event(object):
+
+    def __init__(self, event):
+        self.key = tuple(sorted(event.items()))
+        self.issued_before = _parse_time(event.get('issued_before'))
+        self.revoked_at = _parse_time(event.get('revoked_at'))
+
+        self.attributes = dict((name, event[name]) for name in ATTRIBUTES
+                               if event.get(name))
+        if 'expires_at' in self.attributes:
+            self.attributes['expires_at'] = _parse_time(
+                self.attributes['expires_at'])
+
+        self.index_key = None
+        for name in _INDEXED:
+            if name in self.attributes:
+                self.index_key = (name, self.attributes[name])
+                break
+
+    def matches(self, issued, values):
+        if issued and self.issued_before and issued > self.issued_before:
+            return False
+
+        for name, value in self.attributes.items():
+            if value not in values[name]:
+                return False
+
+        return True
+
+
+class RevocationEvents(object):
+    """An index of revocation events.
+
+    :param int max_token_lifetime: The longest, in seconds, that a token is
+                                   valid for after it is issued.
+    """
+
+    def __init__(self, max_token_lifetime=86400):
+        self.max_token_lifetime = datetime.timedelta(
+            seconds=max_token_lifetime)
+        self._events = {}
+        self._index = {}
+        self._latest = None
+
+    def __len__(self):
+        return len(self._events)
+
+    @property
+    def since(self):
+        """The time to fetch new events from, or None to fetch every event."""
+        if self._latest is None:
+            return None
+        return self._latest - datetime.timedelta(seconds=FETCH_OVERLAP)
+
+    def add(self, events):
+        """Merge a list of events returned by the identity server."""
+        for event in events:
+            event = _Event(event)
+            if event.key in self._events:
+                continue
+
+            self._events[event.key] = event
+            self._index.setdefault(event.index_key, []).append(event)
+
+            if event.revoked_at and (self._latest is None or
+                                     event.revoked_at > self._latest):
+                self._latest = event.revoked_at
+
+    def replace(self, events):
+        """Replace every event with a full list from the identity server."""
+        self._events = {}
+        self._index = {}
+        self.add(events)
+
+    def _expired(self, event, now):
+        expires_at = event.attributes.get('expires_at')
+        if expires_at and expires_at < now:
+            return True
+
+        return bool(event.issued_before and
+                    event.issued_before + self.max_token_lifetime < now)
+
+    def expire(self, now=None):
+        """Drop the events that can only revoke tokens that have expired."""
+        now = now or timeutils.utcnow()
+
+        for key, events in list(self._index.items()):
+            current = []
+            for event in events:
+                if self._expired(event, now):
+                    del self._events[event.key]
+                else:
+                    current.append(event)
+
+            if current:
+                self._index[key] = current
+            else:
+                del self._index[key]
+
+    def is_revoked(self, data):
+        """Indicate whether an event revokes a token.
+
+        :param dict data: The token data returned by the identity server.
+        """
+        if not self._events:
+            return False
+
+        issued, values = token_values(data)
+
+        keys = [None]
+        for name in _INDEXED:
+            keys.extend((name, value) for value in values[name])
+
+        for key in keys:
+            for event in self._index.get(key, []):
+                if event.matches(issued, values):
+                    return True
+
+        return False
@@ -0,0 +1,353 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+A daemon that validates tokens for every auth_token middleware on a host.
+
+Each worker process of a service would otherwise have its own admin token,
+signing certificates, revocation list, token cache and connections to the
+identity server. The daemon runs a single AuthProtocol and validates tokens
+for the workers, which send them over a UNIX domain socket. Middleware
+configured with validation_daemon_socket validates tokens itself while the
+daemon can't be reached.
+
+Each worker thread keeps a connection open and sends requests and receives
+responses on it in the following format, in network byte order::
+
+    request:  version (1 byte), length of the token, REMOTE_USER and
+              AUTH_TYPE (4 bytes each), token, REMOTE_USER, AUTH_TYPE
+    response: version (1 byte), status (1 byte), length of the body
+              (4 bytes), body
+
+The body of a VALID response is the token data encoded as JSON, other
+responses have no body. A request with a token longer than MAX_TOKEN_LENGTH
+bytes, or environment values longer than MAX_ENV_LENGTH bytes, is refused
+and its connection closed. Start the daemon with the configuration file that
+contains the [keystone_authtoken] section::
+
+    $ keystone-token-validator --config-file /etc/nova/nova.conf \
+          --socket /var/run/nova/token-validator.sock
+
+"""
+
+import logging
+import os
+import socket
+import stat
+import struct
+import sys
+import threading
+import time
+
+from oslo.config import cfg
+from six.moves import socketserver
+
+from keystoneclient import _json
+
+
+VERSION = 1
+
+# the status of a response.
+VALID = 0
+INVALID = 1
+SERVICE_ERROR = 2
+CIRCUIT_OPEN = 3
+UNSUPPORTED = 4
+
+# How long, in seconds, the middleware validates tokens itself after it
+# failed to reach the daemon before trying the daemon again.
+RETRY_DELAY = 5
+
+# the largest token and environment values, in bytes, that are accepted.
+MAX_TOKEN_LENGTH = 64 * 1024
+MAX_ENV_LENGTH = 1024
+
+_REQUEST = struct.Struct('!BIII')
+_RESPONSE = struct.Struct('!BBI')
+
+_ENV_KEYS = ('REMOTE_USER', 'AUTH_TYPE')
+
+LOG = logging.getLogger(__name__)
+
+try:
+    _monotonic = time.monotonic
+except AttributeError:
+    # NOTE: python 2 has no monotonic clock in the standard library.
+    _monotonic = time.time
+
+
+class DaemonUnavailable(Exception):
+    """The validation daemon could not be reached."""
+
+
+def _recv(sock, size):
+    """Read exactly size bytes from sock."""
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise EOFError()
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _encode(value):
+    return (value or '').encode('utf-8')
+
+
+def _check_lengths(token_len, *env_lens):
+    if token_len > MAX_TOKEN_LENGTH or max(env_lens) > MAX_ENV_LENGTH:
+        raise ValueError('The request is too large for the daemon')
+
+
+def encode_request(token, env=None):
+    """Encode a request.
+
+    :raises ValueError: If the token or environment is too large.
+    """
+    env = env or {}
+    fields = [_encode(token)] + [_encode(env.get(k)) for k in _ENV_KEYS]
+    lengths = [len(f) for f in fields]
+    _check_lengths(*lengths)
+    return _REQUEST.pack(VERSION, *lengths) + b''.join(fields)
+
+
+def read_request(sock):
+    """Read a request from sock.
+
+    :returns: The version, the token and the environment of the request.
+    :raises ValueError: If the request is too large, before its body is read.
+    """
+    header = _recv(sock, _REQUEST.size)
+    version, token_len, user_len, type_len = _REQUEST.unpack(header)
+    _check_lengths(token_len, user_len, type_len)
+    body = _recv(sock, token_len + user_len + type_len)
+
+    token = body[:token_len].decode('utf-8')
+    env = {}
+    for key, value in zip(_ENV_KEYS, (body[token_len:token_len + user_len],
+                                      body[token_len + user_len:])):
+        if value:
+            env[key] = value.decode('utf-8')
+
+    return version, token, env
+
+
+def encode_response(status, data=None):
+    body = b''
+    if data is not None:
+        body = _json.dumps(data).encode('utf-8')
+    return _RESPONSE.pack(VERSION, status, len(body)) + body
+
+
+def read_response(sock):
+    """Read a response from sock.
+
+    :returns: The status of the response and the token data, if any.
+    """
+    version, status, length = _RESPONSE.unpack(_recv(sock, _RESPONSE.size))
+    data = None
+    if length:
+        data = _json.loads(_recv(sock, length))
+    return status, data
+
+
+class ValidationClient(object):
+    """Send tokens to the validation daemon.
+
+    Each thread has its own connection to the daemon, which is kept open
+    between requests.
+
+    :param string path: The path of the daemon's socket.
+    :param float timeout: How long, in seconds, to wait for the daemon to
+                          answer a request, including any reconnection.
+    :param int retry_delay: How long, in seconds, the daemon isn't used
+                            for after it couldn't be reached.
+    """
+
+    def __init__(self, path, timeout=None, retry_delay=RETRY_DELAY):
+        self.path = path
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        self._local = threading.local()
+        self._unavailable_until = 0
+
+    def available(self):
+        """Whether the daemon should be tried."""
+        return time.time() >= self._unavailable_until
+
+    def reset(self):
+        """Forget every thread's connection, such as in a forked process."""
+        self._local = threading.local()
+
+    def _connect(self, timeout):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(self.path)
+        except Exception:
+            sock.close()
+            raise
+        self._local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def validate(self, token, env=None):
+        """Validate a token with the daemon.
+
+        :param string token: The token from the request.
+        :param dict env: The WSGI environment of the request, which is used
+                         to check the token's bind information.
+
+        :returns: The status of the response and the token data if the token
+                  is VALID.
+        :raises DaemonUnavailable: If the daemon couldn't be reached or
+                                   doesn't understand the request, or the
+                                   request is too large for the daemon.
+        """
+        try:
+            request = encode_request(token, env)
+        except ValueError as e:
+            # only this token is validated without the daemon.
+            raise DaemonUnavailable(e)
+
+        deadline = None
+        if self.timeout is not None:
+            deadline = _monotonic() + self.timeout
+        sock = getattr(self._local, 'sock', None)
+
+        # a connection that was kept open may have been closed by a daemon
+        # that restarted since, so that is retried on a new connection within
+        # what is left of the timeout.
+        attempts = 2 if sock is not None else 1
+        error = None
+        for attempt in range(attempts):
+            try:
+                timeout = None
+                if deadline is not None:
+                    timeout = deadline - _monotonic()
+                    if timeout <= 0:
+                        error = 'timed out'
+                        break
+                if sock is None:
+                    sock = self._connect(timeout)
+                else:
+                    sock.settimeout(timeout)
+                sock.sendall(request)
+                status, data = read_response(sock)
+            except socket.timeout as e:
+                # a daemon that is too slow isn't retried.
+                self._close()
+                error = e
+                break
+            except (socket.error, EOFError, struct.error, ValueError) as e:
+                self._close()
+                sock = None
+                error = e
+                continue
+
+            if status == UNSUPPORTED:
+                self._close()
+                error = 'the daemon does not support version %d' % VERSION
+                break
+
+            return status, data
+
+        self._unavailable_until = time.time() + self.retry_delay
+        raise DaemonUnavailable(error or 'connection closed')
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        while True:
+            try:
+                version, token, env = read_request(self.request)
+            except (socket.error, EOFError, struct.error, ValueError):
+                return
+
+            if version != VERSION:
+                self.request.sendall(encode_response(UNSUPPORTED))
+                return
+
+            try:
+                status, data = self.server.validate(token, env)
+            except Exception:
+                LOG.exception('Unexpected error validating token')
+                status, data = SERVICE_ERROR, None
+
+            self.request.sendall(encode_response(status, data))
+
+
+class ValidationServer(socketserver.ThreadingMixIn,
+                       socketserver.UnixStreamServer):
+    """Answer validation requests on a UNIX domain socket.
+
+    :param string path: The path of the socket. A socket left by a previous
+                        daemon is replaced.
+    :param validate: A function that is passed a token and an environment
+                     and returns a status and the token data.
+    :param int mode: The permissions of the socket. Only processes that can
+                     write to it can validate tokens.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path, validate, mode=stat.S_IRUSR | stat.S_IWUSR):
+        self.validate = validate
+
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.remove(path)
+
+        socketserver.UnixStreamServer.__init__(self, path, _RequestHandler)
+        os.chmod(path, mode)
+
+
+_cli_opts = [
+    cfg.StrOpt('socket',
+               default='/var/run/keystone/token-validator.sock',
+               help='The path of the socket that auth_token middleware '
+                    'sends tokens to. It should be the middleware\'s '
+                    'validation_daemon_socket.'),
+    cfg.StrOpt('socket-mode',
+               default='0600',
+               help='The permissions of the socket, in octal.'),
+]
+
+
+def main(argv=None):
+    # auth_token imports this module.
+    from keystoneclient.middleware import auth_token
+
+    conf = auth_token.CONF
+    conf.register_cli_opts(_cli_opts)
+    conf(sys.argv[1:] if argv is None else argv,
+         project='keystone-token-validator')
+
+    logging.basicConfig(level=logging.INFO)
+
+    # the daemon validates tokens itself rather than with another daemon.
+    auth = auth_token.AuthProtocol(None, {'validation_daemon_socket': None})
+
+    server = ValidationServer(conf.socket, auth.validate_for_daemon,
+                              mode=int(conf.socket_mode, 8))
+    LOG.info('Validating tokens on %s', conf.socket)
+    try:
+        server.serve_forever()
+    finally:
+        os.remove(conf.socket)
@@ -0,0 +1,138 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Policies that decide when a failed request should be retried."""
+
+import email.utils
+import random
+import time
+
+from keystoneclient import exceptions
+
+
+class RetryPolicy(object):
+    """Retry requests that failed for a reason that is likely to be temporary.
+
+    A request is retried if:
+
+    - a connection to the server could not be established, so the request
+      was never sent.
+    - the connection was lost or the request timed out and the method is
+      idempotent, so it does no harm if the server did process the first
+      request.
+    - the response has one of the statuses that indicate the server is busy
+      or the request conflicted with another, by default 409, 429 and 503.
+
+    Between attempts the policy waits for the time given by a Retry-After
+    header or, if there isn't one, an exponential backoff with full jitter:
+    a random time between 0 and ``backoff * 2 ** retry`` seconds. No wait is
+    longer than max_backoff and no retry is made that would take the request
+    beyond the deadline.
+
+    :param int retries: The maximum number of retries of a request.
+    :param float backoff: The base of the exponential backoff in seconds.
+    :param float max_backoff: The longest time to wait between attempts.
+    :param float deadline: The total time in seconds that a request and its
+                           retries may take. (optional)
+    :param statuses: Response status codes that are retried. (optional)
+    :param methods: The idempotent HTTP methods that are retried after a
+                    timeout or lost connection. (optional)
+    """
+
+    RETRY_STATUSES = frozenset([409, 429, 503])
+    IDEMPOTENT_METHODS = frozenset(['DELETE', 'GET', 'HEAD', 'OPTIONS', 'PUT',
+                                    'TRACE'])
+
+    def __init__(self, retries=3, backoff=0.5, max_backoff=30.0,
+                 deadline=None, statuses=None, methods=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.statuses = frozenset(statuses or self.RETRY_STATUSES)
+        self.methods = frozenset(m.upper() for m in
+                                 (methods or self.IDEMPOTENT_METHODS))
+
+    def get_backoff(self, retry):
+        """Return a random time to wait before the given retry.
+
+        :param int retry: The number of retries already made.
+        """
+        return random.uniform(0, min(self.max_backoff,
+                                     self.backoff * 2 ** retry))
+
+    def get_retry_after(self, resp):
+        """Return the wait requested by a Retry-After header or None."""
+        value = resp.headers.get('Retry-After')
+        if not value:
+            return None
+
+        try:
+            delay = float(value)
+        except ValueError:
+            date = email.utils.parsedate_tz(value)
+            if not date:
+                return None
+            delay = email.utils.mktime_tz(date) - time.time()
+
+        return min(max(delay, 0.0), self.max_backoff)
+
+    def _delay(self, retry, elapsed, delay):
+        if retry >= self.retries:
+            return None
+        if self.deadline is not None and elapsed + delay > self.deadline:
+            return None
+        return delay
+
+    def retry_error(self, method, exc, retry, elapsed):
+        """Decide whether to retry a request that raised an exception.
+
+        :param string method: The HTTP method of the request.
+        :param exc: The exception raised by the session.
+        :param int retry: The number of retries already made.
+        :param float elapsed: Seconds since the first attempt started.
+
+        :returns: The time to wait before retrying, or None to not retry.
+        """
+        if isinstance(exc, exceptions.SSLError):
+            # a certificate problem won't fix itself.
+            return None
+        elif isinstance(exc, exceptions.ConnectFailure):
+            pass
+        elif isinstance(exc, (exceptions.ConnectionRefused,
+                              exceptions.RequestTimeout)):
+            # the server may have received the request.
+            if method.upper() not in self.methods:
+                return None
+        else:
+            return None
+
+        return self._delay(retry, elapsed, self.get_backoff(retry))
+
+    def retry_response(self, method, resp, retry, elapsed):
+        """Decide whether to retry a request given its response.
+
+        :param string method: The HTTP method of the request.
+        :param resp: The response to the request.
+        :param int retry: The number of retries already made.
+        :param float elapsed: Seconds since the first attempt started.
+
+        :returns: The time to wait before retrying, or None to not retry.
+        """
+        if resp.status_code not in self.statuses:
+            return None
+
+        delay = self.get_retry_after(resp)
+        if delay is None:
+            delay = self.get_backoff(retry)
+
+        return self._delay(retry, elapsed, delay)
@@ -11,25 +11,61 @@
 # under the License.
 
 import argparse
+import hashlib
 import logging
 import os
+import re
+import time
 
-from oslo.config import cfg
 import requests
 import six
 from six.moves import urllib
 
+from keystoneclient import _json
 from keystoneclient import exceptions
 from keystoneclient.openstack.common import importutils
-from keystoneclient.openstack.common import jsonutils
+from keystoneclient import retry
 from keystoneclient import utils
 
 osprofiler_web = importutils.try_import("osprofiler.web")
 
+try:
+    from requests.packages.urllib3.exceptions import NewConnectionError
+except ImportError:
+    NewConnectionError = None
+
+# requests before 2.4 doesn't tell connect timeouts apart, and an except
+# clause with an empty tuple matches nothing.
+_ConnectTimeout = getattr(requests.exceptions, 'ConnectTimeout', ())
+
 USER_AGENT = 'python-keystoneclient'
 
 _logger = logging.getLogger(__name__)
 
+# The events that are reported to session hooks.
+PRE_REQUEST = 'pre_request'
+POST_RESPONSE = 'post_response'
+REAUTH = 'reauth'
+REDIRECT = 'redirect'
+RETRY = 'retry'
+ERROR = 'error'
+
+# The values of these headers are replaced by a hash when they are logged.
+_SENSITIVE_HEADERS = ('authorization', 'x-auth-token', 'x-service-token',
+                      'x-subject-token')
+
+# Secrets in JSON bodies that are masked when they are logged. A value ends
+# at its closing quote or, if the body was truncated within it, at the end of
+# the text.
+_SENSITIVE_BODY_RE = re.compile(
+    r'("(?:password|passcode|secret)"\s*:\s*")(?:[^"\\]|\\.)*\\?("|$)')
+
+try:
+    _monotonic = time.monotonic
+except AttributeError:
+    # NOTE: python 2 has no monotonic clock in the standard library.
+    _monotonic = time.time
+
 
 def _positive_non_zero_float(argument_value):
     if argument_value is None:
@@ -45,6 +81,75 @@ def _positive_non_zero_float(argument_value):
     return value
 
 
+def _is_connect_failure(exc):
+    """Return True if the request of a ConnectionError was never sent."""
+    if NewConnectionError is None:
+        return False
+    # requests wraps the urllib3 error in a MaxRetryError.
+    reason = exc.args[0] if exc.args else None
+    reason = getattr(reason, 'reason', reason)
+    return isinstance(reason, NewConnectionError)
+
+
+def _body_length(data):
+    if isinstance(data, (six.binary_type, six.text_type)):
+        return len(data)
+    return None
+
+
+def _response_length(resp, kwargs):
+    try:
+        return int(resp.headers['Content-Length'])
+    except (KeyError, ValueError):
+        pass
+
+    # reading the content of a streamed response would consume it.
+    if kwargs.get('stream'):
+        return None
+    return len(resp.content)
+
+
+def _redact_header(name, value):
+    if name.lower() not in _SENSITIVE_HEADERS:
+        return value
+
+    if isinstance(value, six.text_type):
+        value = value.encode('utf-8')
+    return '{SHA1}%s' % hashlib.sha1(value).hexdigest()
+
+
+def _format_body(body, limit):
+    """Return a loggable version of a request or response body.
+
+    The body is truncated to limit bytes before it is decoded so that large
+    bodies are never decoded in full, and any secrets in it are masked,
+    including a secret that the truncation cuts short.
+    """
+    if isinstance(body, six.text_type):
+        body = body.encode('utf-8')
+    elif not isinstance(body, six.binary_type):
+        return '%s' % body
+
+    length = len(body)
+    if limit is not None and length > limit:
+        body = body[:limit]
+
+    text = body.decode('utf-8', 'replace')
+    text = _SENSITIVE_BODY_RE.sub(r'\1***\2', text)
+
+    if length > len(body):
+        text += '... (%d bytes omitted)' % (length - len(body))
+    return text
+
+
+def _is_text(content_type):
+    if not content_type:
+        return True
+    content_type = content_type.lower()
+    return (content_type.startswith('text/') or 'json' in content_type or
+            'xml' in content_type)
+
+
 def request(url, method='GET', **kwargs):
     return Session().request(url, method=method, **kwargs)
 
@@ -72,10 +177,15 @@ class Session(object):
     REDIRECT_STATUSES = (301, 302, 303, 305, 307)
     DEFAULT_REDIRECT_LIMIT = 30
 
+    # The number of bytes of request and response bodies that are included
+    # in debug logs, or None to include the whole body.
+    MAX_LOG_BODY_LENGTH = 4096
+
     @utils.positional(2, enforcement=utils.positional.WARN)
     def __init__(self, auth=None, session=None, original_ip=None, verify=True,
                  cert=None, timeout=None, user_agent=None,
-                 redirect=DEFAULT_REDIRECT_LIMIT):
+                 redirect=DEFAULT_REDIRECT_LIMIT, hooks=None,
+                 retry_policy=None, endpoint_selector=None):
         """Maintains client communication state and common functionality.
 
         As much as possible the parameters to this class reflect and are passed
@@ -111,6 +221,18 @@ class Session(object):
                                   that can be followed by a request. Either an
                                   integer for a specific count or True/False
                                   for forever/never. (optional, default to 30)
+        :param list hooks: Callables that are notified of request events. See
+                           :py:meth:`add_hook`. (optional)
+        :param retry_policy: Decides which failed requests are retried. If
+                             not provided requests are not retried.
+                             (optional)
+        :type retry_policy: :py:class:`keystoneclient.retry.RetryPolicy`
+        :param endpoint_selector: Chooses between the catalog endpoints that
+                                  match the endpoint_filter of a request. If
+                                  not provided the first matching endpoint
+                                  is used. (optional)
+        :type endpoint_selector:
+            :py:class:`keystoneclient.endpoint_selection.EndpointSelector`
         """
         if not session:
             session = _FakeRequestSession()
@@ -122,6 +244,9 @@ class Session(object):
         self.cert = cert
         self.timeout = None
         self.redirect = redirect
+        self.hooks = list(hooks or [])
+        self.retry_policy = retry_policy
+        self.endpoint_selector = endpoint_selector
 
         if timeout is not None:
             self.timeout = float(timeout)
@@ -130,11 +255,50 @@ class Session(object):
         if user_agent is not None:
             self.user_agent = user_agent
 
+    def add_hook(self, hook):
+        """Register a callable to be notified of request events.
+
+        The hook is called as ``hook(event, info)`` where event is one of:
+
+        - PRE_REQUEST: before each HTTP request is sent, including requests
+          that follow a redirect or retry after re-authentication.
+        - POST_RESPONSE: when a response is received.
+        - ERROR: when no response could be received.
+        - REDIRECT: when a redirect response is about to be followed.
+        - RETRY: when a failed request is about to be retried, after
+          ``delay`` seconds. The info contains the ``retry`` number and
+          either the ``response`` or the ``exception`` that failed.
+        - REAUTH: when a 401 response causes the auth plugin to be
+          invalidated before retrying the request.
+
+        info is a dict that always contains the ``method`` and ``url`` of the
+        request. Events for a single HTTP request share a ``start`` time
+        taken from a monotonic clock, and POST_RESPONSE and ERROR events add
+        the ``elapsed`` time in seconds. POST_RESPONSE events also contain
+        the ``response`` and the ``bytes_sent`` and ``bytes_received``, which
+        are None if unknown. ERROR events contain the ``exception``.
+
+        Exceptions raised by hooks are logged and otherwise ignored.
+        """
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        """Stop notifying a hook registered with :py:meth:`add_hook`."""
+        self.hooks.remove(hook)
+
+    def _emit(self, hooks, event, **info):
+        for hook in hooks:
+            try:
+                hook(event, info)
+            except Exception:
+                _logger.exception('Session hook %r failed', hook)
+
     @utils.positional(enforcement=utils.positional.WARN)
     def request(self, url, method, json=None, original_ip=None,
                 user_agent=None, redirect=None, authenticated=None,
                 endpoint_filter=None, auth=None, requests_auth=None,
-                raise_exc=True, allow_reauth=True, **kwargs):
+                raise_exc=True, allow_reauth=True, retry_policy=None,
+                endpoint_selector=None, **kwargs):
         """Send an HTTP request with the specified characteristics.
 
         Wrapper around `requests.Session.request` to handle tasks such as
@@ -183,6 +347,14 @@ class Session(object):
         :param bool allow_reauth: Allow fetching a new token and retrying the
                                   request on receiving a 401 Unauthorized
                                   response. (optional, default True)
+        :param retry_policy: The policy used to retry this request, overriding
+                             the session's policy. (optional)
+        :type retry_policy: :py:class:`keystoneclient.retry.RetryPolicy`
+        :param endpoint_selector: The selector used to choose the endpoint for
+                                  this request, overriding the session's
+                                  selector. (optional)
+        :type endpoint_selector:
+            :py:class:`keystoneclient.endpoint_selection.EndpointSelector`
         :param kwargs: any other parameter that can be passed to
                        requests.Session.request (such as `headers`). Except:
                        'data' will be overwritten by the data in 'json' param.
@@ -215,14 +387,29 @@ class Session(object):
         # should ignore the filter. This will make it easier for clients who
         # want to overrule the default endpoint_filter data added to all client
         # requests. We check fully qualified here by the presence of a host.
+        if endpoint_selector is None:
+            endpoint_selector = self.endpoint_selector
+
+        # the base URL of each endpoint the request can be sent to, if known,
+        # and the URL of the request to it.
+        urls = [(None, url)]
+
         url_data = urllib.parse.urlparse(url)
         if endpoint_filter and not url_data.netloc:
-            base_url = self.get_endpoint(auth, **endpoint_filter)
+            if endpoint_selector:
+                base_urls = endpoint_selector.order(
+                    self.get_endpoints(auth, **endpoint_filter))
+            else:
+                base_url = self.get_endpoint(auth, **endpoint_filter)
+                base_urls = [base_url] if base_url else []
 
-            if not base_url:
+            if not base_urls:
                 raise exceptions.EndpointNotFound()
 
-            url = '%s/%s' % (base_url.rstrip('/'), url.lstrip('/'))
+            urls = [(base_url,
+                     '%s/%s' % (base_url.rstrip('/'), url.lstrip('/')))
+                    for base_url in base_urls]
+            url = urls[0][1]
 
         if self.cert:
             kwargs.setdefault('cert', self.cert)
@@ -243,35 +430,16 @@ class Session(object):
 
         if json is not None:
             headers['Content-Type'] = 'application/json'
-            kwargs['data'] = jsonutils.dumps(json)
+            kwargs['data'] = _json.dumps(json)
 
         kwargs.setdefault('verify', self.verify)
 
         if requests_auth:
             kwargs['auth'] = requests_auth
 
-        string_parts = ['curl -i']
-
-        # NOTE(jamielennox): None means let requests do its default validation
-        # so we need to actually check that this is False.
-        if self.verify is False:
-            string_parts.append('--insecure')
-
-        if method:
-            string_parts.extend(['-X', method])
-
-        string_parts.append(url)
-
-        if headers:
-            for header in six.iteritems(headers):
-                string_parts.append('-H "%s: %s"' % header)
-
-        try:
-            string_parts.append("-d '%s'" % kwargs['data'])
-        except KeyError:
-            pass
-
-        _logger.debug('REQ: %s', ' '.join(string_parts))
+        # only build the log message if it is going to be written.
+        if _logger.isEnabledFor(logging.DEBUG):
+            self._http_log_request(url, method, headers, kwargs.get('data'))
 
         # Force disable requests redirect handling. We will manage this below.
         kwargs['allow_redirects'] = False
@@ -279,16 +447,27 @@ class Session(object):
         if redirect is None:
             redirect = self.redirect
 
-        resp = self._send_request(url, method, redirect, **kwargs)
+        if retry_policy is None:
+            retry_policy = self.retry_policy
+
+        url, resp = self._send_to_endpoints(urls, endpoint_selector, method,
+                                            redirect,
+                                            retry_policy=retry_policy,
+                                            **kwargs)
 
         # handle getting a 401 Unauthorized response by invalidating the plugin
         # and then retrying the request. This is only tried once.
         if resp.status_code == 401 and authenticated and allow_reauth:
             if self.invalidate(auth):
+                if self.hooks:
+                    self._emit(self.hooks, REAUTH, method=method, url=url,
+                               response=resp)
                 token = self.get_token(auth)
                 if token:
                     headers['X-Auth-Token'] = token
-                    resp = self._send_request(url, method, redirect, **kwargs)
+                    resp = self._send_request(url, method, redirect,
+                                              retry_policy=retry_policy,
+                                              **kwargs)
 
         if raise_exc and resp.status_code >= 400:
             _logger.debug('Request returned failure status: %s',
@@ -297,26 +476,67 @@ class Session(object):
 
         return resp
 
-    def _send_request(self, url, method, redirect, **kwargs):
+    def _send_to_endpoints(self, urls, selector, method, redirect, **kwargs):
+        """Send the request to the first endpoint that can be reached.
+
+        A request is failed over to the next endpoint if a connection
+        couldn't be made. If the connection was lost or the request timed
+        out, the endpoint may have processed it, so it is only failed over
+        if the method is idempotent. Every failure is recorded.
+
+        :returns: a tuple of the URL the request was sent to and the response.
+        """
+        policy = kwargs.get('retry_policy')
+        methods = (policy.methods if policy
+                   else retry.RetryPolicy.IDEMPOTENT_METHODS)
+        idempotent = method.upper() in methods
+
+        for i, (base_url, url) in enumerate(urls):
+            record = selector and base_url
+            start = _monotonic()
+
+            try:
+                resp = self._send_request(url, method, redirect, **kwargs)
+            except exceptions.SSLError:
+                # a certificate problem is not a reason to fail over.
+                raise
+            except (exceptions.ConnectionRefused,
+                    exceptions.RequestTimeout) as e:
+                if record:
+                    selector.record(base_url, failed=True)
+                if i == len(urls) - 1:
+                    raise
+                if not (idempotent or
+                        isinstance(e, exceptions.ConnectFailure)):
+                    raise
+                _logger.warn('Request to %s failed, trying the next '
+                             'endpoint: %s', base_url, e)
+                continue
+
+            if record:
+                selector.record(base_url, _monotonic() - start,
+                                failed=resp.status_code >= 500)
+            return url, resp
+
+    def _send_request(self, url, method, redirect, retry_policy=None,
+                      **kwargs):
         # NOTE(jamielennox): We handle redirection manually because the
         # requests lib follows some browser patterns where it will redirect
         # POSTs as GETs for certain statuses which is not want we want for an
         # API. See: https://en.wikipedia.org/wiki/Post/Redirect/Get
 
-        try:
-            resp = self.session.request(method, url, **kwargs)
-        except requests.exceptions.SSLError:
-            msg = 'SSL exception connecting to %s' % url
-            raise exceptions.SSLError(msg)
-        except requests.exceptions.Timeout:
-            msg = 'Request to %s timed out' % url
-            raise exceptions.RequestTimeout(msg)
-        except requests.exceptions.ConnectionError:
-            msg = 'Unable to establish connection to %s' % url
-            raise exceptions.ConnectionRefused(msg)
+        # take a copy so hooks added during the request don't see only part
+        # of it.
+        hooks = list(self.hooks)
 
-        _logger.debug('RESP: [%s] %s\nRESP BODY: %s\n',
-                      resp.status_code, resp.headers, resp.text)
+        if retry_policy is None:
+            resp = self._send_attempt(hooks, url, method, **kwargs)
+        else:
+            resp = self._send_with_retries(hooks, retry_policy, url, method,
+                                           **kwargs)
+
+        if _logger.isEnabledFor(logging.DEBUG):
+            self._http_log_response(resp, kwargs.get('stream', False))
 
         if resp.status_code in self.REDIRECT_STATUSES:
             # be careful here in python True == 1 and False == 0
@@ -335,7 +555,11 @@ class Session(object):
                 _logger.warn("Failed to redirect request to %s as new "
                              "location was not provided.", resp.url)
             else:
+                if hooks:
+                    self._emit(hooks, REDIRECT, method=method, url=url,
+                               response=resp, location=location)
                 new_resp = self._send_request(location, method, redirect,
+                                              retry_policy=retry_policy,
                                               **kwargs)
 
                 if not isinstance(new_resp.history, list):
@@ -345,6 +569,119 @@ class Session(object):
 
         return resp
 
+    def _http_log_request(self, url, method, headers, data):
+        string_parts = ['curl -i']
+
+        # NOTE(jamielennox): None means let requests do its default validation
+        # so we need to actually check that this is False.
+        if self.verify is False:
+            string_parts.append('--insecure')
+
+        if method:
+            string_parts.extend(['-X', method])
+
+        string_parts.append(url)
+
+        if headers:
+            for name, value in six.iteritems(headers):
+                string_parts.append('-H "%s: %s"' %
+                                    (name, _redact_header(name, value)))
+
+        if isinstance(data, (six.binary_type, six.text_type)):
+            string_parts.append("-d '%s'" %
+                                _format_body(data, self.MAX_LOG_BODY_LENGTH))
+        elif data is not None:
+            # don't consume files or generators that are being uploaded.
+            string_parts.append('-d <streamed data>')
+
+        _logger.debug('REQ: %s', ' '.join(string_parts))
+
+    def _http_log_response(self, resp, stream):
+        headers = dict((name, _redact_header(name, value))
+                       for name, value in six.iteritems(resp.headers))
+        content_type = resp.headers.get('Content-Type')
+
+        if stream:
+            # reading the body would consume it before the caller can.
+            body = '<streamed response>'
+        elif not _is_text(content_type):
+            body = '<%d bytes of %s>' % (len(resp.content), content_type)
+        else:
+            body = _format_body(resp.content, self.MAX_LOG_BODY_LENGTH)
+
+        _logger.debug('RESP: [%s] %s\nRESP BODY: %s\n',
+                      resp.status_code, headers, body)
+
+    def _send_with_retries(self, hooks, policy, url, method, **kwargs):
+        start = _monotonic()
+        retries = 0
+
+        while True:
+            try:
+                resp = self._send_attempt(hooks, url, method, **kwargs)
+            except exceptions.ClientException as e:
+                delay = policy.retry_error(method, e, retries,
+                                           _monotonic() - start)
+                if delay is None:
+                    raise
+                reason = {'exception': e}
+            else:
+                delay = policy.retry_response(method, resp, retries,
+                                              _monotonic() - start)
+                if delay is None:
+                    return resp
+                reason = {'response': resp}
+
+            retries += 1
+            _logger.debug('Retrying %s %s in %.2f seconds (retry %d)',
+                          method, url, delay, retries)
+            if hooks:
+                self._emit(hooks, RETRY, method=method, url=url,
+                           retry=retries, delay=delay, **reason)
+            time.sleep(delay)
+
+    def _send_attempt(self, hooks, url, method, **kwargs):
+        if hooks:
+            start = _monotonic()
+            self._emit(hooks, PRE_REQUEST, method=method, url=url,
+                       start=start)
+
+        try:
+            resp = self._send_single_request(url, method, **kwargs)
+        except exceptions.ClientException as e:
+            if hooks:
+                self._emit(hooks, ERROR, method=method, url=url, start=start,
+                           elapsed=_monotonic() - start, exception=e)
+            raise
+
+        if hooks:
+            self._emit(hooks, POST_RESPONSE, method=method, url=url,
+                       start=start, elapsed=_monotonic() - start,
+                       response=resp,
+                       bytes_sent=_body_length(kwargs.get('data')),
+                       bytes_received=_response_length(resp, kwargs))
+
+        return resp
+
+    def _send_single_request(self, url, method, **kwargs):
+        try:
+            return self.session.request(method, url, **kwargs)
+        except requests.exceptions.SSLError:
+            msg = 'SSL exception connecting to %s' % url
+            raise exceptions.SSLError(msg)
+        except _ConnectTimeout:
+            msg = 'Unable to establish connection to %s' % url
+            raise exceptions.ConnectFailure(msg)
+        except requests.exceptions.Timeout:
+            msg = 'Request to %s timed out' % url
+            raise exceptions.RequestTimeout(msg)
+        except requests.exceptions.ConnectionError as e:
+            msg = 'Unable to establish connection to %s' % url
+            if _is_connect_failure(e):
+                raise exceptions.ConnectFailure(msg)
+            # the connection may have been lost after the request was sent.
+            raise exceptions.ConnectionRefused(msg)
+
     def head(self, url, **kwargs):
         return self.request(url, 'HEAD', **kwargs)
 
@@ -390,7 +727,8 @@ class Session(object):
 
     @classmethod
     def _make(cls, insecure=False, verify=None, cacert=None, cert=None,
-              key=None, **kwargs):
+              key=None, retries=0, retry_backoff=0.5, retry_deadline=None,
+              **kwargs):
         """Create a session with individual certificate parameters.
 
         Some parameters used to create a session don't lend themselves to be
@@ -408,6 +746,12 @@ class Session(object):
             # requests lib form of having the cert and key as a tuple
             cert = (cert, key)
 
+        if retries and 'retry_policy' not in kwargs:
+            kwargs['retry_policy'] = retry.RetryPolicy(
+                retries=retries,
+                backoff=retry_backoff,
+                deadline=retry_deadline)
+
         return cls(verify=verify, cert=cert, **kwargs)
 
     def get_token(self, auth=None):
@@ -453,6 +797,26 @@ class Session(object):
 
         return auth.get_endpoint(self, **kwargs)
 
+    def get_endpoints(self, auth=None, **kwargs):
+        """Get every matching endpoint as provided by the auth plugin.
+
+        :param auth: The auth plugin to use for token. Overrides the plugin on
+                     the session. (optional)
+        :type auth: :class:`keystoneclient.auth.base.BaseAuthPlugin`
+
+        :raises MissingAuthPlugin: if a plugin is not available.
+
+        :returns list: The endpoints that are available, possibly empty.
+        """
+        if not auth:
+            auth = self.auth
+
+        if not auth:
+            raise exceptions.MissingAuthPlugin('An auth plugin is required to '
+                                               'determine the endpoint URL.')
+
+        return auth.get_endpoints(self, **kwargs)
+
     def invalidate(self, auth=None):
         """Invalidate an authentication plugin.
         """
@@ -478,6 +842,9 @@ class Session(object):
             :keyfile: The key for the client certificate.
             :insecure: Whether to ignore SSL verification.
             :timeout: The max time to wait for HTTP connections.
+            :retries: The max number of times to retry failed requests.
+            :retry_backoff: The base of the exponential retry backoff.
+            :retry_deadline: The max total time of a request and its retries.
 
         :param dict deprecated_opts: Deprecated options that should be included
              in the definition of new options. This should be a dictionary from
@@ -492,6 +859,10 @@ class Session(object):
 
         :returns: A list of oslo.config options.
         """
+        # NOTE: oslo.config is slow to import and only needed by services
+        # that use config files, so it isn't imported with the session.
+        from oslo.config import cfg
+
         if deprecated_opts is None:
             deprecated_opts = {}
 
@@ -512,6 +883,23 @@ class Session(object):
                 cfg.IntOpt('timeout',
                            deprecated_opts=deprecated_opts.get('timeout'),
                            help='Timeout value for http requests'),
+                cfg.IntOpt('retries',
+                           default=0,
+                           deprecated_opts=deprecated_opts.get('retries'),
+                           help='How many times to retry requests that fail '
+                                'to connect, time out or are rejected as '
+                                'the server is busy.'),
+                cfg.FloatOpt('retry_backoff',
+                             default=0.5,
+                             deprecated_opts=deprecated_opts.get(
+                                 'retry_backoff'),
+                             help='The base, in seconds, of the exponential '
+                                  'backoff between retries.'),
+                cfg.FloatOpt('retry_deadline',
+                             deprecated_opts=deprecated_opts.get(
+                                 'retry_deadline'),
+                             help='The total time, in seconds, that a '
+                                  'request and its retries may take.'),
                 ]
 
     @utils.positional.classmethod()
@@ -524,6 +912,9 @@ class Session(object):
             :keyfile: The key for the client certificate.
             :insecure: Whether to ignore SSL verification.
             :timeout: The max time to wait for HTTP connections.
+            :retries: The max number of times to retry failed requests.
+            :retry_backoff: The base of the exponential retry backoff.
+            :retry_deadline: The max total time of a request and its retries.
 
         :param oslo.config.Cfg conf: config object to register with.
         :param string group: The ini group to register options in.
@@ -540,6 +931,8 @@ class Session(object):
 
         :returns: The list of options that was registered.
         """
+        from oslo.config import cfg
+
         opts = cls.get_conf_options(deprecated_opts=deprecated_opts)
         conf.register_group(cfg.OptGroup(group))
         conf.register_opts(opts, group=group)
@@ -565,6 +958,9 @@ class Session(object):
         kwargs['cert'] = c.certfile
         kwargs['key'] = c.keyfile
         kwargs['timeout'] = c.timeout
+        kwargs['retries'] = c.retries
+        kwargs['retry_backoff'] = c.retry_backoff
+        kwargs['retry_deadline'] = c.retry_deadline
 
         return cls._make(**kwargs)
 
@@ -606,6 +1002,23 @@ class Session(object):
                             metavar='<seconds>',
                             help='Set request timeout (in seconds).')
 
+        parser.add_argument('--os-retries',
+                            default=os.environ.get('OS_RETRIES', 0),
+                            type=int,
+                            metavar='<retries>',
+                            help='How many times to retry requests that fail '
+                                 'to connect, time out or are rejected as '
+                                 'the server is busy. '
+                                 'Defaults to env[OS_RETRIES] or 0.')
+
+        parser.add_argument('--os-retry-deadline',
+                            default=os.environ.get('OS_RETRY_DEADLINE'),
+                            type=_positive_non_zero_float,
+                            metavar='<seconds>',
+                            help='The total time that a request and its '
+                                 'retries may take. '
+                                 'Defaults to env[OS_RETRY_DEADLINE].')
+
     @classmethod
     def load_from_cli_options(cls, args, **kwargs):
         """Create a session object from CLI arguments.
@@ -621,5 +1034,7 @@ class Session(object):
         kwargs['cert'] = args.os_cert
         kwargs['key'] = args.os_key
         kwargs['timeout'] = args.timeout
+        kwargs['retries'] = args.os_retries
+        kwargs['retry_deadline'] = args.os_retry_deadline
 
         return cls._make(**kwargs)
@@ -34,13 +34,26 @@ import six
 
 import keystoneclient
 from keystoneclient import access
-from keystoneclient.contrib.bootstrap import shell as shell_bootstrap
 from keystoneclient import exceptions as exc
-from keystoneclient.generic import shell as shell_generic
 from keystoneclient.openstack.common import strutils
 from keystoneclient import session
+from keystoneclient import token_cache
 from keystoneclient import utils
-from keystoneclient.v2_0 import shell as shell_v2_0
+
+
+# The modules that provide the subcommands of each API version, imported when
+# they are needed.
+ACTIONS_MODULES = {
+    '2.0': 'keystoneclient.v2_0.shell',
+}
+
+COMMON_ACTIONS_MODULES = ['keystoneclient.generic.shell',
+                          'keystoneclient.contrib.bootstrap.shell']
+
+
+def _import_module(name):
+    __import__(name)
+    return sys.modules[name]
 
 
 def env(*vars, **kwargs):
@@ -79,8 +92,8 @@ class OpenStackIdentityShell(object):
                             help=argparse.SUPPRESS)
 
         parser.add_argument('--version',
-                            action='version',
-                            version=keystoneclient.__version__,
+                            action=VersionAction,
+                            nargs=0,
                             help="Shows the client version and exits.")
 
         parser.add_argument('--debug',
@@ -176,6 +189,22 @@ class OpenStackIdentityShell(object):
         parser.add_argument('--os_cache',
                             help=argparse.SUPPRESS)
 
+        parser.add_argument('--os-token-cache',
+                            default=env('OS_TOKEN_CACHE', default=False),
+                            action='store_true',
+                            help='Store tokens in files so that later '
+                                 'commands reuse them rather than '
+                                 'authenticating again. '
+                                 'Defaults to env[OS_TOKEN_CACHE].')
+
+        parser.add_argument('--os-token-cache-dir',
+                            metavar='<directory>',
+                            default=env('OS_TOKEN_CACHE_DIR'),
+                            help='The directory that tokens are stored in '
+                                 'by --os-token-cache. Defaults to '
+                                 'env[OS_TOKEN_CACHE_DIR] or %s.' %
+                                 token_cache.default_path())
+
         parser.add_argument('--os_cacert', help=argparse.SUPPRESS)
         parser.add_argument('--os_key', help=argparse.SUPPRESS)
         parser.add_argument('--os_cert', help=argparse.SUPPRESS)
@@ -184,12 +213,12 @@ class OpenStackIdentityShell(object):
                             default=False,
                             action="store_true",
                             dest='force_new_token',
-                            help="If the keyring is available and in use, "
+                            help="If the keyring or token cache is in use, "
                                  "token will always be stored and fetched "
-                                 "from the keyring until the token has "
+                                 "from it until the token has "
                                  "expired. Use this option to request a "
                                  "new token and replace the existing one "
-                                 "in the keyring.")
+                                 "in the keyring or token cache.")
 
         parser.add_argument('--stale-duration',
                             metavar='<seconds>',
@@ -197,7 +226,8 @@ class OpenStackIdentityShell(object):
                             dest='stale_duration',
                             help="Stale duration (in seconds) used to "
                                  "determine whether a token has expired "
-                                 "when retrieving it from keyring. This "
+                                 "when retrieving it from keyring or the "
+                                 "token cache. This "
                                  "is useful in mitigating process or "
                                  "network delays. Default is %s seconds." %
                                  access.STALE_TOKEN_DURATION)
@@ -205,24 +235,35 @@ class OpenStackIdentityShell(object):
         session.Session.register_cli_options(parser)
         return parser
 
-    def get_subcommand_parser(self, version):
+    def _get_actions_modules(self, version):
+        name = ACTIONS_MODULES.get(version, ACTIONS_MODULES['2.0'])
+        return [_import_module(m) for m in [name] + COMMON_ACTIONS_MODULES]
+
+    def get_subcommand_parser(self, version, command=None):
+        """Build the parser of the subcommands of an API version.
+
+        :param string command: Only build the parser of this subcommand.
+                               Every subcommand is built if it is None or
+                               a subcommand of the shell itself such as help.
+        """
         parser = self.get_base_parser()
 
         self.subcommands = {}
         subparsers = parser.add_subparsers(metavar='<subcommand>')
 
-        try:
-            actions_module = {
-                '2.0': shell_v2_0,
-            }[version]
-        except KeyError:
-            actions_module = shell_v2_0
+        actions_modules = self._get_actions_modules(version)
+
+        if command:
+            attr = 'do_%s' % command.replace('-', '_')
+            if not any(hasattr(m, attr) for m in actions_modules):
+                command = None
 
-        self._find_actions(subparsers, actions_module)
-        self._find_actions(subparsers, shell_generic)
-        self._find_actions(subparsers, shell_bootstrap)
-        self._find_actions(subparsers, self)
-        self._add_bash_completion_subparser(subparsers)
+        for actions_module in actions_modules:
+            self._find_actions(subparsers, actions_module, command)
+
+        if not command:
+            self._find_actions(subparsers, self)
+            self._add_bash_completion_subparser(subparsers)
 
         return parser
 
@@ -235,10 +276,12 @@ class OpenStackIdentityShell(object):
         self.subcommands['bash_completion'] = subparser
         subparser.set_defaults(func=self.do_bash_completion)
 
-    def _find_actions(self, subparsers, actions_module):
+    def _find_actions(self, subparsers, actions_module, only=None):
         for attr in (a for a in dir(actions_module) if a.startswith('do_')):
             # I prefer to be hyphen-separated instead of underscores.
             command = attr[3:].replace('_', '-')
+            if only and command != only:
+                continue
             callback = getattr(actions_module, attr)
             desc = callback.__doc__ or ''
             help = desc.strip().split('\n')[0]
@@ -317,9 +360,11 @@ class OpenStackIdentityShell(object):
         parser = self.get_base_parser()
         (options, args) = parser.parse_known_args(argv)
 
-        # build available subcommands based on version
+        # build the subcommand that is used, or all of them if it's unknown
         api_version = options.os_identity_api_version
-        subcommand_parser = self.get_subcommand_parser(api_version)
+        command = next((a for a in args if not a.startswith('-')), None)
+        subcommand_parser = self.get_subcommand_parser(api_version,
+                                                       command=command)
         self.parser = subcommand_parser
 
         # Handle top-level --help/-h before attempting to parse
@@ -355,6 +400,7 @@ class OpenStackIdentityShell(object):
         args.os_endpoint = args.os_endpoint or env('SERVICE_ENDPOINT')
 
         if utils.isunauthenticated(args.func):
+            shell_generic = _import_module('keystoneclient.generic.shell')
             self.cs = shell_generic.CLIENT_CLASS(endpoint=args.os_auth_url,
                                                  cacert=args.os_cacert,
                                                  key=args.os_key,
@@ -366,6 +412,9 @@ class OpenStackIdentityShell(object):
             token = None
             if args.os_token and args.os_endpoint:
                 token = args.os_token
+            cache = None
+            if args.os_token_cache:
+                cache = token_cache.FileTokenCache(args.os_token_cache_dir)
             api_version = options.os_identity_api_version
             self.cs = self.get_api_class(api_version)(
                 username=args.os_username,
@@ -382,6 +431,7 @@ class OpenStackIdentityShell(object):
                 insecure=args.insecure,
                 debug=args.debug,
                 use_keyring=args.os_cache,
+                token_cache=cache,
                 force_new_token=args.force_new_token,
                 stale_duration=args.stale_duration,
                 timeout=args.timeout)
@@ -395,15 +445,14 @@ class OpenStackIdentityShell(object):
 
     def get_api_class(self, version):
         try:
-            return {
-                "2.0": shell_v2_0.CLIENT_CLASS,
-            }[version]
+            name = ACTIONS_MODULES[version]
         except KeyError:
             if version:
                 msg = ('WARNING: unsupported identity-api-version %s, '
                        'falling back to 2.0' % version)
                 print(msg)
-            return shell_v2_0.CLIENT_CLASS
+            name = ACTIONS_MODULES['2.0']
+        return _import_module(name).CLIENT_CLASS
 
     def do_bash_completion(self, args):
         """Prints all of the commands and options to stdout.
@@ -435,6 +484,18 @@ class OpenStackIdentityShell(object):
             self.parser.print_help()
 
 
+class VersionAction(argparse.Action):
+    """Print the client version and exit.
+
+    The version is only looked up when it's asked for, because finding it in
+    the package metadata is slow.
+    """
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        print(keystoneclient.__version__)
+        parser.exit()
+
+
 # I'm picky about my shell help.
 class OpenStackHelpFormatter(argparse.HelpFormatter):
     def start_section(self, heading):
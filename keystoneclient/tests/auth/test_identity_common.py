@@ -13,14 +13,21 @@
 import abc
 import uuid
 
+import fixtures
 import httpretty
+import mock
 import six
 
+from keystoneclient import access
+from keystoneclient.auth.identity import base
 from keystoneclient.auth.identity import v2
 from keystoneclient.auth.identity import v3
+from keystoneclient import exceptions
+from keystoneclient import fixture
 from keystoneclient.openstack.common import jsonutils
 from keystoneclient import session
 from keystoneclient.tests import utils
+from keystoneclient import token_cache
 
 
 @six.add_metaclass(abc.ABCMeta)
@@ -128,6 +135,16 @@ class CommonIdentityTests(object):
         self.assertEqual(200, resp.status_code)
         self.assertEqual(new_body, resp.text)
 
+    def test_get_endpoints(self):
+        a = self.create_auth_plugin()
+        s = session.Session()
+
+        self.assertEqual([self.TEST_COMPUTE_ADMIN],
+                         a.get_endpoints(s, service_type='compute',
+                                         interface='admin'))
+        self.assertEqual([], a.get_endpoints(s, service_type='unknown'))
+        self.assertEqual([], a.get_endpoints(s))
+
     def test_discovery_uses_session_cache(self):
         # register responses such that if the discovery URL is hit more than
         # once then the response will be invalid and not point to COMPUTE_ADMIN
@@ -208,6 +225,25 @@ class CommonIdentityTests(object):
         self.assertEqual(200, resp.status_code)
         self.assertEqual(body, resp.text)
 
+    def test_failed_discovery_not_retried(self):
+        a = self.create_auth_plugin()
+        s = session.Session()
+        endpoint_filter = {'service_type': 'compute', 'interface': 'admin',
+                           'version': self.version}
+
+        with mock.patch.object(base._discover, 'Discover',
+                               side_effect=exceptions.ConnectionRefused()
+                               ) as discover:
+            for _ in range(2):
+                self.assertEqual([self.TEST_COMPUTE_ADMIN],
+                                 a.get_endpoints(s, **endpoint_filter))
+            self.assertEqual(1, discover.call_count)
+
+            # discovery is tried again once the delay has passed.
+            a._discovery_failures[self.TEST_COMPUTE_ADMIN] = 0
+            a.get_endpoints(s, **endpoint_filter)
+            self.assertEqual(2, discover.call_count)
+
 
 class V3(CommonIdentityTests, utils.TestCase):
 
@@ -417,3 +453,172 @@ class V2(CommonIdentityTests, utils.TestCase):
 
     def stub_auth(self, **kwargs):
         self.stub_url(httpretty.POST, ['tokens'], **kwargs)
+
+
+class TokenRenewalTests(utils.TestCase):
+
+    def setUp(self):
+        super(TokenRenewalTests, self).setUp()
+        self.session = session.Session()
+        self.plugin = v2.Password('http://keystone:5000/v2.0',
+                                  username='user', password='pass',
+                                  refresh_lead_time=60)
+
+        patcher = mock.patch.object(self.plugin, 'get_auth_ref')
+        self.get_auth_ref = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _auth_ref(self, expires_in):
+        auth_ref = mock.Mock()
+        auth_ref.will_expire_soon.side_effect = lambda d: d >= expires_in
+        return auth_ref
+
+    def test_token_fetched_once(self):
+        self.get_auth_ref.return_value = self._auth_ref(3600)
+
+        first = self.plugin.get_access(self.session)
+        self.assertIs(first, self.plugin.get_access(self.session))
+        self.assertEqual(1, self.get_auth_ref.call_count)
+
+    def test_renewed_within_lead_time(self):
+        self.plugin.auth_ref = self._auth_ref(30)
+        new = self.get_auth_ref.return_value = self._auth_ref(3600)
+
+        self.assertIs(new, self.plugin.get_access(self.session))
+
+    def test_not_renewed_without_lead_time(self):
+        self.plugin.refresh_lead_time = 0
+        current = self.plugin.auth_ref = self._auth_ref(30)
+
+        self.assertIs(current, self.plugin.get_access(self.session))
+        self.assertFalse(self.get_auth_ref.called)
+
+    def test_failed_renewal_uses_current_token(self):
+        current = self.plugin.auth_ref = self._auth_ref(30)
+        self.get_auth_ref.side_effect = exceptions.ConnectionRefused()
+
+        self.assertIs(current, self.plugin.get_access(self.session))
+        # renewal isn't attempted again straight away.
+        self.assertIs(current, self.plugin.get_access(self.session))
+        self.assertEqual(1, self.get_auth_ref.call_count)
+
+    def test_renewal_in_progress_uses_current_token(self):
+        current = self.plugin.auth_ref = self._auth_ref(30)
+
+        with self.plugin._refresh_lock:
+            self.assertIs(current, self.plugin.get_access(self.session))
+
+        self.assertFalse(self.get_auth_ref.called)
+
+    def test_background_renewal(self):
+        self.plugin.background_refresh = True
+        current = self.plugin.auth_ref = self._auth_ref(30)
+        new = self.get_auth_ref.return_value = self._auth_ref(3600)
+
+        with mock.patch.object(base.threading, 'Thread') as thread:
+            self.assertIs(current, self.plugin.get_access(self.session))
+
+        self.assertTrue(thread.return_value.start.called)
+        self.assertTrue(self.plugin._refresh_lock.locked())
+
+        # run the thread's work.
+        target = thread.call_args[1]['target']
+        target(*thread.call_args[1]['args'])
+
+        self.assertFalse(self.plugin._refresh_lock.locked())
+        self.assertIs(new, self.plugin.get_access(self.session))
+
+    def test_expired_token_fetch_raises(self):
+        self.plugin.auth_ref = self._auth_ref(0)
+        self.get_auth_ref.side_effect = exceptions.ConnectionRefused()
+
+        self.assertRaises(exceptions.ConnectionRefused,
+                          self.plugin.get_access, self.session)
+        self.assertFalse(self.plugin._refresh_lock.locked())
+
+
+class TokenCacheTests(utils.TestCase):
+
+    AUTH_URL = 'http://keystone:5000/v2.0'
+
+    def setUp(self):
+        super(TokenCacheTests, self).setUp()
+        self.session = session.Session()
+        path = self.useFixture(fixtures.TempDir()).path
+        self.cache = token_cache.FileTokenCache(path)
+
+    def _plugin(self, username='user', password='pass'):
+        plugin = v2.Password(self.AUTH_URL, username=username,
+                             password=password, token_cache=self.cache)
+        patcher = mock.patch.object(plugin, 'get_auth_ref')
+        get_auth_ref = patcher.start()
+        self.addCleanup(patcher.stop)
+        get_auth_ref.return_value = access.AccessInfo.factory(
+            body=fixture.V2Token())
+        return plugin, get_auth_ref
+
+    def test_token_shared_between_plugins(self):
+        plugin, get_auth_ref = self._plugin()
+        token = plugin.get_token(self.session)
+        self.assertEqual(1, get_auth_ref.call_count)
+
+        plugin, get_auth_ref = self._plugin()
+        self.assertEqual(token, plugin.get_token(self.session))
+        self.assertFalse(get_auth_ref.called)
+
+    def test_token_not_shared_between_users(self):
+        plugin, get_auth_ref = self._plugin()
+        plugin.get_token(self.session)
+
+        plugin, get_auth_ref = self._plugin(username='other')
+        plugin.get_token(self.session)
+        self.assertEqual(1, get_auth_ref.call_count)
+
+    def test_cache_id_excludes_password(self):
+        plugin, get_auth_ref = self._plugin()
+        elements = plugin.get_cache_id_elements()
+
+        self.assertEqual('user', elements['username'])
+        self.assertNotIn('password', elements)
+        self.assertEqual(elements,
+                         self._plugin(password='other')[0]
+                         .get_cache_id_elements())
+
+    def test_v3_cache_id_includes_method(self):
+        plugin = v3.Password(self.AUTH_URL, username='user', password='pass',
+                             project_id='project')
+        elements = plugin.get_cache_id_elements()
+
+        self.assertEqual('user', elements['PasswordMethod.username'])
+        self.assertEqual('project', elements['project_id'])
+        self.assertNotIn('PasswordMethod.password', elements)
+
+    def test_cache_key_stable(self):
+        plugin, get_auth_ref = self._plugin()
+        keys = set()
+
+        def make_key(**kwargs):
+            keys.add(token_cache.FileTokenCache.make_key(**kwargs))
+            return token_cache.FileTokenCache.make_key(**kwargs)
+
+        with mock.patch.object(self.cache, 'make_key', make_key):
+            plugin.get_token(self.session)
+
+            # renew the token early.
+            plugin.refresh_lead_time = 2 * 24 * 3600
+            plugin.get_token(self.session)
+            self.assertEqual(2, get_auth_ref.call_count)
+
+            plugin.invalidate()
+
+        self.assertEqual(1, len(keys))
+        self.assertIsNone(self.cache.get(keys.pop()))
+
+    def test_invalidate_removes_cached_token(self):
+        plugin, get_auth_ref = self._plugin()
+        plugin.get_token(self.session)
+        plugin.invalidate()
+
+        plugin, get_auth_ref = self._plugin()
+        plugin.get_token(self.session)
+        self.assertEqual(1, get_auth_ref.call_count)
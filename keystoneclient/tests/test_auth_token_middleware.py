@@ -19,6 +19,7 @@ import os
 import shutil
 import stat
 import tempfile
+import threading
 import time
 import uuid
 
@@ -26,6 +27,7 @@ import fixtures
 import httpretty
 import iso8601
 import mock
+import requests
 import testresources
 import testtools
 from testtools import matchers
@@ -36,6 +38,9 @@ from keystoneclient.common import cms
 from keystoneclient import exceptions
 from keystoneclient import fixture
 from keystoneclient.middleware import auth_token
+from keystoneclient.middleware import circuit_breaker
+from keystoneclient.middleware import endpoints
+from keystoneclient.middleware import validation_daemon
 from keystoneclient.openstack.common import jsonutils
 from keystoneclient.openstack.common import memorycache
 from keystoneclient.openstack.common import timeutils
@@ -229,6 +234,8 @@ class BaseAuthTokenMiddlewareTest(testtools.TestCase):
 
         self.addCleanup(cleanup_revoked_file,
                         self.middleware.revoked_file_name)
+        self.addCleanup(cleanup_revoked_file,
+                        self.middleware.revoked_index_file_name)
 
         self.middleware.token_revocation_list = jsonutils.dumps(
             {"revoked": [], "extra": "success"})
@@ -245,6 +252,27 @@ class BaseAuthTokenMiddlewareTest(testtools.TestCase):
                                   httpretty.core.HTTPrettyRequestEmpty)
 
 
+class AdminTokenResponseMixin(object):
+    """Configure an admin user and answer its requests for a token.
+
+    Register _admin_token_response as the body of the token requests. Each
+    request is answered with a new v2 token, whose id is appended to
+    admin_token_ids.
+    """
+
+    def setUp(self):
+        super(AdminTokenResponseMixin, self).setUp()
+        self.conf['admin_user'] = 'admin'
+        self.conf['admin_password'] = 'password'
+        self.admin_token_ids = []
+
+    def _admin_token_response(self, method, uri, headers):
+        token = fixture.V2Token(expires=timeutils.utcnow() +
+                                datetime.timedelta(hours=1))
+        self.admin_token_ids.append(token.token_id)
+        return 200, headers, jsonutils.dumps(token)
+
+
 class MultiStepAuthTokenMiddlewareTest(BaseAuthTokenMiddlewareTest,
                                        testresources.ResourcedTestCase):
 
@@ -341,6 +369,225 @@ class NoMemcacheAuthToken(BaseAuthTokenMiddlewareTest):
         auth_token.AuthProtocol(FakeApp(), conf)
 
 
+class AdminTokenRefreshTest(AdminTokenResponseMixin,
+                            BaseAuthTokenMiddlewareTest):
+
+    def setUp(self):
+        super(AdminTokenRefreshTest, self).setUp()
+
+        httpretty.reset()
+        httpretty.enable()
+        self.addCleanup(httpretty.disable)
+
+        httpretty.register_uri(httpretty.POST, "%s/v2.0/tokens" % BASE_URI,
+                               body=self._admin_token_response)
+
+    def _enter_refresh_period(self, middleware=None):
+        middleware = middleware or self.middleware
+        middleware._admin_token_refresh_at = (timeutils.utcnow() -
+                                              datetime.timedelta(seconds=1))
+
+    def test_admin_token_reused(self):
+        self.set_middleware()
+        token = self.middleware.get_admin_token()
+        self.assertEqual(token, self.middleware.get_admin_token())
+        self.assertEqual([token], self.admin_token_ids)
+
+    def test_refresh_time_is_jittered(self):
+        self.set_middleware(conf={'admin_token_refresh_time': 300})
+        self.middleware.get_admin_token()
+        refresh = (self.middleware.admin_token_expiry -
+                   self.middleware._admin_token_refresh_at)
+        self.assertTrue(datetime.timedelta(seconds=150) <= refresh <=
+                        datetime.timedelta(seconds=300))
+
+    def test_refresh_disabled(self):
+        self.set_middleware(conf={'admin_token_refresh_time': 0})
+        self.middleware.get_admin_token()
+        self.assertIsNone(self.middleware._admin_token_refresh_at)
+
+    def test_renewed_in_refresh_period(self):
+        self.set_middleware()
+        old_token = self.middleware.get_admin_token()
+        self._enter_refresh_period()
+
+        new_token = self.middleware.get_admin_token()
+
+        self.assertNotEqual(old_token, new_token)
+        self.assertEqual([old_token, new_token], self.admin_token_ids)
+
+    def test_renewal_in_progress_uses_current_token(self):
+        self.set_middleware()
+        token = self.middleware.get_admin_token()
+        self._enter_refresh_period()
+
+        with self.middleware._admin_token_lock:
+            self.assertEqual(token, self.middleware.get_admin_token())
+
+        self.assertEqual([token], self.admin_token_ids)
+
+    def test_failed_renewal_uses_current_token(self):
+        self.set_middleware()
+        token = self.middleware.get_admin_token()
+        self._enter_refresh_period()
+
+        httpretty.register_uri(httpretty.POST, "%s/v2.0/tokens" % BASE_URI,
+                               body='', status=500)
+
+        self.assertEqual(token, self.middleware.get_admin_token())
+        self.assertFalse(self.middleware._admin_token_needs_refresh())
+
+    def test_background_refresh(self):
+        self.set_middleware(conf={'admin_token_background_refresh': True})
+        token = self.middleware.get_admin_token()
+        self._enter_refresh_period()
+
+        with mock.patch('threading.Thread') as thread:
+            self.assertEqual(token, self.middleware.get_admin_token())
+
+        self.assertTrue(thread.return_value.start.called)
+
+    def _shared_middlewares(self, **kwargs):
+        cache = memorycache.Client()
+        conf = {'share_admin_token': True,
+                'cache': 'swift.cache',
+                'memcache_security_strategy': 'ENCRYPT',
+                'memcache_secret_key': 'secret'}
+        conf.update(kwargs)
+
+        middlewares = []
+        for _ in range(2):
+            self.set_middleware(conf=conf)
+            self.middleware._token_cache.initialize({'swift.cache': cache})
+            middlewares.append(self.middleware)
+
+        return middlewares
+
+    def test_shared_admin_token(self):
+        first, second = self._shared_middlewares()
+
+        token = first.get_admin_token()
+
+        self.assertEqual(token, second.get_admin_token())
+        self.assertEqual([token], self.admin_token_ids)
+
+    def test_shared_admin_token_requires_encryption(self):
+        for strategy in (None, 'MAC'):
+            self.assertRaises(auth_token.ConfigurationError,
+                              self.set_middleware,
+                              conf={'share_admin_token': True,
+                                    'memcache_security_strategy': strategy,
+                                    'memcache_secret_key': 'secret'})
+
+    def test_shared_admin_token_id_excludes_password(self):
+        first, second = self._shared_middlewares()
+        second.admin_password = 'another password'
+        self.assertEqual(first._shared_admin_token_id(),
+                         second._shared_admin_token_id())
+
+    def test_shared_admin_token_not_counted_in_cache_metrics(self):
+        first, second = self._shared_middlewares(metrics_backend='prometheus')
+        first.get_admin_token()
+        second.get_admin_token()
+
+        counters = second._metrics.get_counters()
+        self.assertNotIn('token_cache.hit', counters)
+        self.assertNotIn('token_cache.miss', counters)
+
+    def test_renewed_shared_admin_token(self):
+        first, second = self._shared_middlewares()
+        old_token = first.get_admin_token()
+        second.get_admin_token()
+
+        self._enter_refresh_period(first)
+        new_token = first.get_admin_token()
+
+        # the second worker picks up the renewed token once it reaches its
+        # own refresh period.
+        self._enter_refresh_period(second)
+        self.assertEqual(new_token, second.get_admin_token())
+        self.assertEqual([old_token, new_token], self.admin_token_ids)
+
+    def test_rejected_shared_admin_token_not_reused(self):
+        first, second = self._shared_middlewares()
+        token = first.get_admin_token()
+        self.assertEqual(token, second.get_admin_token())
+
+        second._reject_admin_token(token)
+        new_token = second.get_admin_token()
+
+        self.assertNotEqual(token, new_token)
+        self.assertEqual([token, new_token], self.admin_token_ids)
+
+    def test_rejected_replaced_admin_token_ignored(self):
+        self.set_middleware()
+        plugin = self.middleware._session.auth
+        old_token = plugin.get_token(self.middleware._session)
+        self._enter_refresh_period()
+        new_token = self.middleware.get_admin_token()
+
+        # a request that was sent with the old token is rejected.
+        plugin.invalidate()
+
+        self.assertEqual(new_token, self.middleware.get_admin_token())
+        self.assertEqual([old_token, new_token], self.admin_token_ids)
+
+    def test_rejected_admin_token_invalidated(self):
+        self.set_middleware()
+        plugin = self.middleware._session.auth
+        token = plugin.get_token(self.middleware._session)
+
+        plugin.invalidate()
+
+        self.assertIsNone(self.middleware.admin_token)
+        self.assertNotEqual(token, self.middleware.get_admin_token())
+
+    def test_v3_admin_token(self):
+        token_id = uuid.uuid4().hex
+        token = fixture.V3Token(expires=timeutils.utcnow() +
+                                datetime.timedelta(hours=1))
+        httpretty.register_uri(httpretty.POST, "%s/v3/auth/tokens" % BASE_URI,
+                               body=jsonutils.dumps(token),
+                               adding_headers={'X-Subject-Token': token_id},
+                               status=201)
+
+        self.set_middleware(conf={'admin_user_domain_name': 'Default',
+                                  'admin_project_domain_name': 'Default'})
+
+        self.assertEqual(token_id, self.middleware.get_admin_token())
+        self.assertEqual(token.expires.replace(tzinfo=None),
+                         self.middleware.admin_token_expiry)
+
+        body = jsonutils.loads(httpretty.last_request().body)
+        user = body['auth']['identity']['password']['user']
+        self.assertEqual('admin', user['name'])
+        self.assertEqual('Default', user['domain']['name'])
+        self.assertEqual('Default',
+                         body['auth']['scope']['project']['domain']['name'])
+
+    def test_rejected_admin_token_renewed_by_session(self):
+        user_token = uuid.uuid4().hex
+        token = fixture.V2Token(token_id=user_token)
+        responses = [httpretty.Response(body='', status=401),
+                     httpretty.Response(body=jsonutils.dumps(token),
+                                        status=200)]
+        httpretty.register_uri(httpretty.GET,
+                               "%s/v2.0/tokens/%s" % (BASE_URI, user_token),
+                               responses=responses)
+
+        self.set_middleware(conf={'auth_version': 'v2.0'})
+        self.middleware.verify_uuid_token(user_token)
+
+        self.assertEqual(2, len(self.admin_token_ids))
+        self.assertEqual(self.admin_token_ids[1],
+                         httpretty.last_request().headers['X-Auth-Token'])
+
+    def test_connections_are_pooled(self):
+        self.set_middleware()
+        self.assertIsInstance(self.middleware._session.session,
+                              requests.Session)
+
+
 class CachePoolTest(BaseAuthTokenMiddlewareTest):
     def test_use_cache_from_env(self):
         """If `swift.cache` is set in the environment and `cache` is set in the
@@ -396,6 +643,576 @@ class CachePoolTest(BaseAuthTokenMiddlewareTest):
             set([inner_cache, outer_cache]),
             set(token_cache._cache_pool))
 
+    def test_size_gauge(self):
+        self.set_middleware(conf={'metrics_backend': 'prometheus'})
+        token_cache = self.middleware._token_cache
+        token_cache.initialize({})
+
+        for _ in range(2):
+            with token_cache._cache_pool.reserve():
+                with token_cache._cache_pool.reserve():
+                    pass
+
+        self.assertEqual(2, self.middleware._metrics.get_gauges()[
+            'cache_pool.size'])
+
+
+class MultipleEndpointsTest(AdminTokenResponseMixin,
+                            BaseAuthTokenMiddlewareTest):
+
+    FIRST_URI = 'https://keystone1.example.com:1234'
+    SECOND_URI = 'https://keystone2.example.com:1234'
+
+    def setUp(self):
+        super(MultipleEndpointsTest, self).setUp()
+        self.conf['identity_uri'] = '%s, %s/' % (self.FIRST_URI,
+                                                 self.SECOND_URI)
+        self.conf['identity_uri_picker'] = 'ewma'
+        self.conf['http_request_max_retries'] = 0
+
+        httpretty.reset()
+        httpretty.enable()
+        self.addCleanup(httpretty.disable)
+
+        for uri in (self.FIRST_URI, self.SECOND_URI):
+            httpretty.register_uri(httpretty.GET, '%s/' % uri,
+                                   body=VERSION_LIST_v2, status=300)
+            httpretty.register_uri(httpretty.POST, '%s/v2.0/tokens' % uri,
+                                   body=self._admin_token_response)
+
+        self.set_middleware()
+        self.first, self.second = self.middleware._endpoints.endpoints
+        # ensure the first endpoint is tried first.
+        self.second.ewma = 1.0
+
+    def test_identity_uris(self):
+        self.assertEqual([self.FIRST_URI, self.SECOND_URI],
+                         self.middleware.identity_uris)
+        self.assertEqual(self.FIRST_URI, self.middleware.identity_uri)
+
+    def test_assert_valid_picker_config(self):
+        self.assertRaises(auth_token.ConfigurationError, self.set_middleware,
+                          conf={'identity_uri_picker': 'whatever'})
+
+    def test_fails_over_unreachable_endpoint(self):
+        httpretty.register_uri(httpretty.GET, '%s/' % self.FIRST_URI,
+                               body=network_error_response)
+
+        response, data = self.middleware._json_request('GET', '/')
+
+        self.assertEqual(300, response.status_code)
+        self.assertEqual('keystone2.example.com:1234',
+                         httpretty.last_request().headers['Host'])
+        self.assertIsNone(self.first.ewma)
+        self.assertIsNotNone(self.second.ewma)
+
+    def test_fails_over_server_error(self):
+        httpretty.register_uri(httpretty.GET, '%s/' % self.FIRST_URI,
+                               body='', status=503)
+
+        response, data = self.middleware._json_request('GET', '/')
+        self.assertEqual(300, response.status_code)
+
+    def test_last_server_error_returned(self):
+        for uri in (self.FIRST_URI, self.SECOND_URI):
+            httpretty.register_uri(httpretty.GET, '%s/' % uri,
+                                   body='', status=503)
+
+        response, data = self.middleware._json_request('GET', '/')
+        self.assertEqual(503, response.status_code)
+
+    def test_all_endpoints_unreachable(self):
+        for uri in (self.FIRST_URI, self.SECOND_URI):
+            httpretty.register_uri(httpretty.GET, '%s/' % uri,
+                                   body=network_error_response)
+
+        self.assertRaises(auth_token.NetworkError,
+                          self.middleware._json_request, 'GET', '/')
+
+    def test_ejected_endpoint_skipped(self):
+        with mock.patch.object(self.first, 'allow_request',
+                               return_value=False):
+            self.middleware._json_request('GET', '/')
+
+        self.assertEqual('keystone2.example.com:1234',
+                         httpretty.last_request().headers['Host'])
+
+    def test_circuit_open_on_every_endpoint(self):
+        for endpoint in (self.first, self.second):
+            patcher = mock.patch.object(endpoint, 'allow_request',
+                                        return_value=False)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.assertRaises(auth_token.CircuitOpenError,
+                          self.middleware._json_request, 'GET', '/')
+
+    def test_admin_token_fails_over(self):
+        httpretty.register_uri(httpretty.POST,
+                               '%s/v2.0/tokens' % self.FIRST_URI,
+                               body=network_error_response)
+
+        self.assertTrue(self.middleware.get_admin_token())
+        self.assertEqual('keystone2.example.com:1234',
+                         httpretty.last_request().headers['Host'])
+
+    def test_service_error_not_retried(self):
+        self.set_middleware(conf={'http_request_max_retries': 3})
+        self.first, self.second = self.middleware._endpoints.endpoints
+
+        for endpoint in (self.first, self.second):
+            patcher = mock.patch.object(endpoint, 'record')
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        with mock.patch.object(self.middleware, 'get_admin_token',
+                               side_effect=auth_token.ServiceError()) as get:
+            with mock.patch('time.sleep') as sleep:
+                self.assertRaises(auth_token.ServiceError,
+                                  self.middleware._json_request, 'GET', '/',
+                                  authenticated=True)
+
+        self.assertEqual(1, get.call_count)
+        self.assertFalse(sleep.called)
+        self.assertFalse(self.first.record.called)
+        self.assertFalse(self.second.record.called)
+
+    def test_half_open_trial_released_on_other_error(self):
+        breaker = self.first.breaker
+        breaker.state = circuit_breaker.OPEN
+        breaker._opened_at = 0
+        func = mock.Mock(side_effect=auth_token.NetworkError())
+
+        self.assertRaises(auth_token.NetworkError,
+                          self.middleware._retry_request, func)
+        self.assertEqual(circuit_breaker.HALF_OPEN, breaker.state)
+        self.assertFalse(breaker._trial_in_progress)
+
+        func = mock.Mock(return_value='response')
+        self.assertEqual('response', self.middleware._retry_request(func))
+        self.assertEqual(circuit_breaker.CLOSED, breaker.state)
+
+    def test_programming_error_not_retried(self):
+        func = mock.Mock(side_effect=TypeError())
+
+        self.assertRaises(TypeError, self.middleware._retry_request, func)
+        self.assertEqual(1, func.call_count)
+
+    def test_slow_request_hedged(self):
+        self.set_middleware(conf={'hedge_requests': True})
+        self.first, self.second = self.middleware._endpoints.endpoints
+        self.second.ewma = 1.0
+
+        def slow_response(method, uri, headers):
+            time.sleep(0.5)
+            return 300, headers, VERSION_LIST_v2
+
+        httpretty.register_uri(httpretty.GET, '%s/' % self.FIRST_URI,
+                               body=slow_response)
+
+        with mock.patch.object(self.first, 'p99', return_value=0.01):
+            response, data = self.middleware._json_request('GET', '/')
+
+        self.assertEqual(300, response.status_code)
+        self.assertEqual('keystone2.example.com:1234',
+                         httpretty.last_request().headers['Host'])
+
+    def test_fast_request_not_hedged(self):
+        self.set_middleware(conf={'hedge_requests': True,
+                                  'metrics_backend': 'prometheus'})
+        self.first, self.second = self.middleware._endpoints.endpoints
+        self.second.ewma = 1.0
+
+        with mock.patch.object(self.first, 'p99', return_value=5.0):
+            for _ in range(2):
+                self.middleware._json_request('GET', '/')
+
+        self.assertEqual('keystone1.example.com:1234',
+                         httpretty.last_request().headers['Host'])
+        self.assertNotIn('hedged_requests',
+                         self.middleware._metrics.get_counters())
+
+    def test_not_hedged_without_another_endpoint(self):
+        self.set_middleware(conf={'hedge_requests': True})
+        self.first, self.second = self.middleware._endpoints.endpoints
+        self.second.ewma = 1.0
+
+        with mock.patch.object(self.first, 'p99', return_value=0.01):
+            with mock.patch.object(self.second, 'allow_request',
+                                   return_value=False):
+                response, data = self.middleware._json_request('GET', '/')
+
+        self.assertEqual(300, response.status_code)
+        self.assertEqual(0, self.middleware._hedge_threads._threads)
+
+    def test_not_hedged_while_threads_busy(self):
+        self.set_middleware(conf={'hedge_requests': True})
+        self.first, self.second = self.middleware._endpoints.endpoints
+        self.second.ewma = 1.0
+        self.middleware._hedge_threads.size = 0
+
+        with mock.patch.object(self.first, 'p99', return_value=0.01):
+            response, data = self.middleware._json_request('GET', '/')
+
+        self.assertEqual(300, response.status_code)
+        self.assertEqual('keystone1.example.com:1234',
+                         httpretty.last_request().headers['Host'])
+
+    def test_attempt_timed_with_monotonic_clock(self):
+        response = mock.Mock(status_code=200)
+        with mock.patch.object(endpoints, '_monotonic',
+                               side_effect=[10.0, 10.5]):
+            self.middleware._attempt(self.first, lambda url: response, False)
+
+        self.assertEqual(0.5, self.first.ewma)
+
+
+class HedgeThreadsTest(testtools.TestCase):
+
+    def setUp(self):
+        super(HedgeThreadsTest, self).setUp()
+        self.threads = auth_token._HedgeThreads(mock.Mock(), 1)
+
+    def _wait_idle(self):
+        for _ in range(100):
+            if self.threads._idle:
+                return
+            time.sleep(0.01)
+        self.fail('thread not idle')
+
+    def test_threads_reused(self):
+        calls = []
+        for i in range(2):
+            self.assertTrue(self.threads.spawn(calls.append, i))
+            self._wait_idle()
+
+        self.assertEqual([0, 1], calls)
+        self.assertEqual(1, self.threads._threads)
+
+    def test_busy_threads_refuse_work(self):
+        done = threading.Event()
+        self.addCleanup(done.set)
+        self.assertTrue(self.threads.spawn(done.wait))
+        self.assertFalse(self.threads.spawn(done.wait))
+
+
+class RevocationEventsTest(AdminTokenResponseMixin,
+                           BaseAuthTokenMiddlewareTest):
+
+    def setUp(self):
+        super(RevocationEventsTest, self).setUp()
+        self.conf['revocation_events'] = True
+
+        httpretty.reset()
+        httpretty.enable()
+        self.addCleanup(httpretty.disable)
+
+        httpretty.register_uri(httpretty.POST, "%s/v2.0/tokens" % BASE_URI,
+                               body=self._admin_token_response)
+        httpretty.register_uri(httpretty.GET,
+                               "%s/v3/OS-REVOKE/events" % BASE_URI,
+                               body=self._events_response)
+
+        self.events = []
+        self.queries = []
+        self.token = fixture.V2Token(user_id='user_id1')
+
+        self.set_middleware()
+
+    def _events_response(self, request, uri, headers):
+        self.queries.append(request.querystring)
+        return 200, headers, jsonutils.dumps({'events': self.events})
+
+    def _revoke(self, **kwargs):
+        now = timeutils.utcnow()
+        kwargs['issued_before'] = timeutils.isotime(now)
+        kwargs['revoked_at'] = timeutils.isotime(now)
+        self.events.append(kwargs)
+
+    def _expire_fetch(self):
+        self.middleware._revocation_events_fetched_time -= (
+            self.middleware.token_revocation_list_cache_timeout)
+
+    def test_not_revoked(self):
+        self._revoke(user_id='other')
+        self.middleware._check_revocation_events(self.token)
+        self.assertEqual([{}], self.queries)
+
+    def test_revoked(self):
+        self._revoke(user_id='user_id1')
+        self.assertRaises(auth_token.InvalidUserToken,
+                          self.middleware._check_revocation_events,
+                          self.token)
+
+    def test_events_reused_within_cache_time(self):
+        self.middleware._check_revocation_events(self.token)
+        self.middleware._check_revocation_events(self.token)
+        self.assertEqual(1, len(self.queries))
+
+    def test_new_events_fetched_since_last(self):
+        self._revoke(user_id='other')
+        self.middleware._check_revocation_events(self.token)
+
+        self.events = [{'user_id': 'user_id1',
+                        'issued_before': timeutils.isotime(),
+                        'revoked_at': timeutils.isotime()}]
+        self._expire_fetch()
+        self.assertRaises(auth_token.InvalidUserToken,
+                          self.middleware._check_revocation_events,
+                          self.token)
+
+        self.assertEqual(2, len(self.middleware._revocation_events))
+        self.assertIn('since', self.queries[1])
+
+    def test_reconciled_with_every_event(self):
+        self._revoke(user_id='user_id1')
+        self.assertRaises(auth_token.InvalidUserToken,
+                          self.middleware._check_revocation_events,
+                          self.token)
+
+        self.events = []
+        self._expire_fetch()
+        self.middleware._revocation_events_reconciled_time -= (
+            self.middleware.revocation_reconcile_timeout)
+        self.middleware._check_revocation_events(self.token)
+
+        self.assertEqual({}, self.queries[1])
+        self.assertEqual(0, len(self.middleware._revocation_events))
+
+    def test_cached_token_checked(self):
+        self.set_middleware(conf={'check_revocations_for_cached': True})
+        self.middleware._token_cache.initialize({})
+        self._revoke(user_id='user_id1')
+
+        with mock.patch.object(self.middleware._token_cache, 'get',
+                               return_value=(['token'], self.token)):
+            self.assertRaises(auth_token.InvalidUserToken,
+                              self.middleware._validate_user_token,
+                              'token', {})
+
+    def test_revocation_list_not_fetched(self):
+        self.assertFalse(self.middleware.is_signed_token_revoked(['token']))
+        self.assertEqual([], self.queries)
+
+
+class ValidationDaemonTest(BaseAuthTokenMiddlewareTest):
+
+    def setUp(self):
+        super(ValidationDaemonTest, self).setUp()
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'validator.sock')
+
+        self.requests = []
+        self.response = (validation_daemon.VALID, self._token())
+
+        server = validation_daemon.ValidationServer(path, self._validate)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        self.set_middleware(conf={'validation_daemon_socket': path})
+
+    def _token(self):
+        token = fixture.V2Token(tenant_id='tenant_id1',
+                                tenant_name='tenant_name1',
+                                user_id='user_id1',
+                                user_name='user_name1')
+        token.add_role(name='role1')
+        token.add_role(name='role2')
+        return token
+
+    def _validate(self, token, env):
+        self.requests.append((token, env))
+        return self.response
+
+    def _call(self, token='token'):
+        req = webob.Request.blank('/')
+        req.headers['X-Auth-Token'] = token
+        req.environ['REMOTE_USER'] = 'user'
+        self.middleware(req.environ, self.start_fake_response)
+        return self.response_status
+
+    def test_token_validated_by_daemon(self):
+        self.assertEqual(200, self._call())
+        self.assertEqual([('token', {'REMOTE_USER': 'user'})], self.requests)
+
+    def test_invalid_token_rejected(self):
+        self.response = (validation_daemon.INVALID, None)
+        self.assertEqual(401, self._call())
+
+    def test_daemon_service_error(self):
+        self.response = (validation_daemon.SERVICE_ERROR, None)
+        self.assertEqual(503, self._call())
+
+    def test_daemon_circuit_open(self):
+        self.response = (validation_daemon.CIRCUIT_OPEN, None)
+        self.assertEqual(503, self._call())
+
+    def test_validated_in_process_without_daemon(self):
+        self.set_middleware(conf={'validation_daemon_socket': '/nonexistent'})
+
+        with mock.patch.object(self.middleware, '_validate_user_token',
+                               return_value=self._token()) as validate:
+            self.assertEqual(200, self._call())
+            self.assertEqual(200, self._call())
+
+        self.assertEqual(2, validate.call_count)
+        self.assertFalse(self.middleware._validation_daemon.available())
+
+    def test_validate_for_daemon(self):
+        token = self._token()
+        with mock.patch.object(self.middleware, '_validate_user_token',
+                               return_value=token):
+            self.assertEqual((validation_daemon.VALID, token),
+                             self.middleware.validate_for_daemon('token', {}))
+
+        for error, status in [
+                (auth_token.InvalidUserToken, validation_daemon.INVALID),
+                (auth_token.CircuitOpenError, validation_daemon.CIRCUIT_OPEN),
+                (auth_token.ServiceError, validation_daemon.SERVICE_ERROR)]:
+            with mock.patch.object(self.middleware, '_validate_user_token',
+                                   side_effect=error()):
+                self.assertEqual(
+                    (status, None),
+                    self.middleware.validate_for_daemon('token', {}))
+
+
+class WarmUpTest(AdminTokenResponseMixin, BaseAuthTokenMiddlewareTest):
+
+    def setUp(self):
+        super(WarmUpTest, self).setUp()
+        self.conf['signing_dir'] = self.useFixture(fixtures.TempDir()).path
+        self.set_middleware()
+        # nothing has fetched the revocation list yet.
+        self.middleware.token_revocation_list_fetched_time = (
+            datetime.datetime.min)
+        os.remove(self.middleware.revoked_index_file_name)
+
+        httpretty.reset()
+        httpretty.enable()
+        self.addCleanup(httpretty.disable)
+
+    def _register_identity_server(self):
+        httpretty.register_uri(httpretty.GET, "%s/" % BASE_URI,
+                               body=VERSION_LIST_v2, status=300)
+        httpretty.register_uri(httpretty.POST, "%s/v2.0/tokens" % BASE_URI,
+                               body=self._admin_token_response)
+        for cert_type in ('signing', 'ca'):
+            httpretty.register_uri(
+                httpretty.GET,
+                "%s/v2.0/certificates/%s" % (BASE_URI, cert_type),
+                body='FAKE %s' % cert_type)
+
+    def test_warm_up(self):
+        self._register_identity_server()
+        revocation_list = jsonutils.dumps(
+            {'revoked': [{'id': 'revoked', 'expires': timeutils.utcnow()}]})
+
+        with mock.patch.object(self.middleware, 'fetch_revocation_list',
+                               return_value=revocation_list):
+            self.middleware.warm_up()
+
+        self.assertEqual('v2.0', self.middleware.auth_version)
+        self.assertIsNotNone(self.middleware.admin_token)
+        with open(self.middleware.signing_cert_file_name) as f:
+            self.assertEqual('FAKE signing', f.read())
+        with open(self.middleware.signing_ca_file_name) as f:
+            self.assertEqual('FAKE ca', f.read())
+        self.assertTrue(self.middleware.is_signed_token_revoked(['revoked']))
+
+    def test_warm_up_without_identity_server(self):
+        httpretty.register_uri(httpretty.GET, "%s/" % BASE_URI, status=500)
+        httpretty.register_uri(httpretty.POST, "%s/v2.0/tokens" % BASE_URI,
+                               status=500)
+        self.middleware.http_request_max_retries = 0
+
+        self.middleware.warm_up()
+
+        self.assertIsNone(self.middleware.auth_version)
+        self.assertIsNone(self.middleware.admin_token)
+
+    def test_warm_up_option(self):
+        with mock.patch.object(auth_token.AuthProtocol, 'warm_up') as warm_up:
+            self.set_middleware(conf={'warm_up': True})
+        warm_up.assert_called_once_with()
+
+    def test_reset_after_fork(self):
+        self._register_identity_server()
+        self.middleware.get_admin_token()
+        self.middleware._token_cache.initialize({})
+        lock = self.middleware._admin_token_lock
+        cache_pool = self.middleware._token_cache._cache_pool
+
+        # the middleware was created by another process.
+        self.middleware._pid = -1
+        req = webob.Request.blank('/')
+        self.middleware(req.environ, self.start_fake_response)
+
+        self.assertEqual(os.getpid(), self.middleware._pid)
+        self.assertIsNot(lock, self.middleware._admin_token_lock)
+        self.assertIsNot(cache_pool,
+                         self.middleware._token_cache._cache_pool)
+        # the inherited admin token is still used.
+        self.assertEqual(1, len(self.admin_token_ids))
+
+
+class OffloadTest(BaseAuthTokenMiddlewareTest,
+                  testresources.ResourcedTestCase):
+
+    resources = [('examples', client_fixtures.EXAMPLES_RESOURCE)]
+
+    def setUp(self):
+        super(OffloadTest, self).setUp()
+        self.set_middleware(conf={'offload_workers': 1,
+                                  'offload_threshold': 0})
+        self.addCleanup(self.middleware._offload.close)
+        self.apply = mock.patch.object(
+            self.middleware._offload, 'apply',
+            wraps=self.middleware._offload.apply).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_signed_token_decoded_in_pool(self):
+        for token, token_hash in [
+                (self.examples.SIGNED_TOKEN_SCOPED,
+                 self.examples.SIGNED_TOKEN_SCOPED_HASH),
+                (self.examples.SIGNED_TOKEN_SCOPED_PKIZ,
+                 self.examples.SIGNED_TOKEN_SCOPED_PKIZ_KEY)]:
+            data = self.middleware._decode_signed_token(token, [token_hash])
+            self.assertEqual('user_id1', data['access']['user']['id'])
+
+        self.assertEqual(2, self.apply.call_count)
+
+    def test_revoked_token_rejected(self):
+        self.middleware.token_revocation_list = (
+            self.examples.REVOKED_TOKEN_LIST_JSON)
+        self.assertRaises(auth_token.InvalidUserToken,
+                          self.middleware._decode_signed_token,
+                          self.examples.REVOKED_TOKEN,
+                          [self.examples.REVOKED_TOKEN_HASH])
+        self.assertFalse(self.apply.called)
+
+    def test_small_token_decoded_inline(self):
+        self.middleware._offload.threshold = len(
+            self.examples.SIGNED_TOKEN_SCOPED) + 1
+        data = self.middleware._decode_signed_token(
+            self.examples.SIGNED_TOKEN_SCOPED,
+            [self.examples.SIGNED_TOKEN_SCOPED_HASH])
+        self.assertEqual('user_id1', data['access']['user']['id'])
+        self.assertFalse(self.apply.called)
+
+    def test_cache_entry_decoded_in_pool(self):
+        token_cache = self.middleware._token_cache
+        token_cache.initialize({})
+        expires = timeutils.isotime(timeutils.utcnow() +
+                                    datetime.timedelta(hours=1))
+        token_cache.store('token_id', {'data': 'value'}, expires)
+
+        self.assertEqual({'data': 'value'},
+                         token_cache._cache_get('token_id'))
+        self.assertTrue(self.apply.called)
+
 
 class GeneralAuthTokenMiddlewareTest(BaseAuthTokenMiddlewareTest,
                                      testresources.ResourcedTestCase):
@@ -523,6 +1340,99 @@ class GeneralAuthTokenMiddlewareTest(BaseAuthTokenMiddlewareTest,
         self.assertRaises(auth_token.ConfigurationError, self.set_middleware,
                           conf=conf)
 
+    def test_aead_cache_data(self):
+        conf = {
+            'memcache_security_strategy': 'aead',
+            'memcache_secret_key': 'mysecret'
+        }
+        self.set_middleware(conf=conf)
+        token = b'my_token'
+        some_time_later = timeutils.utcnow() + datetime.timedelta(hours=4)
+        expires = timeutils.strtime(some_time_later)
+        data = ('this_data', expires)
+        token_cache = self.middleware._token_cache
+        token_cache.initialize({})
+        token_cache._cache_store(token, data)
+        self.assertEqual(token_cache._cache_get(token), data[0])
+
+    def test_shared_cache_backend_encrypted(self):
+        cache_dir = self.useFixture(fixtures.TempDir()).path
+        conf = {
+            'cache_backend': 'shared',
+            'shared_cache_dir': cache_dir,
+            'memcache_security_strategy': 'encrypt',
+            'memcache_secret_key': 'mysecret'
+        }
+        self.set_middleware(conf=conf)
+        token = b'my_token'
+        some_time_later = timeutils.utcnow() + datetime.timedelta(hours=4)
+        expires = timeutils.strtime(some_time_later)
+        data = ('this_data', expires)
+        token_cache = self.middleware._token_cache
+        token_cache.initialize({})
+        token_cache._cache_store(token, data)
+        self.assertEqual(token_cache._cache_get(token), data[0])
+
+        # the entry can be read by any other process on the host but it is
+        # still protected.
+        names = os.listdir(cache_dir)
+        self.assertEqual(1, len(names))
+        with open(os.path.join(cache_dir, names[0]), 'rb') as f:
+            self.assertNotIn(b'this_data', f.read())
+
+    def test_assert_valid_cache_backend_config(self):
+        conf = {
+            'cache_backend': 'whatever'
+        }
+        self.assertRaises(auth_token.ConfigurationError, self.set_middleware,
+                          conf=conf)
+        conf = {
+            'cache_backend': 'redis'
+        }
+        self.assertRaises(auth_token.ConfigurationError, self.set_middleware,
+                          conf=conf)
+
+    def test_assert_valid_metrics_backend_config(self):
+        self.assertRaises(auth_token.ConfigurationError, self.set_middleware,
+                          conf={'metrics_backend': 'whatever'})
+
+    def test_metrics_in_environ(self):
+        self.set_middleware(conf={'metrics_backend': 'prometheus',
+                                  'delay_auth_decision': True})
+        self.middleware.app = mock.Mock(return_value=[])
+        req = webob.Request.blank('/')
+        self.middleware(req.environ, self.start_fake_response)
+        self.assertIs(self.middleware._metrics,
+                      req.environ['keystone.token_metrics'])
+
+    def test_assert_valid_circuit_breaker_config(self):
+        for conf in ({'circuit_breaker_error_rate': 0},
+                     {'circuit_breaker_error_rate': 1.5},
+                     {'circuit_breaker_min_requests': 0},
+                     {'circuit_breaker_window': 0}):
+            self.assertRaises(auth_token.ConfigurationError,
+                              self.set_middleware, conf=conf)
+
+    def test_circuit_breaker_disabled(self):
+        self.set_middleware(conf={'circuit_breaker_enabled': False})
+        self.assertIsNone(self.middleware._endpoints.endpoints[0].breaker)
+
+    def test_stale_revocation_list_used_when_circuit_open(self):
+        self.set_middleware()
+        revocation_list = self.middleware.token_revocation_list
+        self.middleware.token_revocation_list_fetched_time = (
+            datetime.datetime.min)
+
+        endpoint = self.middleware._endpoints.endpoints[0]
+        with mock.patch.object(endpoint, 'allow_request', return_value=False):
+            self.assertEqual(revocation_list,
+                             self.middleware.token_revocation_list)
+
+            self.middleware._token_revocation_list = None
+            self.assertRaises(auth_token.CircuitOpenError,
+                              getattr, self.middleware,
+                              'token_revocation_list')
+
     def test_config_revocation_cache_timeout(self):
         conf = {
             'revocation_cache_time': 24,
@@ -832,6 +1742,31 @@ class CommonAuthTokenMiddlewareTest(object):
         self.middleware._token_revocation_list = None
         self.assertEqual(self.middleware.token_revocation_list, in_memory_list)
 
+    def test_revocation_index_written_by_another_process(self):
+        self.middleware.token_revocation_list = self.get_revocation_list_json()
+        # a stale list, with a current index written by another process.
+        self.middleware.token_revocation_list_fetched_time = (
+            datetime.datetime.min)
+        self.middleware._revocation_index = None
+        httpretty.register_uri(httpretty.GET,
+                               "%s/v2.0/tokens/revoked" % BASE_URI,
+                               body="{}", status=500)
+
+        self.assertTrue(self.middleware.is_signed_token_revoked(
+            [self.token_dict['revoked_token_hash']]))
+        self.assertTrue(timeutils.is_soon(
+            self.middleware.token_revocation_list_fetched_time, 5))
+
+    def test_revocation_index_rebuilt_from_list(self):
+        self.middleware.token_revocation_list = self.get_revocation_list_json()
+        os.remove(self.middleware.revoked_index_file_name)
+        self.middleware._revocation_index = None
+
+        self.assertTrue(self.middleware.is_signed_token_revoked(
+            [self.token_dict['revoked_token_hash']]))
+        self.assertTrue(os.path.exists(
+            self.middleware.revoked_index_file_name))
+
     def test_invalid_revocation_list_raises_service_error(self):
         httpretty.register_uri(httpretty.GET,
                                "%s/v2.0/tokens/revoked" % BASE_URI,
@@ -977,6 +1912,66 @@ class CommonAuthTokenMiddlewareTest(object):
         self._test_memcache_set_invalid_signed(hash_algorithms=hash_algorithms,
                                                exp_mode='sha256')
 
+    def test_cache_get_multi_single_request(self):
+        self.conf['hash_algorithms'] = ['sha256', 'md5']
+        self.set_middleware()
+
+        cache = memorycache.Client()
+        cache.get_multi = mock.Mock(return_value={})
+        token = self.token_dict['signed_token_scoped']
+        token_cache = self.middleware._token_cache
+        token_cache.initialize({})
+
+        with mock.patch.object(memorycache, 'get_client', return_value=cache):
+            token_ids, cached = token_cache.get(token)
+
+        self.assertIsNone(cached)
+        self.assertEqual([cms.cms_hash_token(token, mode='sha256'),
+                          cms.cms_hash_token(token, mode='md5')], token_ids)
+        self.assertEqual(1, cache.get_multi.call_count)
+        self.assertEqual(2, len(cache.get_multi.call_args[0][0]))
+
+    def test_cache_write_back_preferred_hash(self):
+        self.conf['hash_algorithms'] = ['sha256', 'md5']
+        self.set_middleware()
+        token = self.token_dict['signed_token_scoped']
+        token_cache = self.middleware._token_cache
+        token_cache.initialize({})
+
+        data = 'this_data'
+        expires = timeutils.strtime(timeutils.utcnow() +
+                                    datetime.timedelta(hours=1))
+        token_cache.store(cms.cms_hash_token(token, mode='md5'), data, expires)
+        self.assertIsNone(self._get_cached_token(token, mode='sha256'))
+
+        token_ids, cached = token_cache.get(token)
+
+        self.assertEqual(data, cached)
+        self.assertEqual(data, self._get_cached_token(token, mode='sha256'))
+
+    def test_cache_metrics(self):
+        self.conf['metrics_backend'] = 'prometheus'
+        self.set_middleware()
+        token_cache = self.middleware._token_cache
+        token_cache.initialize({})
+
+        expires = timeutils.strtime(timeutils.utcnow() +
+                                    datetime.timedelta(hours=1))
+        token_cache.store('valid', 'this_data', expires)
+        token_cache.store_invalid('invalid')
+
+        token_cache.get('valid')
+        token_cache.get('missing')
+        self.assertRaises(auth_token.InvalidUserToken,
+                          token_cache.get, 'invalid')
+
+        self.assertEqual({'token_cache.hit': 1,
+                          'token_cache.miss': 1,
+                          'token_cache.invalid': 1},
+                         self.middleware._metrics.get_counters())
+        histograms = self.middleware._metrics.get_histograms()
+        self.assertEqual(3, histograms['token_cache.get']['count'])
+
     def test_memcache_set_expired(self, extra_conf={}, extra_environ={}):
         httpretty.disable()
         token_cache_time = 10
@@ -1033,6 +2028,28 @@ class CommonAuthTokenMiddlewareTest(object):
 
         self.assertEqual(mock_obj.call_count, times_retry)
 
+    def test_circuit_breaker_fails_fast(self):
+        conf = {'http_request_max_retries': 0,
+                'circuit_breaker_error_rate': 0.25,
+                'circuit_breaker_min_requests': 1}
+        self.set_middleware(conf=conf)
+
+        req = webob.Request.blank('/')
+        req.headers['X-Auth-Token'] = ERROR_TOKEN
+        self.middleware(req.environ, self.start_fake_response)
+        self.assertEqual(401, self.response_status)
+
+        token = self.token_dict['uuid_token_unscoped']
+        req = webob.Request.blank('/')
+        req.headers['X-Auth-Token'] = token
+        with mock.patch('time.sleep') as mock_sleep:
+            self.middleware(req.environ, self.start_fake_response)
+
+        self.assertEqual(503, self.response_status)
+        self.assertFalse(mock_sleep.called)
+        self.assert_valid_last_url(ERROR_TOKEN)
+        self.assertIsNone(self._get_cached_token(token))
+
     def test_nocatalog(self):
         conf = {
             'include_service_catalog': False
@@ -0,0 +1,190 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import sys
+
+import fixtures
+import mock
+import testtools
+
+from keystoneclient.middleware import cache_backends
+from keystoneclient.openstack.common import memorycache
+
+
+class SharedFileCacheTests(testtools.TestCase):
+
+    def setUp(self):
+        super(SharedFileCacheTests, self).setUp()
+        self.cache_dir = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                      'cache')
+        self.cache = cache_backends.SharedFileCache(self.cache_dir)
+
+        self.now = 1000
+        patcher = mock.patch('keystoneclient.openstack.common.timeutils.'
+                             'utcnow_ts', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_creates_directory(self):
+        self.assertTrue(os.path.isdir(self.cache_dir))
+
+    def test_set_get(self):
+        self.cache.set('key', b'value')
+        self.assertEqual(b'value', self.cache.get('key'))
+        self.assertIsNone(self.cache.get('other'))
+
+    def test_shared_between_clients(self):
+        other = cache_backends.SharedFileCache(self.cache_dir)
+        self.cache.set('key', b'value')
+        self.assertEqual(b'value', other.get('key'))
+
+        other.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_get_multi(self):
+        self.cache.set('a', b'1')
+        self.cache.set('b', b'2')
+        self.assertEqual({'a': b'1', 'b': b'2'},
+                         self.cache.get_multi(['a', 'b', 'c']))
+
+    def test_expiry(self):
+        self.cache.set('key', b'value', time=10)
+        self.now += 9
+        self.assertEqual(b'value', self.cache.get('key'))
+        self.now += 1
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_negative_time_not_stored(self):
+        # token_cache_time=-1 disables caching.
+        self.cache.set('key', b'value')
+        self.cache.set('key', b'other', time=-1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_sweep(self):
+        self.cache.set('short', b'value', time=10)
+        self.cache.set('long', b'value', time=100)
+        self.now += 50
+        self.cache.sweep()
+        self.assertEqual(1, len(os.listdir(self.cache_dir)))
+        self.assertEqual(b'value', self.cache.get('long'))
+
+    def test_sweep_is_bounded(self):
+        for i in range(5):
+            self.cache.set('key%d' % i, b'value', time=10)
+        self.now += 10
+
+        self.cache.sweep(limit=2)
+        self.assertEqual(3, len(os.listdir(self.cache_dir)))
+        self.cache.sweep(limit=2)
+        self.cache.sweep(limit=2)
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_sweep_removes_stale_temp_files(self):
+        stale = os.path.join(self.cache_dir, '.tmpstale')
+        fresh = os.path.join(self.cache_dir, '.tmpfresh')
+        for path in (stale, fresh):
+            open(path, 'w').close()
+        os.utime(stale, (0, 0))
+        os.utime(fresh, (self.now, self.now))
+
+        self.cache.sweep()
+        self.assertEqual(['.tmpfresh'], os.listdir(self.cache_dir))
+
+    def test_directory_of_another_mode(self):
+        os.chmod(self.cache_dir, 0o755)
+        self.assertRaises(cache_backends.InsecureCacheDirError,
+                          cache_backends.SharedFileCache, self.cache_dir)
+
+    def test_existing_directory_is_checked(self):
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'other')
+        os.mkdir(path, 0o777)
+        os.chmod(path, 0o777)
+        self.assertRaises(cache_backends.InsecureCacheDirError,
+                          cache_backends.SharedFileCache, path)
+
+    def test_symlink(self):
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'link')
+        os.symlink(self.cache_dir, path)
+        self.assertRaises(cache_backends.InsecureCacheDirError,
+                          cache_backends.SharedFileCache, path)
+
+    def test_directory_of_another_user(self):
+        with mock.patch('os.getuid', return_value=os.getuid() + 1):
+            self.assertRaises(cache_backends.InsecureCacheDirError,
+                              cache_backends.SharedFileCache, self.cache_dir)
+
+
+class RedisCacheTests(testtools.TestCase):
+
+    def setUp(self):
+        super(RedisCacheTests, self).setUp()
+        self.redis = mock.Mock()
+        self.useFixture(fixtures.MonkeyPatch('sys.modules',
+                                             dict(sys.modules,
+                                                  redis=self.redis)))
+        self.client = self.redis.StrictRedis.from_url.return_value
+        self.cache = cache_backends.get_client(
+            cache_backends.REDIS, redis_url='redis://localhost:6379/0')
+
+    def test_from_url(self):
+        self.redis.StrictRedis.from_url.assert_called_once_with(
+            'redis://localhost:6379/0')
+
+    def test_get_multi_is_pipelined(self):
+        pipe = self.client.pipeline.return_value
+        pipe.execute.return_value = [b'1', None]
+
+        self.assertEqual({'a': b'1'}, self.cache.get_multi(['a', 'b']))
+        self.client.pipeline.assert_called_once_with(transaction=False)
+        self.assertEqual(2, pipe.get.call_count)
+        self.assertFalse(self.client.get.called)
+
+    def test_set_with_expiry(self):
+        self.cache.set('key', b'value', time=10)
+        self.client.setex.assert_called_once_with('key', 10, b'value')
+
+        self.cache.set('key', b'value')
+        self.client.set.assert_called_once_with('key', b'value')
+
+    def test_negative_time_not_stored(self):
+        self.cache.set('key', b'value', time=-1)
+        self.client.delete.assert_called_once_with('key')
+        self.assertFalse(self.client.set.called)
+        self.assertFalse(self.client.setex.called)
+
+
+class GetClientTests(testtools.TestCase):
+
+    def test_memcache(self):
+        self.assertIsInstance(cache_backends.get_client(), memorycache.Client)
+
+    def test_shared(self):
+        path = self.useFixture(fixtures.TempDir()).path
+        cache = cache_backends.get_client(cache_backends.SHARED,
+                                          shared_cache_dir=path)
+        self.assertIsInstance(cache, cache_backends.SharedFileCache)
+        self.assertEqual(path, cache.cache_dir)
+
+    def test_shared_insecure_falls_back(self):
+        path = self.useFixture(fixtures.TempDir()).path
+        os.chmod(path, 0o777)
+        cache = cache_backends.get_client(cache_backends.SHARED,
+                                          shared_cache_dir=path)
+        self.assertIsInstance(cache, memorycache.Client)
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, cache_backends.get_client, 'unknown')
@@ -0,0 +1,118 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+
+import mock
+import testtools
+
+from keystoneclient.middleware import circuit_breaker
+from keystoneclient.middleware import metrics
+
+
+class CircuitBreakerTests(testtools.TestCase):
+
+    def setUp(self):
+        super(CircuitBreakerTests, self).setUp()
+        patcher = mock.patch('keystoneclient.openstack.common.timeutils.'
+                             'utcnow_ts')
+        self.utcnow_ts = patcher.start()
+        self.utcnow_ts.return_value = 1000
+        self.addCleanup(patcher.stop)
+
+        self.metrics = metrics.RegistryMetrics()
+        self.breaker = circuit_breaker.CircuitBreaker(
+            logging.getLogger(__name__), 'https://keystone', error_rate=0.5,
+            min_requests=4, window=30, reset_timeout=10,
+            metrics=self.metrics)
+
+    def _open(self):
+        for _ in range(4):
+            self.assertTrue(self.breaker.allow_request())
+            self.breaker.record_failure()
+        self.assertEqual(circuit_breaker.OPEN, self.breaker.state)
+
+    def test_stays_closed_below_min_requests(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.assertEqual(circuit_breaker.CLOSED, self.breaker.state)
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_stays_closed_below_error_rate(self):
+        for _ in range(3):
+            self.breaker.record_success()
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertEqual(circuit_breaker.CLOSED, self.breaker.state)
+
+    def test_opens_at_error_rate(self):
+        self._open()
+        self.assertFalse(self.breaker.allow_request())
+        self.assertEqual({'circuit_breaker.open': 1},
+                         self.metrics.get_counters())
+        self.assertEqual({'circuit_breaker.state': 2},
+                         self.metrics.get_gauges())
+
+    def test_old_outcomes_leave_window(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.utcnow_ts.return_value += 30
+        for _ in range(3):
+            self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(circuit_breaker.CLOSED, self.breaker.state)
+
+    def test_empty_window(self):
+        breaker = circuit_breaker.CircuitBreaker(
+            logging.getLogger(__name__), 'https://keystone', window=0)
+        breaker.record_failure()
+        breaker.record_success()
+        self.assertEqual(circuit_breaker.CLOSED, breaker.state)
+
+    def test_single_trial_when_half_open(self):
+        self._open()
+        self.utcnow_ts.return_value += 10
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(circuit_breaker.HALF_OPEN, self.breaker.state)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_closes_after_successful_trial(self):
+        self._open()
+        self.utcnow_ts.return_value += 10
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_success()
+        self.assertEqual(circuit_breaker.CLOSED, self.breaker.state)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(0, self.metrics.get_gauges()['circuit_breaker.state'])
+
+    def test_reopens_after_failed_trial(self):
+        self._open()
+        self.utcnow_ts.return_value += 10
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_failure()
+        self.assertEqual(circuit_breaker.OPEN, self.breaker.state)
+        self.assertFalse(self.breaker.allow_request())
+        self.assertEqual(2,
+                         self.metrics.get_counters()['circuit_breaker.open'])
+
+    def test_released_trial(self):
+        self._open()
+        self.utcnow_ts.return_value += 10
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.release()
+        self.assertEqual(circuit_breaker.HALF_OPEN, self.breaker.state)
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_outcomes_ignored_while_open(self):
+        self._open()
+        self.breaker.record_success()
+        self.assertEqual(circuit_breaker.OPEN, self.breaker.state)
@@ -10,12 +10,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import base64
 import errno
 import os
 import subprocess
+import zlib
 
 import mock
 import testresources
+import testtools
 from testtools import matchers
 
 from keystoneclient.common import cms
@@ -49,6 +52,36 @@ class CMSTest(utils.TestCase, testresources.ResourcedTestCase):
             self.examples.SIGNED_TOKEN_SCOPED))
         self.assertEqual(tok, self.examples.SIGNED_TOKEN_SCOPED)
 
+    def test_token_to_pem(self):
+        token = self.examples.SIGNED_TOKEN_SCOPED
+        pem = cms.token_to_pem(token)
+
+        self.assertEqual(cms.token_to_cms(token).encode('utf-8'), pem)
+        self.assertEqual(pem, cms.token_to_pem(token.encode('utf-8')))
+        self.assertEqual(token, cms.cms_to_token(pem.decode('utf-8')))
+
+    def test_token_to_cms_line_lengths(self):
+        for length in (0, 1, 63, 64, 65, 128):
+            token = 'M-' * length
+            formatted = cms.token_to_cms(token)
+            lines = formatted.splitlines()
+
+            self.assertEqual('-----BEGIN CMS-----', lines[0])
+            self.assertEqual('-----END CMS-----', lines[-1])
+            self.assertTrue(all(len(line) <= 64 for line in lines[1:-1]))
+            self.assertEqual(formatted.encode('utf-8'),
+                             cms.token_to_pem(token))
+            self.assertEqual(token, cms.cms_to_token(formatted))
+
+    def test_pkiz_uncompress(self):
+        token = self.examples.SIGNED_TOKEN_SCOPED_PKIZ
+        expected = zlib.decompress(
+            base64.urlsafe_b64decode(token[len(cms.PKIZ_PREFIX):]))
+
+        self.assertEqual(expected, cms.pkiz_uncompress(token))
+        self.assertEqual(expected,
+                         cms.pkiz_uncompress(token.encode('utf-8')))
+
     def test_asn1_token(self):
         self.assertTrue(cms.is_asn1_token(self.examples.SIGNED_TOKEN_SCOPED))
         self.assertFalse(cms.is_asn1_token('FOOBAR'))
@@ -143,6 +176,92 @@ class CMSTest(utils.TestCase, testresources.ResourcedTestCase):
         # sha256 hash is 64 chars.
         self.assertThat(token_id, matchers.HasLength(64))
 
+    def test_cms_hash_token_modes(self):
+        modes = ['sha256', 'md5']
+        for token in (self.examples.SIGNED_TOKEN_SCOPED,
+                      self.examples.SIGNED_TOKEN_SCOPED_PKIZ):
+            expected = [cms.cms_hash_token(token, mode=mode)
+                        for mode in modes]
+            self.assertEqual(expected, cms.cms_hash_token_modes(token, modes))
+
+    def test_cms_hash_token_modes_not_pki(self):
+        self.assertEqual(['something', 'something'],
+                         cms.cms_hash_token_modes('something',
+                                                  ['md5', 'sha256']))
+
+
+@testtools.skipIf(cms.pkcs7 is None, 'cryptography is not available')
+class SignerTest(utils.TestCase, testresources.ResourcedTestCase):
+
+    resources = [('examples', client_fixtures.EXAMPLES_RESOURCE)]
+
+    def setUp(self):
+        super(SignerTest, self).setUp()
+        self.signer = cms.Signer(self.examples.SIGNING_CERT_FILE,
+                                 self.examples.SIGNING_KEY_FILE)
+        self.addCleanup(self.signer.close)
+
+    def _verify_token(self, token):
+        return cms.verify_token(token, self.examples.SIGNING_CERT_FILE,
+                                self.examples.SIGNING_CA_FILE)
+
+    def _verify_pkiz(self, token):
+        return cms.pkiz_verify(token, self.examples.SIGNING_CERT_FILE,
+                               self.examples.SIGNING_CA_FILE)
+
+    def test_no_files(self):
+        self.assertRaises(exceptions.CertificateConfigError,
+                          cms.Signer, '/no/such/file', '/no/such/key')
+
+    def test_sign_data_as_openssl(self):
+        text = self.examples.TOKEN_SCOPED_DATA + '\n'
+        expected = cms.cms_verify(
+            cms.cms_sign_data(text, self.examples.SIGNING_CERT_FILE,
+                              self.examples.SIGNING_KEY_FILE),
+            self.examples.SIGNING_CERT_FILE, self.examples.SIGNING_CA_FILE)
+
+        signed = self.signer.sign_data(text)
+        self.assertThat(signed, matchers.StartsWith('-----BEGIN CMS-----\n'))
+        self.assertEqual(expected,
+                         cms.cms_verify(signed,
+                                        self.examples.SIGNING_CERT_FILE,
+                                        self.examples.SIGNING_CA_FILE))
+
+    def test_sign_token(self):
+        text = self.examples.TOKEN_SCOPED_DATA
+        token = self.signer.sign_token(text)
+
+        self.assertTrue(cms.is_asn1_token(token))
+        self.assertEqual(text.encode('utf-8'), self._verify_token(token))
+
+    def test_pkiz_sign(self):
+        text = self.examples.TOKEN_SCOPED_DATA
+        token = self.signer.pkiz_sign(text)
+
+        self.assertTrue(cms.is_pkiz(token))
+        self.assertEqual(text.encode('utf-8'), self._verify_pkiz(token))
+
+    def test_sign_many(self):
+        texts = ['{"token": %d}' % i for i in range(3)]
+
+        tokens = self.signer.sign_many(texts)
+        self.assertEqual([t.encode('utf-8') for t in texts],
+                         [self._verify_token(t) for t in tokens])
+
+        tokens = self.signer.sign_many(texts, pkiz=True)
+        self.assertEqual([t.encode('utf-8') for t in texts],
+                         [self._verify_pkiz(t) for t in tokens])
+
+    def test_sign_many_processes(self):
+        signer = cms.Signer(self.examples.SIGNING_CERT_FILE,
+                            self.examples.SIGNING_KEY_FILE, processes=2)
+        self.addCleanup(signer.close)
+        texts = ['{"token": %d}' % i for i in range(10)]
+
+        tokens = signer.sign_many(texts)
+        self.assertEqual([t.encode('utf-8') for t in texts],
+                         [self._verify_token(t) for t in tokens])
+
 
 def load_tests(loader, tests, pattern):
     return testresources.OptimisingTestSuite(tests)
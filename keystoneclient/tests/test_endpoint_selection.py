@@ -0,0 +1,66 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import mock
+
+from keystoneclient import endpoint_selection
+from keystoneclient.tests import utils
+
+
+URLS = ['http://a', 'http://b', 'http://c']
+
+
+class EndpointSelectorTests(utils.TestCase):
+
+    def test_catalog_order(self):
+        selector = endpoint_selection.EndpointSelector()
+        self.assertEqual(URLS, selector.order(URLS))
+        selector.record(URLS[0], 0.1)
+
+
+class LatencySelectorTests(utils.TestCase):
+
+    def setUp(self):
+        super(LatencySelectorTests, self).setUp()
+        patcher = mock.patch('time.time', return_value=1000.0)
+        self.time = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.selector = endpoint_selection.LatencySelector(decay=0.5,
+                                                           cooldown=10)
+
+    def test_unmeasured_endpoints_first(self):
+        self.selector.record('http://a', 0.1)
+        self.selector.record('http://b', 0.2)
+        self.assertEqual(['http://c', 'http://a', 'http://b'],
+                         self.selector.order(URLS))
+
+    def test_moving_average(self):
+        self.selector.record('http://a', 0.1)
+        self.selector.record('http://a', 0.3)
+        self.assertAlmostEqual(0.2,
+                               self.selector.get_stats()['http://a']['ewma'])
+
+    def test_failed_endpoint_last_until_cooldown(self):
+        for url in URLS:
+            self.selector.record(url, 0.1)
+        self.selector.record('http://a', failed=True)
+
+        self.assertEqual('http://a', self.selector.order(URLS)[-1])
+        self.assertFalse(self.selector.get_stats()['http://a']['healthy'])
+
+        self.time.return_value += 10
+        self.assertTrue(self.selector.get_stats()['http://a']['healthy'])
+
+    def test_success_restores_health(self):
+        self.selector.record('http://a', 0.1, failed=True)
+        self.selector.record('http://a', 0.1)
+        self.assertTrue(self.selector.get_stats()['http://a']['healthy'])
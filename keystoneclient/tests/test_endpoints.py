@@ -0,0 +1,152 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import testtools
+
+from keystoneclient.middleware import endpoints
+
+
+class EndpointTests(testtools.TestCase):
+
+    def test_moving_average(self):
+        endpoint = endpoints.Endpoint('https://keystone')
+        self.assertEqual(0.0, endpoint.cost())
+
+        endpoint.start()
+        endpoint.finish(1.0)
+        self.assertEqual(1.0, endpoint.ewma)
+
+        endpoint.start()
+        endpoint.finish(2.0)
+        self.assertAlmostEqual(1.0 + endpoints.DECAY, endpoint.ewma)
+
+    def test_unanswered_request_not_averaged(self):
+        endpoint = endpoints.Endpoint('https://keystone')
+        endpoint.start()
+        endpoint.finish()
+        self.assertIsNone(endpoint.ewma)
+        self.assertEqual(0, endpoint.in_flight)
+
+    @mock.patch.object(endpoints, '_monotonic')
+    def test_failure_is_unhealthy_for_cooldown(self, monotonic):
+        monotonic.return_value = 100.0
+        endpoint = endpoints.Endpoint('https://keystone')
+        endpoint.start()
+        endpoint.finish(failed=True)
+        self.assertFalse(endpoint.healthy())
+
+        monotonic.return_value += endpoints.COOLDOWN
+        self.assertTrue(endpoint.healthy())
+
+    def test_response_makes_healthy(self):
+        endpoint = endpoints.Endpoint('https://keystone')
+        endpoint.start()
+        endpoint.finish(failed=True)
+        endpoint.start()
+        endpoint.finish(0.1)
+        self.assertTrue(endpoint.healthy())
+
+    def test_cost_includes_requests_in_flight(self):
+        endpoint = endpoints.Endpoint('https://keystone')
+        endpoint.ewma = 0.5
+        endpoint.start()
+        endpoint.start()
+        self.assertEqual(1.5, endpoint.cost())
+
+    def test_p99(self):
+        endpoint = endpoints.Endpoint('https://keystone')
+        for i in range(endpoints.MIN_SAMPLES - 1):
+            endpoint.start()
+            endpoint.finish(0.01)
+        self.assertIsNone(endpoint.p99())
+
+        endpoint.start()
+        endpoint.finish(1.0)
+        self.assertEqual(1.0, endpoint.p99())
+
+    def test_breaker(self):
+        breaker = mock.Mock()
+        endpoint = endpoints.Endpoint('https://keystone', breaker=breaker)
+
+        self.assertIs(breaker.allow_request.return_value,
+                      endpoint.allow_request())
+        endpoint.record(True)
+        breaker.record_failure.assert_called_once_with()
+        endpoint.record(False)
+        breaker.record_success.assert_called_once_with()
+
+    def test_no_breaker(self):
+        endpoint = endpoints.Endpoint('https://keystone')
+        self.assertTrue(endpoint.allow_request())
+        endpoint.record(True)
+
+
+class EndpointPoolTests(testtools.TestCase):
+
+    def setUp(self):
+        super(EndpointPoolTests, self).setUp()
+        self.endpoints = [endpoints.Endpoint('https://keystone%d' % i)
+                          for i in range(4)]
+        for i, endpoint in enumerate(self.endpoints):
+            endpoint.ewma = float(i)
+
+    def test_unknown_picker(self):
+        self.assertRaises(ValueError, endpoints.EndpointPool, self.endpoints,
+                          picker='whatever')
+
+    def test_ewma(self):
+        pool = endpoints.EndpointPool(self.endpoints, picker=endpoints.EWMA)
+        self.assertEqual(self.endpoints, pool.ordered())
+
+    def test_p2c(self):
+        pool = endpoints.EndpointPool(self.endpoints, picker=endpoints.P2C)
+        firsts = set()
+
+        for _ in range(50):
+            ordered = pool.ordered()
+            self.assertEqual(sorted(self.endpoints, key=id),
+                             sorted(ordered, key=id))
+            # the rest are failed over to from the cheapest.
+            rest = ordered[1:]
+            self.assertEqual(sorted(rest, key=lambda e: e.ewma), rest)
+            firsts.add(ordered[0])
+
+        self.assertIn(self.endpoints[0], firsts)
+
+    def test_p2c_cheaper_of_two(self):
+        pool = endpoints.EndpointPool(self.endpoints, picker=endpoints.P2C)
+        cheap, expensive = self.endpoints[1], self.endpoints[3]
+
+        with mock.patch('random.choice', side_effect=[expensive, cheap]):
+            self.assertIs(cheap, pool.ordered()[0])
+        # the same endpoint can be picked twice.
+        with mock.patch('random.choice', side_effect=[expensive, expensive]):
+            self.assertIs(expensive, pool.ordered()[0])
+
+    def test_p2c_two_endpoints(self):
+        pool = endpoints.EndpointPool(self.endpoints[:2],
+                                      picker=endpoints.P2C)
+        firsts = [pool.ordered()[0] for _ in range(200)]
+
+        # unlike ewma the more expensive endpoint is sometimes first.
+        self.assertIn(self.endpoints[1], firsts)
+        self.assertGreater(firsts.count(self.endpoints[0]),
+                           firsts.count(self.endpoints[1]))
+
+    def test_failed_endpoint_last(self):
+        pool = endpoints.EndpointPool(self.endpoints, picker=endpoints.EWMA)
+        failed = self.endpoints[0]
+        failed.start()
+        failed.finish(failed=True)
+
+        self.assertEqual(self.endpoints[1:] + [failed], pool.ordered())
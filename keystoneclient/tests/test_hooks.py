@@ -0,0 +1,108 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import httpretty
+import mock
+
+from keystoneclient import exceptions
+from keystoneclient import hooks
+from keystoneclient import session as client_session
+from keystoneclient.tests import utils
+
+
+class HookTestCase(utils.TestCase):
+
+    TEST_URL = 'http://127.0.0.1:5000/v2.0/tenants'
+
+    def response(self, method='GET', url=TEST_URL, start=10.0, elapsed=0.5,
+                 status_code=200):
+        return {'method': method, 'url': url, 'start': start,
+                'elapsed': elapsed,
+                'response': mock.Mock(status_code=status_code)}
+
+
+class TimingLogTests(HookTestCase):
+
+    def test_timings(self):
+        log = hooks.TimingLog()
+        log(client_session.PRE_REQUEST, {})
+        log(client_session.POST_RESPONSE, self.response())
+
+        self.assertEqual([('GET %s' % self.TEST_URL, 10.0, 10.5)],
+                         log.get_timings())
+
+        log.reset_timings()
+        self.assertEqual([], log.get_timings())
+
+    @httpretty.activate
+    def test_session(self):
+        log = hooks.TimingLog()
+        sess = client_session.Session(hooks=[log])
+        self.stub_url(httpretty.GET, body='response')
+
+        sess.get(self.TEST_URL)
+
+        self.assertEqual(1, len(log.get_timings()))
+        name, start, end = log.get_timings()[0]
+        self.assertEqual('GET %s' % self.TEST_URL, name)
+        self.assertTrue(start <= end)
+
+
+class LatencyHistogramTests(HookTestCase):
+
+    def test_aggregated_by_endpoint(self):
+        histogram = hooks.LatencyHistogram(buckets=(0.1, 1.0))
+        histogram(client_session.POST_RESPONSE,
+                  self.response(elapsed=0.05))
+        histogram(client_session.POST_RESPONSE,
+                  self.response(url='http://127.0.0.1:5000/v2.0/users',
+                                elapsed=2))
+        histogram(client_session.POST_RESPONSE,
+                  self.response(method='POST', elapsed=0.5))
+        histogram(client_session.ERROR,
+                  {'method': 'GET', 'url': self.TEST_URL,
+                   'exception': exceptions.ConnectionRefused()})
+
+        stats = histogram.get_stats()
+        get = stats[('GET', 'http://127.0.0.1:5000')]
+        self.assertEqual(2, get['count'])
+        self.assertEqual(1, get['errors'])
+        self.assertEqual(0.05, get['min'])
+        self.assertEqual(2, get['max'])
+        self.assertEqual([(0.1, 1), (1.0, 0), (float('inf'), 1)],
+                         get['buckets'])
+        self.assertEqual(1, stats[('POST', 'http://127.0.0.1:5000')]['count'])
+
+        histogram.reset()
+        self.assertEqual({}, histogram.get_stats())
+
+
+class OSProfilerHookTests(HookTestCase):
+
+    def test_trace_points(self):
+        hook = hooks.OSProfilerHook()
+
+        with mock.patch.object(hooks, 'profiler') as profiler:
+            hook(client_session.PRE_REQUEST, self.response())
+            hook(client_session.POST_RESPONSE, self.response())
+
+        profiler.start.assert_called_once_with(
+            'keystoneclient.http',
+            {'request': {'method': 'GET', 'url': self.TEST_URL}})
+        profiler.stop.assert_called_once_with(
+            {'response': {'status_code': 200}})
+
+    def test_no_osprofiler(self):
+        hook = hooks.OSProfilerHook()
+
+        with mock.patch.object(hooks, 'profiler', None):
+            hook(client_session.PRE_REQUEST, self.response())
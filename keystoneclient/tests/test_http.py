@@ -114,7 +114,7 @@ class ClientTest(utils.TestCase):
         cl.post("/hi", body=[1, 2, 3])
 
         self.assertEqual(httpretty.last_request().method, 'POST')
-        self.assertEqual(httpretty.last_request().body, b'[1, 2, 3]')
+        self.assertRequestBodyIs(json=[1, 2, 3])
 
         self.assertRequestHeaderEqual('X-Auth-Token', 'token')
         self.assertRequestHeaderEqual('Content-Type', 'application/json')
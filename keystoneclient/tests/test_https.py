@@ -14,6 +14,7 @@ import mock
 import requests
 
 from keystoneclient import httpclient
+from keystoneclient.openstack.common import jsonutils
 from keystoneclient.tests import utils
 
 
@@ -80,7 +81,7 @@ class ClientTest(utils.TestCase):
 
         self.assertEqual(mock_args[0], 'POST')
         self.assertEqual(mock_args[1], REQUEST_URL)
-        self.assertEqual(mock_kwargs['data'], '[1, 2, 3]')
+        self.assertEqual([1, 2, 3], jsonutils.loads(mock_kwargs['data']))
         self.assertEqual(mock_kwargs['headers']['X-Auth-Token'], 'token')
         self.assertEqual(mock_kwargs['cert'], ('cert.pem', 'key.pem'))
         self.assertEqual(mock_kwargs['verify'], 'ca.pem')
@@ -101,7 +102,7 @@ class ClientTest(utils.TestCase):
 
         self.assertEqual(mock_args[0], 'POST')
         self.assertEqual(mock_args[1], REQUEST_URL)
-        self.assertEqual(mock_kwargs['data'], '[1, 2, 3]')
+        self.assertEqual([1, 2, 3], jsonutils.loads(mock_kwargs['data']))
         self.assertEqual(mock_kwargs['headers']['X-Auth-Token'], 'token')
         self.assertEqual(mock_kwargs['cert'], ('cert.pem', 'key.pem'))
         self.assertEqual(mock_kwargs['verify'], 'ca.pem')
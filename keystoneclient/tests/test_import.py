@@ -0,0 +1,108 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import subprocess
+import sys
+
+from testtools import content
+
+import keystoneclient
+from keystoneclient import session
+from keystoneclient import shell
+from keystoneclient.tests import utils
+from keystoneclient.v3 import client as v3_client
+from keystoneclient.v3 import users
+
+
+# modules that importing keystoneclient must not import.
+SLOW_MODULES = ['keystoneclient.v2_0.client',
+                'keystoneclient.v3.client',
+                'keystoneclient.session',
+                'oslo.config',
+                'pbr.version',
+                'requests']
+
+
+class ImportTests(utils.TestCase):
+
+    def _python(self, code, *options):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        proc = subprocess.Popen([sys.executable] + list(options) +
+                                ['-c', code],
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                env=env)
+        out, err = proc.communicate()
+        self.assertEqual(0, proc.returncode, err)
+        return out.decode('utf-8'), err.decode('utf-8')
+
+    def test_import_is_lazy(self):
+        out, _err = self._python('import sys, keystoneclient; '
+                                 'print("\\n".join(sys.modules))')
+        modules = set(out.split())
+
+        self.assertIn('keystoneclient', modules)
+        for name in SLOW_MODULES:
+            self.assertNotIn(name, modules)
+
+    def test_import_time(self):
+        if sys.version_info < (3, 7):
+            self.skipTest('-X importtime needs python 3.7')
+
+        _out, err = self._python('import keystoneclient', '-X', 'importtime')
+
+        # lines are "import time: self [us] | cumulative | imported package"
+        times = dict((cols[2].strip(), int(cols[1]))
+                     for cols in (line.split('|') for line in err.splitlines())
+                     if len(cols) == 3 and cols[1].strip().isdigit())
+
+        self.addDetail('keystoneclient-import-us',
+                       content.text_content(str(times['keystoneclient'])))
+
+    def test_attributes_imported_on_use(self):
+        self.assertIs(v3_client, keystoneclient.v3.client)
+        self.assertIs(v3_client.Client, keystoneclient.v3.Client)
+        self.assertIn('v2_0', dir(keystoneclient))
+        self.assertTrue(keystoneclient.__version__)
+        self.assertRaises(AttributeError, getattr, keystoneclient, 'missing')
+
+
+class LazyManagerTests(utils.TestCase):
+
+    def test_manager_created_on_use(self):
+        cl = v3_client.Client(session=session.Session())
+        self.assertNotIn('users', vars(cl))
+
+        manager = cl.users
+        self.assertIsInstance(manager, users.UserManager)
+        self.assertIs(cl, manager.client)
+        self.assertIs(manager, cl.users)
+
+
+class ShellSubcommandTests(utils.TestCase):
+
+    def test_only_used_subcommand_built(self):
+        identity_shell = shell.OpenStackIdentityShell()
+        identity_shell.get_subcommand_parser('2.0', command='user-list')
+        self.assertEqual(['user-list'], list(identity_shell.subcommands))
+
+    def test_all_subcommands_built_for_help(self):
+        identity_shell = shell.OpenStackIdentityShell()
+        identity_shell.get_subcommand_parser('2.0', command='help')
+        self.assertIn('user-list', identity_shell.subcommands)
+        self.assertIn('bash-completion', identity_shell.subcommands)
+
+    def test_all_subcommands_built_for_unknown(self):
+        identity_shell = shell.OpenStackIdentityShell()
+        identity_shell.get_subcommand_parser('2.0', command='bogus')
+        self.assertIn('user-list', identity_shell.subcommands)
@@ -0,0 +1,86 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+
+import testtools
+
+from keystoneclient import _json
+from keystoneclient.openstack.common import jsonutils
+
+
+class JsonTests(testtools.TestCase):
+
+    def setUp(self):
+        super(JsonTests, self).setUp()
+        self.addCleanup(_json.use, _json.backend)
+
+        # every test is run with each of the implementations installed.
+        self.backends = []
+        for name, _load in _json.BACKENDS:
+            try:
+                _json.use(name)
+            except ImportError:
+                continue
+            self.backends.append(name)
+
+    def _each_backend(self):
+        for name in self.backends:
+            _json.use(name)
+            yield name
+
+    def test_json_always_available(self):
+        self.assertIn('json', self.backends)
+
+    def test_unknown_backend(self):
+        self.assertRaises(ValueError, _json.use, 'xml')
+
+    def test_loads(self):
+        for name in self._each_backend():
+            expected = {u'name': u'caf\xe9', u'values': [1, 2.5, None, True]}
+            text = u'{"name": "caf\xe9", "values": [1, 2.5, null, true]}'
+
+            self.assertEqual(expected, _json.loads(text), name)
+            self.assertEqual(expected, _json.loads(text.encode('utf-8')),
+                             name)
+
+    def test_loads_invalid(self):
+        for name in self._each_backend():
+            self.assertRaises(ValueError, _json.loads, b'{"a": ')
+
+    def test_loads_large_integer(self):
+        for name in self._each_backend():
+            self.assertEqual([2 ** 80], _json.loads('[%d]' % 2 ** 80), name)
+
+    def test_dumps(self):
+        value = {'id': 'token', 'roles': [{'name': 'admin'}], 'count': 3}
+        for name in self._each_backend():
+            self.assertEqual(value, jsonutils.loads(_json.dumps(value)), name)
+
+    def test_dumps_escapes_non_ascii(self):
+        for name in self._each_backend():
+            data = _json.dumps({'name': u'caf\xe9'})
+            self.assertEqual(u'caf\xe9', jsonutils.loads(data)['name'], name)
+            data.encode('ascii')
+
+    def test_dumps_uses_to_primitive(self):
+        value = {'expires': datetime.datetime(2014, 6, 1, 12, 0, 0),
+                 'ids': set(['a'])}
+        for name in self._each_backend():
+            self.assertEqual(jsonutils.loads(jsonutils.dumps(value)),
+                             jsonutils.loads(_json.dumps(value)), name)
+
+    def test_dumps_options(self):
+        for name in self._each_backend():
+            self.assertEqual('{"a": 1, "b": 2}',
+                             _json.dumps({'b': 2, 'a': 1}, sort_keys=True),
+                             name)
@@ -88,6 +88,59 @@ class MemcacheCryptPositiveTests(testtools.TestCase):
                               keys, protected[:-1])
             self.assertIsNone(memcache_crypt.unprotect_data(keys, None))
 
+    def test_aead_protect_wrappers(self):
+        data = b'My Pretty Little Data'
+        keys = self._setup_keys(b'AEAD')
+        protected = memcache_crypt.protect_data(keys, data)
+        self.assertNotIn(data, protected)
+        self.assertTrue(protected.startswith(memcache_crypt.AEAD_VERSION))
+        # the raw ciphertext is stored without any base64 expansion.
+        self.assertEqual(len(data) + 1 + memcache_crypt.AEAD_NONCE_LENGTH +
+                         memcache_crypt.AEAD_TAG_LENGTH, len(protected))
+        self.assertEqual(data, memcache_crypt.unprotect_data(keys, protected))
+        self.assertRaises(memcache_crypt.InvalidMacError,
+                          memcache_crypt.unprotect_data,
+                          keys, protected[:-1])
+
+    def test_aead_bound_to_cache_key(self):
+        data = b'My Pretty Little Data'
+        keys = self._setup_keys(b'AEAD')
+        protected = memcache_crypt.protect_data(keys, data)
+        other_keys = dict(keys, CACHE_KEY=b'x' * len(keys['CACHE_KEY']))
+        self.assertRaises(memcache_crypt.InvalidMacError,
+                          memcache_crypt.unprotect_data,
+                          other_keys, protected)
+
+    def test_other_strategy_rejected(self):
+        # the keys are derived from the strategy, so data protected before
+        # the strategy changed is found under another cache key and can't be
+        # unprotected.
+        data = b'My Pretty Little Data'
+        aead_keys = self._setup_keys(b'AEAD')
+
+        for strategy in [b'MAC', b'ENCRYPT']:
+            keys = self._setup_keys(strategy)
+            self.assertNotEqual(memcache_crypt.get_cache_key(keys),
+                                memcache_crypt.get_cache_key(aead_keys))
+
+            protected = memcache_crypt.protect_data(keys, data)
+            self.assertRaises(memcache_crypt.InvalidMacError,
+                              memcache_crypt.unprotect_data,
+                              aead_keys, protected)
+
+            protected = memcache_crypt.protect_data(aead_keys, data)
+            self.assertRaises(memcache_crypt.InvalidMacError,
+                              memcache_crypt.unprotect_data,
+                              keys, protected)
+
+    def test_no_aead(self):
+        aead = memcache_crypt.ChaCha20_Poly1305
+        memcache_crypt.ChaCha20_Poly1305 = None
+        self.addCleanup(setattr, memcache_crypt, 'ChaCha20_Poly1305', aead)
+        self.assertRaises(memcache_crypt.CryptoUnavailableError,
+                          memcache_crypt.protect_data,
+                          self._setup_keys(b'AEAD'), b'data')
+
     def test_no_pycrypt(self):
         aes = memcache_crypt.AES
         memcache_crypt.AES = None
@@ -0,0 +1,117 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import testtools
+
+from keystoneclient.middleware import metrics
+
+
+class NoopMetricsTests(testtools.TestCase):
+
+    def test_discards(self):
+        m = metrics.get_metrics()
+        m.increment('a')
+        m.gauge('b', 1)
+        with m.timer('c'):
+            pass
+        self.assertEqual({}, m.get_counters())
+
+
+class StatsdMetricsTests(testtools.TestCase):
+
+    def setUp(self):
+        super(StatsdMetricsTests, self).setUp()
+        patcher = mock.patch('socket.socket')
+        self.socket = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.metrics = metrics.get_metrics(metrics.STATSD, prefix='prefix',
+                                           statsd_host='statsd',
+                                           statsd_port=8125)
+
+    def sent(self):
+        return [c[0][0] for c in self.socket.sendto.call_args_list]
+
+    def test_counter(self):
+        self.metrics.increment('hit')
+        self.metrics.increment('hit', 2)
+        self.assertEqual([b'prefix.hit:1|c', b'prefix.hit:2|c'], self.sent())
+        self.socket.sendto.assert_called_with(mock.ANY, ('statsd', 8125))
+        self.assertEqual({'hit': 3}, self.metrics.get_counters())
+
+    def test_gauge_and_timing(self):
+        self.metrics.gauge('size', 5)
+        self.metrics.observe('verify', 0.25)
+        self.assertEqual([b'prefix.size:5|g', b'prefix.verify:250.000|ms'],
+                         self.sent())
+
+    def test_send_errors_ignored(self):
+        self.socket.sendto.side_effect = metrics.socket.error
+        self.metrics.increment('hit')
+        self.assertEqual({'hit': 1}, self.metrics.get_counters())
+
+
+class RegistryMetricsTests(testtools.TestCase):
+
+    def setUp(self):
+        super(RegistryMetricsTests, self).setUp()
+        self.metrics = metrics.RegistryMetrics(prefix='auth',
+                                               buckets=(0.1, 1.0))
+
+    def test_render(self):
+        self.metrics.increment('token_cache.hit')
+        self.metrics.gauge('cache_pool.size', 2)
+        self.metrics.observe('cms_verify', 0.1)
+        self.metrics.observe('cms_verify', 0.5)
+        self.metrics.observe('cms_verify', 5)
+
+        self.assertEqual(
+            '# TYPE auth_token_cache_hit_total counter\n'
+            'auth_token_cache_hit_total 1\n'
+            '# TYPE auth_cache_pool_size gauge\n'
+            'auth_cache_pool_size 2\n'
+            '# TYPE auth_cms_verify_seconds histogram\n'
+            'auth_cms_verify_seconds_bucket{le="0.1"} 1\n'
+            'auth_cms_verify_seconds_bucket{le="1.0"} 2\n'
+            'auth_cms_verify_seconds_bucket{le="+Inf"} 3\n'
+            'auth_cms_verify_seconds_sum 5.6\n'
+            'auth_cms_verify_seconds_count 3\n',
+            self.metrics.render())
+
+    def test_timed(self):
+        class Timed(object):
+            _metrics = self.metrics
+
+            @metrics.timed('work')
+            def work(self):
+                return 'done'
+
+        self.assertEqual('done', Timed().work())
+        self.assertEqual(1, self.metrics.get_histograms()['work']['count'])
+
+    def test_timer_uses_monotonic_clock(self):
+        with mock.patch.object(metrics, '_monotonic',
+                               side_effect=[10.0, 10.5]):
+            with self.metrics.timer('work'):
+                pass
+
+        self.assertEqual(0.5, self.metrics.get_histograms()['work']['sum'])
+
+
+class GetMetricsTests(testtools.TestCase):
+
+    def test_prometheus(self):
+        self.assertIsInstance(metrics.get_metrics(metrics.PROMETHEUS),
+                              metrics.RegistryMetrics)
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, metrics.get_metrics, 'unknown')
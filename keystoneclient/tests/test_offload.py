@@ -0,0 +1,142 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import multiprocessing
+
+import mock
+import testresources
+import testtools
+
+from keystoneclient.middleware import memcache_crypt
+from keystoneclient.middleware import offload
+from keystoneclient.tests import client_fixtures
+
+
+class _Unpicklable(Exception):
+
+    def __init__(self, first, second):
+        super(_Unpicklable, self).__init__('%s %s' % (first, second))
+
+
+def _raise_unpicklable():
+    raise _Unpicklable('first', 'second')
+
+
+class OffloadFunctionTests(testtools.TestCase,
+                           testresources.ResourcedTestCase):
+
+    resources = [('examples', client_fixtures.EXAMPLES_RESOURCE)]
+
+    def test_verify_signed_token(self):
+        data = offload.verify_signed_token(self.examples.SIGNED_TOKEN_SCOPED,
+                                           self.examples.SIGNING_CERT_FILE,
+                                           self.examples.SIGNING_CA_FILE)
+        self.assertEqual('user_id1', data['access']['user']['id'])
+
+    def test_verify_pkiz_token(self):
+        data = offload.verify_signed_token(
+            self.examples.SIGNED_TOKEN_SCOPED_PKIZ,
+            self.examples.SIGNING_CERT_FILE,
+            self.examples.SIGNING_CA_FILE)
+        self.assertEqual('user_id1', data['access']['user']['id'])
+
+    def test_decode_cache_entry(self):
+        self.assertIsNone(offload.decode_cache_entry(None, None))
+        self.assertEqual(['data', 'expires'],
+                         offload.decode_cache_entry(None,
+                                                    b'["data", "expires"]'))
+
+    def test_decode_protected_cache_entry(self):
+        keys = memcache_crypt.derive_keys(b'token', b'secret', b'ENCRYPT')
+        protected = memcache_crypt.protect_data(keys, b'"invalid"')
+
+        self.assertEqual('invalid', offload.decode_cache_entry(keys,
+                                                               protected))
+        self.assertRaises(offload.ProtectedDataError,
+                          offload.decode_cache_entry, keys, protected[:-1])
+
+
+class ProcessPoolTests(testtools.TestCase):
+
+    def setUp(self):
+        super(ProcessPoolTests, self).setUp()
+        self.metrics = mock.Mock()
+        self.pool = offload.ProcessPool(1, threshold=10, max_pending=1,
+                                        timeout=30, metrics=self.metrics)
+        self.addCleanup(self.pool.close)
+
+    def test_small_work_inline(self):
+        with self.pool.reserve(9) as pool:
+            self.assertIsNone(pool)
+
+    def test_apply(self):
+        with self.pool.reserve(10) as pool:
+            self.assertEqual(1024, pool.apply(pow, 2, 10))
+        self.metrics.increment.assert_called_once_with('offload.calls')
+
+    def test_exception(self):
+        with self.pool.reserve(10) as pool:
+            self.assertRaises(ValueError, pool.apply, int, 'x')
+
+    def test_unpicklable_exception(self):
+        with self.pool.reserve(10) as pool:
+            self.assertRaises(offload.OffloadError, pool.apply,
+                              _raise_unpicklable)
+
+    def test_saturated(self):
+        with self.pool.reserve(10) as pool:
+            self.assertIsNotNone(pool)
+            with self.pool.reserve(10) as saturated:
+                self.assertIsNone(saturated)
+        self.metrics.increment.assert_called_once_with('offload.saturated')
+
+        with self.pool.reserve(10) as pool:
+            self.assertIsNotNone(pool)
+
+    def test_timeout_runs_inline(self):
+        with mock.patch.object(self.pool, '_get_pool') as get_pool:
+            result = get_pool.return_value.apply_async.return_value
+            result.get.side_effect = multiprocessing.TimeoutError()
+
+            with self.pool.reserve(10) as pool:
+                self.assertEqual(8, pool.apply(pow, 2, 3))
+
+        result.get.assert_called_once_with(30)
+        self.metrics.increment.assert_called_once_with('offload.timeout')
+
+        # the pool is still doing the work, so no more is sent to it.
+        with self.pool.reserve(10) as pool:
+            self.assertIsNone(pool)
+
+        finished = get_pool.return_value.apply_async.call_args[1]['callback']
+        finished((8, None))
+        with self.pool.reserve(10) as pool:
+            self.assertIsNotNone(pool)
+
+    def test_disabled_with_green_threads(self):
+        with mock.patch.object(offload, '_green_threads', return_value=True):
+            with self.pool.reserve(10) as pool:
+                self.assertIsNone(pool)
+
+        self.assertIsNone(self.pool._pool)
+
+    def test_reset(self):
+        with self.pool.reserve(10) as pool:
+            pool.apply(pow, 2, 3)
+        inherited = self.pool._pool
+        self.addCleanup(inherited.terminate)
+
+        self.pool.reset()
+
+        with self.pool.reserve(10) as pool:
+            self.assertEqual(8, pool.apply(pow, 2, 3))
+        self.assertIsNot(inherited, self.pool._pool)
@@ -0,0 +1,83 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import email.utils
+import time
+
+import mock
+import testtools
+
+from keystoneclient import exceptions
+from keystoneclient import retry
+
+
+class RetryPolicyTests(testtools.TestCase):
+
+    def setUp(self):
+        super(RetryPolicyTests, self).setUp()
+        self.policy = retry.RetryPolicy(retries=3, backoff=1, max_backoff=5)
+
+    def response(self, status_code, retry_after=None):
+        headers = {}
+        if retry_after is not None:
+            headers['Retry-After'] = retry_after
+        return mock.Mock(status_code=status_code, headers=headers)
+
+    def test_full_jitter_backoff(self):
+        with mock.patch('random.uniform', return_value=0.25) as uniform:
+            self.assertEqual(0.25, self.policy.get_backoff(2))
+        uniform.assert_called_once_with(0, 4)
+
+        with mock.patch('random.uniform') as uniform:
+            self.policy.get_backoff(10)
+        uniform.assert_called_once_with(0, 5)
+
+    def test_retry_after_seconds(self):
+        self.assertEqual(2.0, self.policy.get_retry_after(
+            self.response(503, '2')))
+        self.assertEqual(5, self.policy.get_retry_after(
+            self.response(503, '100')))
+        self.assertIsNone(self.policy.get_retry_after(self.response(503)))
+
+    def test_retry_after_date(self):
+        date = email.utils.formatdate(time.time() + 60, usegmt=True)
+        policy = retry.RetryPolicy(max_backoff=120)
+        delay = policy.get_retry_after(self.response(503, date))
+        self.assertTrue(55 <= delay <= 60)
+
+    def test_retry_response(self):
+        self.assertEqual(2.0, self.policy.retry_response(
+            'POST', self.response(429, '2'), 0, 0))
+        self.assertIsNone(self.policy.retry_response(
+            'GET', self.response(500), 0, 0))
+        self.assertIsNone(self.policy.retry_response(
+            'GET', self.response(503, '2'), 3, 0))
+
+    def test_retry_error(self):
+        connect = exceptions.ConnectFailure()
+        refused = exceptions.ConnectionRefused()
+        timeout = exceptions.RequestTimeout()
+
+        self.assertIsNotNone(self.policy.retry_error('POST', connect, 0, 0))
+        self.assertIsNotNone(self.policy.retry_error('GET', refused, 0, 0))
+        self.assertIsNone(self.policy.retry_error('POST', refused, 0, 0))
+        self.assertIsNotNone(self.policy.retry_error('GET', timeout, 0, 0))
+        self.assertIsNone(self.policy.retry_error('POST', timeout, 0, 0))
+        self.assertIsNone(self.policy.retry_error(
+            'GET', exceptions.SSLError(), 0, 0))
+
+    def test_deadline(self):
+        policy = retry.RetryPolicy(retries=3, deadline=10)
+        self.assertEqual(2.0, policy.retry_response(
+            'GET', self.response(503, '2'), 0, 7))
+        self.assertIsNone(policy.retry_response(
+            'GET', self.response(503, '2'), 0, 9))
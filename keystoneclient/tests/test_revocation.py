@@ -0,0 +1,169 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+import os
+
+import fixtures
+import testtools
+
+from keystoneclient import fixture
+from keystoneclient.middleware import revocation
+from keystoneclient.openstack.common import timeutils
+
+
+ISSUED = datetime.datetime(2014, 6, 1, 12, 0, 0)
+EXPIRES = ISSUED + datetime.timedelta(hours=1)
+
+
+def _event(issued_before=ISSUED, revoked_at=ISSUED, **kwargs):
+    kwargs['issued_before'] = timeutils.isotime(issued_before)
+    kwargs['revoked_at'] = timeutils.isotime(revoked_at)
+    return kwargs
+
+
+class RevocationIndexTests(testtools.TestCase):
+
+    def setUp(self):
+        super(RevocationIndexTests, self).setUp()
+        self.path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                 'revoked.idx')
+
+    def _index(self, token_ids):
+        with open(self.path, 'wb') as f:
+            f.write(revocation.encode_index(token_ids))
+        return revocation.RevocationIndex(self.path)
+
+    def test_lookup(self):
+        token_ids = ['%032x' % i for i in range(0, 1000, 3)]
+        index = self._index(reversed(token_ids))
+
+        self.assertEqual(len(token_ids), len(index))
+        for i in range(1000):
+            self.assertEqual(i % 3 == 0, '%032x' % i in index)
+
+    def test_ids_of_different_widths(self):
+        index = self._index(['abc', u'abcdef', 'b'])
+
+        self.assertIn('abc', index)
+        self.assertIn('abcdef', index)
+        self.assertIn(b'b', index)
+        self.assertNotIn('ab', index)
+        self.assertNotIn('abcdefg', index)
+
+    def test_empty(self):
+        index = self._index([])
+        self.assertEqual(0, len(index))
+        self.assertNotIn('abc', index)
+
+    def test_invalid(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'{"revoked": []}')
+        self.assertRaises(ValueError, revocation.RevocationIndex, self.path)
+
+    def test_truncated(self):
+        with open(self.path, 'wb') as f:
+            f.write(revocation.encode_index(['abc', 'def'])[:-1])
+        self.assertRaises(ValueError, revocation.RevocationIndex, self.path)
+
+
+class RevocationEventsTests(testtools.TestCase):
+
+    def setUp(self):
+        super(RevocationEventsTests, self).setUp()
+        self.events = revocation.RevocationEvents(max_token_lifetime=3600)
+
+        self.v2_token = fixture.V2Token(issued=ISSUED, expires=EXPIRES,
+                                        user_id='user', tenant_id='project')
+        self.v2_token.add_role(id='role', name='role')
+
+        self.v3_token = fixture.V3Token(issued=ISSUED, expires=EXPIRES,
+                                        user_id='user', project_id='project',
+                                        project_domain_id='domain')
+        self.v3_token.add_role(id='role', name='role')
+        self.v3_token['token']['audit_ids'] = ['audit', 'chain']
+
+    def test_no_events(self):
+        self.assertFalse(self.events.is_revoked(self.v2_token))
+        self.assertIsNone(self.events.since)
+
+    def test_user_event(self):
+        self.events.add([_event(user_id='user')])
+        self.assertTrue(self.events.is_revoked(self.v2_token))
+        self.assertTrue(self.events.is_revoked(self.v3_token))
+
+    def test_every_attribute_must_match(self):
+        self.events.add([_event(user_id='user', project_id='other')])
+        self.assertFalse(self.events.is_revoked(self.v3_token))
+
+        self.events.add([_event(user_id='user', role_id='role')])
+        self.assertTrue(self.events.is_revoked(self.v3_token))
+
+    def test_token_issued_after_event(self):
+        self.events.add([_event(user_id='user',
+                                issued_before=ISSUED -
+                                datetime.timedelta(seconds=1))])
+        self.assertFalse(self.events.is_revoked(self.v3_token))
+
+    def test_audit_ids(self):
+        self.events.add([_event(audit_id='other')])
+        self.assertFalse(self.events.is_revoked(self.v3_token))
+
+        self.events.add([_event(audit_chain_id='chain')])
+        self.assertTrue(self.events.is_revoked(self.v3_token))
+
+    def test_domain_and_expires_at(self):
+        self.events.add([_event(domain_id='domain',
+                                expires_at=timeutils.isotime(EXPIRES))])
+        self.assertTrue(self.events.is_revoked(self.v3_token))
+        self.assertFalse(self.events.is_revoked(self.v2_token))
+
+    def test_duplicate_events_ignored(self):
+        event = _event(user_id='user')
+        self.events.add([event])
+        self.events.add([dict(event)])
+        self.assertEqual(1, len(self.events))
+
+    def test_since_overlaps_latest_event(self):
+        later = ISSUED + datetime.timedelta(minutes=10)
+        self.events.add([_event(user_id='a'),
+                         _event(user_id='b', revoked_at=later)])
+
+        overlap = datetime.timedelta(seconds=revocation.FETCH_OVERLAP)
+        self.assertEqual(later - overlap, self.events.since)
+
+    def test_replace(self):
+        self.events.add([_event(user_id='user')])
+        self.events.replace([_event(project_id='other')])
+
+        self.assertEqual(1, len(self.events))
+        self.assertFalse(self.events.is_revoked(self.v2_token))
+
+    def test_expire(self):
+        self.events.add([_event(user_id='user'),
+                         _event(project_id='project',
+                                issued_before=ISSUED +
+                                datetime.timedelta(hours=2))])
+
+        self.events.expire(ISSUED + datetime.timedelta(minutes=90))
+
+        self.assertEqual(1, len(self.events))
+        self.assertTrue(self.events.is_revoked(self.v2_token))
+        self.assertFalse(self.events.is_revoked(
+            fixture.V2Token(issued=ISSUED, expires=EXPIRES, user_id='user')))
+
+    def test_expire_by_expires_at(self):
+        self.events.add([_event(user_id='user',
+                                issued_before=EXPIRES,
+                                expires_at=timeutils.isotime(EXPIRES))])
+        self.events.expire(EXPIRES + datetime.timedelta(seconds=1))
+        self.assertEqual(0, len(self.events))
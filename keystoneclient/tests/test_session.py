@@ -17,14 +17,17 @@ import httpretty
 import mock
 from oslo.config import cfg
 import requests
+from requests.packages import urllib3
 import six
 from testtools import matchers
 
 from keystoneclient import adapter
 from keystoneclient.auth import base
+from keystoneclient import endpoint_selection
 from keystoneclient import exceptions
 from keystoneclient.openstack.common.fixture import config
 from keystoneclient.openstack.common import jsonutils
+from keystoneclient import retry
 from keystoneclient import session as client_session
 from keystoneclient.tests import utils
 
@@ -166,6 +169,87 @@ class SessionTests(utils.TestCase):
             self.assertIn(k, self.logger.output)
             self.assertIn(v, self.logger.output)
 
+    @httpretty.activate
+    def test_logging_redacts_secrets(self):
+        session = client_session.Session()
+        token = uuid.uuid4().hex
+        password = uuid.uuid4().hex
+        self.stub_url(httpretty.POST, body='{"password": "%s"}' % password,
+                      adding_headers={'X-Subject-Token': token})
+
+        session.post(self.TEST_URL, headers={'X-Auth-Token': token},
+                     json={'auth': {'password': password}})
+
+        # only check what the session logged, httpretty logs the request.
+        output = '\n'.join(l for l in self.logger.output.splitlines()
+                           if l.startswith(('REQ:', 'RESP')))
+        self.assertNotIn(token, output)
+        self.assertNotIn(password, output)
+        self.assertIn('X-Auth-Token: {SHA1}', output)
+        self.assertIn('"password": "***"', output)
+
+    @httpretty.activate
+    def test_logging_truncates_body(self):
+        session = client_session.Session()
+        session.MAX_LOG_BODY_LENGTH = 10
+        self.stub_url(httpretty.GET, body='a' * 20 + 'END')
+
+        resp = session.get(self.TEST_URL)
+
+        self.assertEqual('a' * 20 + 'END', resp.text)
+        self.assertIn('a' * 10 + '... (13 bytes omitted)', self.logger.output)
+        self.assertNotIn('END', self.logger.output)
+
+    @httpretty.activate
+    def test_logging_redacts_truncated_secret(self):
+        session = client_session.Session()
+        session.MAX_LOG_BODY_LENGTH = 20
+        password = uuid.uuid4().hex
+        self.stub_url(httpretty.GET, body='{"password": "%s"}' % password)
+
+        session.get(self.TEST_URL)
+
+        output = '\n'.join(l for l in self.logger.output.splitlines()
+                           if l.startswith('RESP'))
+        self.assertNotIn(password[:6], output)
+        self.assertIn('"password": "***... (', output)
+
+    @httpretty.activate
+    def test_logging_does_not_consume_streams(self):
+        session = client_session.Session()
+        self.stub_url(httpretty.GET, body='BODYRESPONSE')
+
+        resp = session.get(self.TEST_URL, stream=True)
+
+        self.assertNotIn('BODYRESPONSE', self.logger.output)
+        self.assertEqual('BODYRESPONSE', resp.text)
+
+    @httpretty.activate
+    def test_logging_omits_binary_body(self):
+        session = client_session.Session()
+        self.stub_url(httpretty.GET, body='BODYRESPONSE',
+                      content_type='application/octet-stream')
+
+        session.get(self.TEST_URL)
+
+        self.assertIn('<12 bytes of application/octet-stream>',
+                      self.logger.output)
+
+    @httpretty.activate
+    def test_no_log_formatting_when_disabled(self):
+        session = client_session.Session()
+        self.stub_url(httpretty.GET, body='response')
+
+        with mock.patch.object(client_session._logger, 'isEnabledFor',
+                               return_value=False):
+            with mock.patch.object(session, '_http_log_request') as req:
+                with mock.patch.object(session,
+                                       '_http_log_response') as resp:
+                    session.get(self.TEST_URL)
+
+        self.assertFalse(req.called)
+        self.assertFalse(resp.called)
+
 
 class RedirectTests(utils.TestCase):
 
@@ -517,6 +601,360 @@ class SessionAuthTests(utils.TestCase):
         self.assertFalse(auth.invalidate_called)
 
 
+class SessionHookTests(utils.TestCase):
+
+    TEST_URL = 'http://127.0.0.1:5000/'
+
+    def setUp(self):
+        super(SessionHookTests, self).setUp()
+        self.events = []
+        self.session = client_session.Session(hooks=[self.hook])
+
+    def hook(self, event, info):
+        self.events.append((event, info))
+
+    @httpretty.activate
+    def test_request_events(self):
+        self.stub_url(httpretty.POST, body='response')
+        self.session.post(self.TEST_URL, data='request')
+
+        self.assertEqual([client_session.PRE_REQUEST,
+                          client_session.POST_RESPONSE],
+                         [e for e, _ in self.events])
+        pre, post = [i for _, i in self.events]
+        self.assertEqual('POST', post['method'])
+        self.assertEqual(self.TEST_URL, post['url'])
+        self.assertEqual(pre['start'], post['start'])
+        self.assertTrue(post['elapsed'] >= 0)
+        self.assertEqual(7, post['bytes_sent'])
+        self.assertEqual(8, post['bytes_received'])
+        self.assertEqual(200, post['response'].status_code)
+
+    def test_error_event(self):
+        with mock.patch.object(self.session.session, 'request',
+                               side_effect=requests.exceptions.Timeout):
+            self.assertRaises(exceptions.RequestTimeout,
+                              self.session.get, self.TEST_URL)
+
+        self.assertEqual([client_session.PRE_REQUEST, client_session.ERROR],
+                         [e for e, _ in self.events])
+        self.assertIsInstance(self.events[1][1]['exception'],
+                              exceptions.RequestTimeout)
+
+    @httpretty.activate
+    def test_redirect_event(self):
+        end_url = 'http://127.0.0.1:5000/end'
+        self.stub_url(httpretty.GET, status=302, location=end_url)
+        self.stub_url(httpretty.GET, base_url=end_url, body='done')
+
+        self.session.get(self.TEST_URL)
+
+        self.assertEqual([client_session.PRE_REQUEST,
+                          client_session.POST_RESPONSE,
+                          client_session.REDIRECT,
+                          client_session.PRE_REQUEST,
+                          client_session.POST_RESPONSE],
+                         [e for e, _ in self.events])
+        self.assertEqual(end_url, self.events[2][1]['location'])
+        self.assertEqual(end_url, self.events[4][1]['url'])
+
+    @httpretty.activate
+    def test_reauth_event(self):
+        self.session.auth = CalledAuthPlugin(invalidate=True)
+        responses = [httpretty.Response(body='Failed', status=401),
+                     httpretty.Response(body='Hello', status=200)]
+        httpretty.register_uri(httpretty.GET, self.TEST_URL,
+                               responses=responses)
+
+        self.session.get(self.TEST_URL, authenticated=True)
+
+        self.assertIn(client_session.REAUTH, [e for e, _ in self.events])
+        self.assertEqual(2, len([e for e, _ in self.events
+                                 if e == client_session.POST_RESPONSE]))
+
+    @httpretty.activate
+    def test_failing_hook_ignored(self):
+        self.stub_url(httpretty.GET, body='response')
+        self.session.add_hook(mock.Mock(side_effect=ValueError))
+
+        resp = self.session.get(self.TEST_URL)
+
+        self.assertEqual('response', resp.text)
+        self.assertEqual(2, len(self.events))
+
+    @httpretty.activate
+    def test_remove_hook(self):
+        self.stub_url(httpretty.GET, body='response')
+        self.session.remove_hook(self.hook)
+        self.session.get(self.TEST_URL)
+        self.assertEqual([], self.events)
+
+
+class SessionRetryTests(utils.TestCase):
+
+    TEST_URL = 'http://127.0.0.1:5000/'
+
+    def setUp(self):
+        super(SessionRetryTests, self).setUp()
+        self.policy = retry.RetryPolicy(retries=2)
+        self.events = []
+        self.session = client_session.Session(retry_policy=self.policy,
+                                              hooks=[self.hook])
+
+        patcher = mock.patch('time.sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def hook(self, event, info):
+        if event == client_session.RETRY:
+            self.events.append(info)
+
+    @httpretty.activate
+    def test_retry_status_with_retry_after(self):
+        responses = [httpretty.Response(body='busy', status=503,
+                                        adding_headers={'Retry-After': '3'}),
+                     httpretty.Response(body='done', status=200)]
+        httpretty.register_uri(httpretty.POST, self.TEST_URL,
+                               responses=responses)
+
+        resp = self.session.post(self.TEST_URL)
+
+        self.assertEqual('done', resp.text)
+        self.sleep.assert_called_once_with(3.0)
+        self.assertEqual(1, len(self.events))
+        self.assertEqual(1, self.events[0]['retry'])
+        self.assertEqual(3.0, self.events[0]['delay'])
+        self.assertEqual(503, self.events[0]['response'].status_code)
+
+    @httpretty.activate
+    def test_retries_exhausted(self):
+        self.stub_url(httpretty.GET, body='busy', status=429)
+
+        self.assertRaises(exceptions.HttpError,
+                          self.session.get, self.TEST_URL)
+        self.assertEqual(2, self.sleep.call_count)
+
+    def _connection_error(self, reason):
+        return requests.exceptions.ConnectionError(
+            urllib3.exceptions.MaxRetryError(None, self.TEST_URL, reason))
+
+    def test_connect_failure_retried(self):
+        error = self._connection_error(
+            urllib3.exceptions.NewConnectionError(None, 'refused'))
+        with mock.patch.object(self.session.session, 'request',
+                               side_effect=error) as m:
+            self.assertRaises(exceptions.ConnectFailure,
+                              self.session.post, self.TEST_URL)
+
+        self.assertEqual(3, m.call_count)
+        self.assertIsInstance(self.events[0]['exception'],
+                              exceptions.ConnectFailure)
+
+    def test_connect_timeout_retried(self):
+        with mock.patch.object(
+                self.session.session, 'request',
+                side_effect=requests.exceptions.ConnectTimeout) as m:
+            self.assertRaises(exceptions.ConnectFailure,
+                              self.session.post, self.TEST_URL)
+
+        self.assertEqual(3, m.call_count)
+
+    def test_disconnect_only_retried_for_idempotent_methods(self):
+        # the server closed the connection after the request was sent.
+        error = requests.exceptions.ConnectionError(
+            urllib3.exceptions.ProtocolError('Connection aborted.'))
+        with mock.patch.object(self.session.session, 'request',
+                               side_effect=error) as m:
+            self.assertRaises(exceptions.ConnectionRefused,
+                              self.session.post, self.TEST_URL)
+            self.assertEqual(1, m.call_count)
+
+            self.assertRaises(exceptions.ConnectionRefused,
+                              self.session.get, self.TEST_URL)
+            self.assertEqual(4, m.call_count)
+
+    def test_timeout_only_retried_for_idempotent_methods(self):
+        with mock.patch.object(self.session.session, 'request',
+                               side_effect=requests.exceptions.Timeout) as m:
+            self.assertRaises(exceptions.RequestTimeout,
+                              self.session.post, self.TEST_URL)
+            self.assertEqual(1, m.call_count)
+
+            self.assertRaises(exceptions.RequestTimeout,
+                              self.session.get, self.TEST_URL)
+            self.assertEqual(4, m.call_count)
+
+    @httpretty.activate
+    def test_per_request_policy(self):
+        self.stub_url(httpretty.GET, body='busy', status=503)
+
+        self.assertRaises(exceptions.HttpError, self.session.get,
+                          self.TEST_URL,
+                          retry_policy=retry.RetryPolicy(retries=0))
+        self.assertFalse(self.sleep.called)
+
+    @httpretty.activate
+    def test_adapter_policy(self):
+        self.stub_url(httpretty.GET, body='busy', status=503)
+        adpt = adapter.Adapter(client_session.Session(),
+                               retry_policy=self.policy)
+
+        self.assertRaises(exceptions.HttpError, adpt.get, self.TEST_URL)
+        self.assertEqual(2, self.sleep.call_count)
+
+
+class MultipleEndpointAuthPlugin(base.BaseAuthPlugin):
+
+    ENDPOINTS = ['http://zone1:8774/v2', 'http://zone2:8774/v2']
+
+    def get_token(self, session):
+        return 'aToken'
+
+    def get_endpoint(self, session, **kwargs):
+        return self.ENDPOINTS[0]
+
+    def get_endpoints(self, session, **kwargs):
+        return list(self.ENDPOINTS)
+
+
+class EndpointSelectionTests(utils.TestCase):
+
+    ENDPOINT_FILTER = {'service_type': 'compute'}
+
+    def setUp(self):
+        super(EndpointSelectionTests, self).setUp()
+        self.selector = endpoint_selection.LatencySelector()
+        # measure the endpoints so that zone1 is preferred.
+        self.selector.record('http://zone1:8774/v2', 0.01)
+        self.selector.record('http://zone2:8774/v2', 0.1)
+
+        self.session = client_session.Session(
+            auth=MultipleEndpointAuthPlugin(),
+            endpoint_selector=self.selector)
+        self.urls = []
+
+    def _request(self, method, url, **kwargs):
+        self.urls.append(url)
+        if url.startswith('http://zone1'):
+            raise requests.exceptions.ConnectionError()
+        return utils.TestResponse({'status_code': 200, 'text': 'ok'})
+
+    @httpretty.activate
+    def test_fastest_endpoint_used(self):
+        httpretty.register_uri(httpretty.GET, 'http://zone1:8774/v2/servers',
+                               body='ok')
+
+        resp = self.session.get('/servers',
+                                endpoint_filter=self.ENDPOINT_FILTER)
+
+        self.assertEqual('ok', resp.text)
+        self.assertEqual('zone1:8774',
+                         httpretty.last_request().headers['Host'])
+
+    def test_fails_over_connection_error(self):
+        with mock.patch.object(self.session.session, 'request',
+                               side_effect=self._request):
+            resp = self.session.get('/servers',
+                                    endpoint_filter=self.ENDPOINT_FILTER)
+
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(['http://zone1:8774/v2/servers',
+                          'http://zone2:8774/v2/servers'], self.urls)
+
+        stats = self.selector.get_stats()
+        self.assertFalse(stats['http://zone1:8774/v2']['healthy'])
+        self.assertTrue(stats['http://zone2:8774/v2']['healthy'])
+
+        # the unhealthy endpoint is now tried last.
+        self.assertEqual(['http://zone2:8774/v2', 'http://zone1:8774/v2'],
+                         self.selector.order(MultipleEndpointAuthPlugin.
+                                             ENDPOINTS))
+
+    def test_last_connection_error_raised(self):
+        with mock.patch.object(
+                self.session.session, 'request',
+                side_effect=requests.exceptions.ConnectionError) as m:
+            self.assertRaises(exceptions.ConnectionRefused, self.session.get,
+                              '/servers', endpoint_filter=self.ENDPOINT_FILTER)
+
+        self.assertEqual(2, m.call_count)
+
+    def test_timeout_fails_over(self):
+        def request(method, url, **kwargs):
+            self.urls.append(url)
+            if url.startswith('http://zone1'):
+                raise requests.exceptions.ReadTimeout()
+            return utils.TestResponse({'status_code': 200, 'text': 'ok'})
+
+        with mock.patch.object(self.session.session, 'request',
+                               side_effect=request):
+            resp = self.session.get('/servers',
+                                    endpoint_filter=self.ENDPOINT_FILTER)
+
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(2, len(self.urls))
+        stats = self.selector.get_stats()
+        self.assertFalse(stats['http://zone1:8774/v2']['healthy'])
+
+    def test_non_idempotent_not_failed_over_after_sending(self):
+        for error in (requests.exceptions.ReadTimeout,
+                      requests.exceptions.ConnectionError):
+            with mock.patch.object(self.session.session, 'request',
+                                   side_effect=error) as m:
+                self.assertRaises(exceptions.ClientException,
+                                  self.session.post, '/servers',
+                                  endpoint_filter=self.ENDPOINT_FILTER)
+
+            self.assertEqual(1, m.call_count)
+        stats = self.selector.get_stats()
+        self.assertFalse(stats['http://zone1:8774/v2']['healthy'])
+
+    def test_non_idempotent_fails_over_connect_failure(self):
+        with mock.patch.object(
+                self.session.session, 'request',
+                side_effect=requests.exceptions.ConnectTimeout) as m:
+            self.assertRaises(exceptions.ConnectFailure, self.session.post,
+                              '/servers', endpoint_filter=self.ENDPOINT_FILTER)
+
+        self.assertEqual(2, m.call_count)
+
+    def test_ssl_error_not_failed_over(self):
+        with mock.patch.object(
+                self.session.session, 'request',
+                side_effect=requests.exceptions.SSLError) as m:
+            self.assertRaises(exceptions.SSLError, self.session.get,
+                              '/servers', endpoint_filter=self.ENDPOINT_FILTER)
+
+        self.assertEqual(1, m.call_count)
+
+    def test_no_selector_uses_first_endpoint(self):
+        sess = client_session.Session(auth=MultipleEndpointAuthPlugin())
+
+        with mock.patch.object(sess.session, 'request',
+                               side_effect=self._request):
+            self.assertRaises(exceptions.ConnectionRefused, sess.get,
+                              '/servers', endpoint_filter=self.ENDPOINT_FILTER)
+
+        self.assertEqual(['http://zone1:8774/v2/servers'], self.urls)
+
+    def test_adapter_selector(self):
+        sess = client_session.Session(auth=MultipleEndpointAuthPlugin())
+        adpt = adapter.Adapter(sess, service_type='compute',
+                               endpoint_selector=self.selector)
+
+        with mock.patch.object(sess.session, 'request',
+                               side_effect=self._request):
+            resp = adpt.get('/servers')
+
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual('http://zone2:8774/v2/servers', self.urls[-1])
+
+    def test_default_get_endpoints(self):
+        auth = CalledAuthPlugin()
+        self.assertEqual([CalledAuthPlugin.ENDPOINT],
+                         auth.get_endpoints(self.session))
+
+
 class AdapterTest(utils.TestCase):
 
     SERVICE_TYPE = uuid.uuid4().hex
@@ -651,11 +1089,23 @@ class ConfLoadingTests(utils.TestCase):
 
         self.assertEqual(cafile, s.verify)
 
+    def test_retries(self):
+        self.config(retries=3, retry_deadline=10.0)
+        s = self.get_session()
+
+        self.assertEqual(3, s.retry_policy.retries)
+        self.assertEqual(0.5, s.retry_policy.backoff)
+        self.assertEqual(10.0, s.retry_policy.deadline)
+
+    def test_no_retries(self):
+        self.assertIsNone(self.get_session().retry_policy)
+
     def test_deprecated(self):
         def new_deprecated():
             return cfg.DeprecatedOpt(uuid.uuid4().hex, group=uuid.uuid4().hex)
 
-        opt_names = ['cafile', 'certfile', 'keyfile', 'insecure', 'timeout']
+        opt_names = ['cafile', 'certfile', 'keyfile', 'insecure', 'timeout',
+                     'retries', 'retry_backoff', 'retry_deadline']
         depr = dict([(n, [new_deprecated()]) for n in opt_names])
         opts = client_session.Session.get_conf_options(deprecated_opts=depr)
 
@@ -697,3 +1147,9 @@ class CliLoadingTests(utils.TestCase):
         s = self.get_session('--os-cacert %s' % cacert)
 
         self.assertEqual(cacert, s.verify)
+
+    def test_retries(self):
+        s = self.get_session('--os-retries 2 --os-retry-deadline 30')
+
+        self.assertEqual(2, s.retry_policy.retries)
+        self.assertEqual(30.0, s.retry_policy.deadline)
@@ -440,6 +440,7 @@ class ShellTest(utils.TestCase):
         response_mock.text = json.dumps({
             'endpoints': [],
         })
+        response_mock.content = response_mock.text.encode('utf-8')
         request_mock = mock.MagicMock(return_value=response_mock)
         with mock.patch.object(session.requests, 'request',
                                request_mock):
@@ -0,0 +1,166 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+import os
+import stat
+
+import fixtures
+import mock
+
+from keystoneclient import access
+from keystoneclient import fixture
+from keystoneclient import httpclient
+from keystoneclient.openstack.common import timeutils
+from keystoneclient.tests import utils
+from keystoneclient import token_cache
+
+
+AUTH_URL = 'http://public.com:5000/v2.0'
+USERNAME = 'exampleuser'
+PASSWORD = 'password'
+TENANT_ID = 'tenant_id'
+
+
+class FileTokenCacheTests(utils.TestCase):
+
+    def setUp(self):
+        super(FileTokenCacheTests, self).setUp()
+        self.path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                 'tokens')
+        self.cache = token_cache.FileTokenCache(self.path)
+        self.key = self.cache.make_key(auth_url=AUTH_URL, username=USERNAME)
+
+    def test_make_key(self):
+        self.assertEqual(self.key,
+                         self.cache.make_key(username=USERNAME,
+                                             auth_url=AUTH_URL))
+        self.assertNotEqual(self.key,
+                            self.cache.make_key(auth_url=AUTH_URL,
+                                                username='other'))
+        self.assertNotIn(USERNAME, self.key)
+
+    def test_default_path(self):
+        self.useFixture(fixtures.EnvironmentVariable('XDG_CACHE_HOME',
+                                                     '/cache'))
+        self.assertEqual('/cache/keystoneclient/tokens',
+                         token_cache.FileTokenCache().path)
+
+    def test_get_missing(self):
+        self.assertIsNone(self.cache.get(self.key))
+
+    def test_v2_round_trip(self):
+        token = fixture.V2Token(tenant_id=TENANT_ID)
+        self.cache.set(self.key, access.AccessInfo.factory(body=token))
+
+        auth_ref = self.cache.get(self.key)
+        self.assertIsInstance(auth_ref, access.AccessInfoV2)
+        self.assertEqual(token.token_id, auth_ref.auth_token)
+        self.assertEqual(TENANT_ID, auth_ref.tenant_id)
+
+    def test_v3_round_trip(self):
+        token = fixture.V3Token(project_id=TENANT_ID)
+        self.cache.set(self.key, access.AccessInfoV3('v3-token',
+                                                     **token['token']))
+
+        auth_ref = self.cache.get(self.key)
+        self.assertIsInstance(auth_ref, access.AccessInfoV3)
+        self.assertEqual('v3-token', auth_ref.auth_token)
+        self.assertEqual(TENANT_ID, auth_ref.project_id)
+
+    def test_stale_token_not_returned(self):
+        expires = timeutils.utcnow() + datetime.timedelta(seconds=60)
+        token = fixture.V2Token(expires=expires)
+        self.cache.set(self.key, access.AccessInfo.factory(body=token))
+
+        self.assertIsNotNone(self.cache.get(self.key, stale_duration=30))
+        self.assertIsNone(self.cache.get(self.key, stale_duration=120))
+
+    def test_invalid_file_ignored(self):
+        os.makedirs(self.path)
+        with open(os.path.join(self.path, self.key), 'w') as f:
+            f.write('{"access": ')
+
+        self.assertIsNone(self.cache.get(self.key))
+
+    def test_files_private(self):
+        token = fixture.V2Token()
+        self.cache.set(self.key, access.AccessInfo.factory(body=token))
+
+        mode = os.stat(os.path.join(self.path, self.key)).st_mode
+        self.assertEqual(0, mode & (stat.S_IRWXG | stat.S_IRWXO))
+        mode = os.stat(self.path).st_mode
+        self.assertEqual(0, mode & (stat.S_IRWXG | stat.S_IRWXO))
+        # the temporary file was renamed into place.
+        self.assertEqual([self.key], os.listdir(self.path))
+
+    def test_delete(self):
+        token = fixture.V2Token()
+        self.cache.set(self.key, access.AccessInfo.factory(body=token))
+        self.cache.delete(self.key)
+        self.assertIsNone(self.cache.get(self.key))
+        # deleting a missing token is not an error.
+        self.cache.delete(self.key)
+
+    def test_lock(self):
+        if token_cache.fcntl is None:
+            self.skipTest('fcntl is not available')
+
+        with mock.patch.object(token_cache.fcntl, 'flock') as flock:
+            with self.cache.lock(self.key):
+                flock.assert_called_once_with(mock.ANY,
+                                              token_cache.fcntl.LOCK_EX)
+            flock.assert_called_with(mock.ANY, token_cache.fcntl.LOCK_UN)
+
+        self.assertTrue(os.path.exists(os.path.join(self.path,
+                                                    self.key + '.lock')))
+
+
+class HTTPClientTokenCacheTests(utils.TestCase):
+
+    def setUp(self):
+        super(HTTPClientTokenCacheTests, self).setUp()
+        path = self.useFixture(fixtures.TempDir()).path
+        self.cache = token_cache.FileTokenCache(path)
+        self.token = fixture.V2Token(tenant_id=TENANT_ID, user_name=USERNAME)
+
+    def _client(self, **kwargs):
+        return httpclient.HTTPClient(username=USERNAME, password=PASSWORD,
+                                     tenant_id=TENANT_ID, auth_url=AUTH_URL,
+                                     token_cache=self.cache, **kwargs)
+
+    def _authenticate(self, cl):
+        method = 'get_raw_token_from_identity_service'
+        with mock.patch.object(cl, method) as meth:
+            meth.return_value = (True, self.token)
+            self.assertTrue(cl.authenticate())
+            return meth.call_count
+
+    def test_token_reused_by_another_client(self):
+        self.assertEqual(1, self._authenticate(self._client()))
+
+        cl = self._client()
+        self.assertEqual(0, self._authenticate(cl))
+        self.assertEqual(self.token.token_id, cl.auth_token)
+
+    def test_force_new_token(self):
+        self.assertEqual(1, self._authenticate(self._client()))
+        cl = self._client(force_new_token=True)
+        self.assertEqual(1, self._authenticate(cl))
+
+    def test_password_not_cached(self):
+        cl = self._client()
+        self._authenticate(cl)
+
+        for name in os.listdir(self.cache.path):
+            with open(os.path.join(self.cache.path, name)) as f:
+                self.assertNotIn(PASSWORD, f.read())
@@ -0,0 +1,177 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import socket
+import stat
+import threading
+
+import fixtures
+import mock
+import testtools
+
+from keystoneclient.middleware import validation_daemon
+
+
+TOKEN_DATA = {'access': {'token': {'id': 'token'}}}
+
+
+class ProtocolTests(testtools.TestCase):
+
+    def setUp(self):
+        super(ProtocolTests, self).setUp()
+        self.a, self.b = socket.socketpair()
+        self.addCleanup(self.a.close)
+        self.addCleanup(self.b.close)
+
+    def test_request(self):
+        env = {'REMOTE_USER': u'us\xe9r', 'HTTP_X_AUTH_TOKEN': 'token'}
+        self.a.sendall(validation_daemon.encode_request('token', env))
+
+        version, token, env = validation_daemon.read_request(self.b)
+
+        self.assertEqual(validation_daemon.VERSION, version)
+        self.assertEqual('token', token)
+        self.assertEqual({'REMOTE_USER': u'us\xe9r'}, env)
+
+    def test_response(self):
+        self.a.sendall(validation_daemon.encode_response(
+            validation_daemon.VALID, TOKEN_DATA))
+        self.a.sendall(validation_daemon.encode_response(
+            validation_daemon.INVALID))
+
+        self.assertEqual((validation_daemon.VALID, TOKEN_DATA),
+                         validation_daemon.read_response(self.b))
+        self.assertEqual((validation_daemon.INVALID, None),
+                         validation_daemon.read_response(self.b))
+
+    def test_request_too_large(self):
+        self.b.settimeout(1)
+        self.a.sendall(validation_daemon._REQUEST.pack(
+            validation_daemon.VERSION, 2 ** 32 - 1, 0, 0))
+        self.assertRaises(ValueError, validation_daemon.read_request, self.b)
+
+        self.a.sendall(validation_daemon._REQUEST.pack(
+            validation_daemon.VERSION, 5, validation_daemon.MAX_ENV_LENGTH + 1,
+            0))
+        self.assertRaises(ValueError, validation_daemon.read_request, self.b)
+
+    def test_encode_request_too_large(self):
+        token = 'a' * (validation_daemon.MAX_TOKEN_LENGTH + 1)
+        self.assertRaises(ValueError, validation_daemon.encode_request, token)
+
+    def test_closed_connection(self):
+        self.a.sendall(validation_daemon.encode_request('token')[:5])
+        self.a.close()
+        self.assertRaises(EOFError, validation_daemon.read_request, self.b)
+
+
+class ValidationDaemonTests(testtools.TestCase):
+
+    def setUp(self):
+        super(ValidationDaemonTests, self).setUp()
+        self.path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                 'validator.sock')
+        self.requests = []
+        self.start_server()
+        self.client = validation_daemon.ValidationClient(self.path,
+                                                         timeout=5)
+
+    def start_server(self):
+        server = validation_daemon.ValidationServer(self.path, self.validate)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+
+    def validate(self, token, env):
+        self.requests.append((token, env))
+        if token == 'error':
+            raise ValueError()
+        if token == 'valid':
+            return validation_daemon.VALID, TOKEN_DATA
+        return validation_daemon.INVALID, None
+
+    def test_validate(self):
+        self.assertEqual((validation_daemon.VALID, TOKEN_DATA),
+                         self.client.validate('valid', {'AUTH_TYPE': 'x'}))
+        self.assertEqual((validation_daemon.INVALID, None),
+                         self.client.validate('invalid'))
+        self.assertEqual([('valid', {'AUTH_TYPE': 'x'}), ('invalid', {})],
+                         self.requests)
+
+    def test_unexpected_error(self):
+        self.assertEqual((validation_daemon.SERVICE_ERROR, None),
+                         self.client.validate('error'))
+        # the connection is still usable.
+        self.assertEqual(validation_daemon.VALID,
+                         self.client.validate('valid')[0])
+
+    def test_socket_private(self):
+        mode = os.stat(self.path).st_mode
+        self.assertTrue(stat.S_ISSOCK(mode))
+        self.assertEqual(0, mode & (stat.S_IRWXG | stat.S_IRWXO))
+
+    def test_reconnects_to_restarted_daemon(self):
+        self.client.validate('valid')
+        sock = self.client._local.sock
+        self.server.shutdown()
+        self.server.server_close()
+        # the handler of the kept connection is still running, close it.
+        sock.shutdown(socket.SHUT_WR)
+        self.start_server()
+
+        self.assertEqual(validation_daemon.VALID,
+                         self.client.validate('valid')[0])
+        self.assertIsNot(sock, self.client._local.sock)
+
+    def test_unavailable(self):
+        client = validation_daemon.ValidationClient(self.path + '.missing')
+        self.assertTrue(client.available())
+        self.assertRaises(validation_daemon.DaemonUnavailable,
+                          client.validate, 'valid')
+        self.assertFalse(client.available())
+
+    def test_token_too_large(self):
+        token = 'a' * (validation_daemon.MAX_TOKEN_LENGTH + 1)
+        self.assertRaises(validation_daemon.DaemonUnavailable,
+                          self.client.validate, token)
+        # other tokens are still sent to the daemon.
+        self.assertTrue(self.client.available())
+        self.assertEqual([], self.requests)
+
+    def test_slow_daemon_not_retried(self):
+        a, b = socket.socketpair()
+        self.addCleanup(a.close)
+        self.addCleanup(b.close)
+        client = validation_daemon.ValidationClient(self.path, timeout=0.1)
+        client._local.sock = a
+
+        with mock.patch.object(client, '_connect') as connect:
+            self.assertRaises(validation_daemon.DaemonUnavailable,
+                              client.validate, 'valid')
+
+        self.assertFalse(connect.called)
+        self.assertFalse(client.available())
+
+    def test_unsupported_version(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(sock.close)
+        sock.connect(self.path)
+        request = validation_daemon.encode_request('valid')
+        sock.sendall(b'\x7f' + request[1:])
+
+        status, data = validation_daemon.read_response(sock)
+        self.assertEqual(validation_daemon.UNSUPPORTED, status)
+        self.assertEqual([], self.requests)
@@ -0,0 +1,174 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""A token cache on disk that is shared between processes.
+
+Every run of the keystone command line client otherwise authenticates again
+before doing any work. A :py:class:`FileTokenCache` given to an identity auth
+plugin or to the client stores each token in a file named after a hash of
+the parameters it was fetched with, so a later process that authenticates
+the same way reuses the token until it expires::
+
+    cache = token_cache.FileTokenCache()
+    auth = v2.Password(auth_url, username, password, token_cache=cache)
+
+Files are written to a temporary file and renamed into place so that a
+reader never sees part of a token. Where fcntl is available a process holds
+a lock on the token while it authenticates, so that processes starting
+together wait for the first one's token rather than all authenticating.
+
+The cache files contain valid tokens and are only readable by their owner.
+"""
+
+import contextlib
+import errno
+import hashlib
+import logging
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from keystoneclient import _json
+from keystoneclient import access
+from keystoneclient.openstack.common import jsonutils
+
+
+_logger = logging.getLogger(__name__)
+
+
+def default_path():
+    """Return the directory that tokens are cached in by default.
+
+    This is ``keystoneclient/tokens`` within ``$XDG_CACHE_HOME``, or within
+    ``~/.cache`` if that isn't set.
+    """
+    cache_home = (os.environ.get('XDG_CACHE_HOME') or
+                  os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_home, 'keystoneclient', 'tokens')
+
+
+class FileTokenCache(object):
+    """Cache tokens as files in a directory.
+
+    :param string path: The directory to store tokens in. It is created if
+                        it doesn't exist. (optional, defaults to
+                        default_path())
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_path()
+
+    @staticmethod
+    def make_key(**kwargs):
+        """Return the key of the token fetched with the given parameters.
+
+        The key is a hash so that the parameters aren't revealed by the file
+        names. Secrets such as passwords should not be passed.
+        """
+        data = jsonutils.dumps(kwargs, sort_keys=True)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def _filename(self, key):
+        return os.path.join(self.path, key)
+
+    def _ensure_path(self):
+        try:
+            os.makedirs(self.path, 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        """Hold a lock on the token stored under key between processes.
+
+        If the lock can't be taken the block is run without it.
+        """
+        fd = None
+
+        if fcntl is not None:
+            try:
+                self._ensure_path()
+                fd = os.open(self._filename(key) + '.lock',
+                             os.O_RDWR | os.O_CREAT, 0o600)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            except (IOError, OSError) as e:
+                _logger.warning('Unable to lock token cache %s', e)
+                if fd is not None:
+                    os.close(fd)
+                    fd = None
+
+        try:
+            yield
+        finally:
+            if fd is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def get(self, key, stale_duration=access.STALE_TOKEN_DURATION):
+        """Return the token stored under key.
+
+        :param string key: The key from make_key().
+        :param int stale_duration: Tokens that expire within this many
+                                   seconds are not returned.
+
+        :returns: An AccessInfo or None if there is no token that will remain
+                  valid.
+        """
+        try:
+            with open(self._filename(key)) as f:
+                data = f.read()
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                _logger.warning('Unable to read token cache %s', e)
+            return None
+
+        try:
+            auth_ref = access.AccessInfo.factory(**_json.loads(data))
+            if auth_ref.will_expire_soon(stale_duration):
+                return None
+        except Exception as e:
+            _logger.warning('Ignoring invalid token cache file %s: %s',
+                            self._filename(key), e)
+            return None
+
+        return auth_ref
+
+    def set(self, key, auth_ref):
+        """Store a token under key, replacing any token already there."""
+        data = jsonutils.dumps(dict(auth_ref), separators=(',', ':'))
+
+        try:
+            self._ensure_path()
+            # mkstemp creates the file readable only by its owner.
+            fd, tmp = tempfile.mkstemp(dir=self.path, prefix='.%s.' % key)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.write(data)
+                os.rename(tmp, self._filename(key))
+            except Exception:
+                os.unlink(tmp)
+                raise
+        except (IOError, OSError) as e:
+            _logger.warning('Unable to write token cache %s', e)
+
+    def delete(self, key):
+        """Remove the token stored under key, if there is one."""
+        try:
+            os.unlink(self._filename(key))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                _logger.warning('Unable to remove token from cache %s', e)
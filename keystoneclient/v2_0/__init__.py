@@ -1,7 +1,9 @@
-# flake8: noqa
-from keystoneclient.v2_0.client import Client
+from keystoneclient import _lazy
 
 
 __all__ = [
     'client',
 ]
+
+_lazy.install(__name__, {'client': 'keystoneclient.v2_0.client',
+                         'Client': 'keystoneclient.v2_0.client:Client'})
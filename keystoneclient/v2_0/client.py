@@ -15,17 +15,10 @@
 
 import logging
 
+from keystoneclient import _lazy
 from keystoneclient.auth.identity import v2 as v2_auth
 from keystoneclient import exceptions
 from keystoneclient import httpclient
-from keystoneclient.v2_0 import ec2
-from keystoneclient.v2_0 import endpoints
-from keystoneclient.v2_0 import extensions
-from keystoneclient.v2_0 import roles
-from keystoneclient.v2_0 import services
-from keystoneclient.v2_0 import tenants
-from keystoneclient.v2_0 import tokens
-from keystoneclient.v2_0 import users
 
 
 _logger = logging.getLogger(__name__)
@@ -126,19 +119,22 @@ class Client(httpclient.HTTPClient):
 
     version = 'v2.0'
 
+    endpoints = _lazy.LazyManager(
+        'keystoneclient.v2_0.endpoints:EndpointManager')
+    extensions = _lazy.LazyManager(
+        'keystoneclient.v2_0.extensions:ExtensionManager')
+    roles = _lazy.LazyManager('keystoneclient.v2_0.roles:RoleManager')
+    services = _lazy.LazyManager('keystoneclient.v2_0.services:ServiceManager')
+    tenants = _lazy.LazyManager('keystoneclient.v2_0.tenants:TenantManager')
+    tokens = _lazy.LazyManager('keystoneclient.v2_0.tokens:TokenManager')
+    users = _lazy.LazyManager('keystoneclient.v2_0.users:UserManager')
+
+    # extensions
+    ec2 = _lazy.LazyManager('keystoneclient.v2_0.ec2:CredentialsManager')
+
     def __init__(self, **kwargs):
         """Initialize a new client for the Keystone v2.0 API."""
         super(Client, self).__init__(**kwargs)
-        self.endpoints = endpoints.EndpointManager(self)
-        self.extensions = extensions.ExtensionManager(self)
-        self.roles = roles.RoleManager(self)
-        self.services = services.ServiceManager(self)
-        self.tenants = tenants.TenantManager(self)
-        self.tokens = tokens.TokenManager(self)
-        self.users = users.UserManager(self)
-
-        # extensions
-        self.ec2 = ec2.CredentialsManager(self)
 
         # DEPRECATED: if session is passed then we go to the new behaviour of
         # authenticating on the first required call.
@@ -1,7 +1,9 @@
-# flake8: noqa
-from keystoneclient.v3.client import Client
+from keystoneclient import _lazy
 
 
 __all__ = [
     'client',
 ]
+
+_lazy.install(__name__, {'client': 'keystoneclient.v3.client',
+                         'Client': 'keystoneclient.v3.client:Client'})
@@ -15,25 +15,11 @@
 
 import logging
 
+from keystoneclient import _lazy
 from keystoneclient.auth.identity import v3 as v3_auth
 from keystoneclient import exceptions
 from keystoneclient import httpclient
 from keystoneclient.openstack.common import jsonutils
-from keystoneclient.v3.contrib import endpoint_filter
-from keystoneclient.v3.contrib import federation
-from keystoneclient.v3.contrib import oauth1
-from keystoneclient.v3.contrib import trusts
-from keystoneclient.v3 import credentials
-from keystoneclient.v3 import domains
-from keystoneclient.v3 import endpoints
-from keystoneclient.v3 import groups
-from keystoneclient.v3 import policies
-from keystoneclient.v3 import projects
-from keystoneclient.v3 import regions
-from keystoneclient.v3 import role_assignments
-from keystoneclient.v3 import roles
-from keystoneclient.v3 import services
-from keystoneclient.v3 import users
 
 
 _logger = logging.getLogger(__name__)
@@ -93,26 +79,32 @@ class Client(httpclient.HTTPClient):
 
     version = 'v3'
 
+    credentials = _lazy.LazyManager(
+        'keystoneclient.v3.credentials:CredentialManager')
+    endpoint_filter = _lazy.LazyManager(
+        'keystoneclient.v3.contrib.endpoint_filter:EndpointFilterManager')
+    endpoints = _lazy.LazyManager(
+        'keystoneclient.v3.endpoints:EndpointManager')
+    domains = _lazy.LazyManager('keystoneclient.v3.domains:DomainManager')
+    federation = _lazy.LazyManager(
+        'keystoneclient.v3.contrib.federation:FederationManager')
+    groups = _lazy.LazyManager('keystoneclient.v3.groups:GroupManager')
+    oauth1 = _lazy.LazyManager(
+        'keystoneclient.v3.contrib.oauth1:create_oauth_manager')
+    policies = _lazy.LazyManager('keystoneclient.v3.policies:PolicyManager')
+    projects = _lazy.LazyManager('keystoneclient.v3.projects:ProjectManager')
+    regions = _lazy.LazyManager('keystoneclient.v3.regions:RegionManager')
+    role_assignments = _lazy.LazyManager(
+        'keystoneclient.v3.role_assignments:RoleAssignmentManager')
+    roles = _lazy.LazyManager('keystoneclient.v3.roles:RoleManager')
+    services = _lazy.LazyManager('keystoneclient.v3.services:ServiceManager')
+    users = _lazy.LazyManager('keystoneclient.v3.users:UserManager')
+    trusts = _lazy.LazyManager('keystoneclient.v3.contrib.trusts:TrustManager')
+
     def __init__(self, **kwargs):
         """Initialize a new client for the Keystone v3 API."""
         super(Client, self).__init__(**kwargs)
 
-        self.credentials = credentials.CredentialManager(self)
-        self.endpoint_filter = endpoint_filter.EndpointFilterManager(self)
-        self.endpoints = endpoints.EndpointManager(self)
-        self.domains = domains.DomainManager(self)
-        self.federation = federation.FederationManager(self)
-        self.groups = groups.GroupManager(self)
-        self.oauth1 = oauth1.create_oauth_manager(self)
-        self.policies = policies.PolicyManager(self)
-        self.projects = projects.ProjectManager(self)
-        self.regions = regions.RegionManager(self)
-        self.role_assignments = role_assignments.RoleAssignmentManager(self)
-        self.roles = roles.RoleManager(self)
-        self.services = services.ServiceManager(self)
-        self.users = users.UserManager(self)
-        self.trusts = trusts.TrustManager(self)
-
         # DEPRECATED: if session is passed then we go to the new behaviour of
         # authenticating on the first required call.
         if 'session' not in kwargs and self.management_url is None:
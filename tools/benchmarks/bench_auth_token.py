@@ -0,0 +1,364 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure the request throughput of the auth_token middleware.
+
+Run from the top of a source checkout::
+
+    $ python tools/benchmarks/bench_auth_token.py [--json] [--eventlet]
+
+The middleware protects auth_token's echo application and validates tokens
+against a fake identity server running in the same process, which answers
+after --latency seconds. UUID, PKI and PKIZ tokens are minted with
+keystoneclient.fixture and signed with the example certificates in
+examples/pki. Revocation lists and certificates are fetched from the fake
+server as they would be from keystone.
+
+Each scenario is a new middleware. Some tokens are validated first so they
+are cached. Each request then uses a cached token with a probability of
+--hit-ratios, otherwise a token the middleware hasn't seen. The requests are
+made by --concurrency threads, or greenthreads with --eventlet. The
+throughput, the median and 99th percentile latency of a request and the
+number of requests made to the identity server are reported for every
+combination of token format, hit ratio, memcache protection strategy and
+concurrency.
+"""
+
+import sys
+
+if '--eventlet' in sys.argv:
+    import eventlet
+    eventlet.monkey_patch()
+
+import collections  # noqa
+import os  # noqa
+import random  # noqa
+import shutil  # noqa
+import tempfile  # noqa
+import threading  # noqa
+import time  # noqa
+import timeit  # noqa
+import uuid  # noqa
+from wsgiref import simple_server  # noqa
+
+import benchutils  # noqa
+from six.moves import queue  # noqa
+from six.moves import socketserver  # noqa
+
+from keystoneclient.common import cms  # noqa
+from keystoneclient import fixture  # noqa
+from keystoneclient.middleware import auth_token  # noqa
+from keystoneclient.openstack.common import jsonutils  # noqa
+
+
+PKI_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                       os.pardir, os.pardir, 'examples',
+                                       'pki'))
+SIGNING_CERT = os.path.join(PKI_DIR, 'certs', 'signing_cert.pem')
+SIGNING_KEY = os.path.join(PKI_DIR, 'private', 'signing_key.pem')
+CA_CERT = os.path.join(PKI_DIR, 'certs', 'cacert.pem')
+
+FORMATS = ('uuid', 'pki', 'pkiz')
+STRATEGIES = ('none', 'MAC', 'ENCRYPT', 'AEAD')
+
+# tokens validated before a scenario is timed, so that they are cached.
+WARM_TOKENS = 10
+
+
+def _csv(convert=str):
+    return lambda value: [convert(v) for v in value.split(',')]
+
+
+class _ThreadingWSGIServer(socketserver.ThreadingMixIn,
+                           simple_server.WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(simple_server.WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeKeystone(object):
+    """An identity server that answers auth_token's requests in process.
+
+    :param float latency: Seconds to wait before answering each request.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+        self.admin_token = fixture.V2Token()
+        self.admin_token.set_scope()
+
+        with open(SIGNING_CERT) as f:
+            self.signing_cert = f.read()
+        with open(CA_CERT) as f:
+            self.ca_cert = f.read()
+
+        revoked = jsonutils.dumps({'revoked': []})
+        self.revocation_list = cms.cms_sign_text(revoked, SIGNING_CERT,
+                                                 SIGNING_KEY)
+
+        self._server = simple_server.make_server(
+            '127.0.0.1', 0, self, server_class=_ThreadingWSGIServer,
+            handler_class=_QuietHandler)
+        self.url = 'http://127.0.0.1:%d' % self._server.server_port
+
+    def start(self):
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+
+    def add_token(self, token_id, body):
+        self._tokens[token_id] = body
+
+    def _route(self, environ):
+        method = environ['REQUEST_METHOD']
+        path = environ['PATH_INFO']
+
+        if method == 'POST' and path == '/v2.0/tokens':
+            return 200, {}, self.admin_token
+        if path == '/v2.0/tokens/revoked':
+            return 200, {}, {'signed': self.revocation_list}
+        if path in ('/v2.0/certificates/signing',
+                    '/v3/OS-SIMPLE-CERT/certificates'):
+            return 200, {}, self.signing_cert
+        if path in ('/v2.0/certificates/ca', '/v3/OS-SIMPLE-CERT/ca'):
+            return 200, {}, self.ca_cert
+
+        if path.startswith('/v2.0/tokens/'):
+            token_id = path[len('/v2.0/tokens/'):]
+        elif path == '/v3/auth/tokens':
+            token_id = environ.get('HTTP_X_SUBJECT_TOKEN')
+        else:
+            return 404, {}, {}
+
+        body = self._tokens.get(token_id)
+        if body is None:
+            return 404, {}, {}
+        return 200, {'X-Subject-Token': token_id}, body
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.requests += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        status, headers, body = self._route(environ)
+        if isinstance(body, dict):
+            headers['Content-Type'] = 'application/json'
+            body = jsonutils.dumps(body)
+        else:
+            headers['Content-Type'] = 'text/plain'
+
+        start_response('%d Fake' % status, list(headers.items()))
+        return [body.encode('utf-8')]
+
+
+def mint_token(keystone, token_format, version):
+    """Return the ID of a new token that the keystone accepts."""
+    if version == 'v3.0':
+        body = fixture.V3Token()
+        body.set_project_scope()
+    else:
+        body = fixture.V2Token()
+        body.set_scope()
+    body.add_role()
+
+    if token_format == 'pki':
+        return cms.cms_sign_token(jsonutils.dumps(body), SIGNING_CERT,
+                                  SIGNING_KEY)
+    elif token_format == 'pkiz':
+        return cms.pkiz_sign(jsonutils.dumps(body), SIGNING_CERT, SIGNING_KEY)
+
+    token_id = uuid.uuid4().hex
+    if version != 'v3.0':
+        body['access']['token']['id'] = token_id
+    keystone.add_token(token_id, body)
+    return token_id
+
+
+def call(app, token):
+    """Make a request with the token, return True if it was accepted."""
+    environ = {'REQUEST_METHOD': 'GET',
+               'PATH_INFO': '/',
+               'SERVER_NAME': 'localhost',
+               'SERVER_PORT': '80',
+               'wsgi.url_scheme': 'http',
+               'HTTP_X_AUTH_TOKEN': token}
+    status = []
+
+    def start_response(s, headers, exc_info=None):
+        status.append(s)
+
+    for _chunk in app(environ, start_response):
+        pass
+
+    return status[0].startswith('200')
+
+
+def run_concurrently(app, tokens, concurrency):
+    """Make a request with each token from concurrency threads.
+
+    :returns: The durations of the requests, the number that failed and the
+              total time taken.
+    """
+    todo = queue.Queue()
+    for token in tokens:
+        todo.put(token)
+
+    timer = timeit.default_timer
+    samples = []
+    errors = []
+
+    def worker():
+        while True:
+            try:
+                token = todo.get_nowait()
+            except queue.Empty:
+                return
+
+            start = timer()
+            ok = call(app, token)
+            samples.append(timer() - start)
+            if not ok:
+                errors.append(token)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = timer()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return samples, len(errors), timer() - start
+
+
+def run_scenario(keystone, conf, warm, cold, hit_ratio, concurrency, number):
+    signing_dir = tempfile.mkdtemp()
+
+    try:
+        conf = dict(conf, signing_dir=signing_dir)
+        app = auth_token.AuthProtocol(auth_token.echo_app, conf)
+
+        for token in warm:
+            call(app, token)
+
+        cold = iter(cold)
+        tokens = [random.choice(warm) if random.random() < hit_ratio
+                  else next(cold) for _ in range(number)]
+
+        keystone.requests = 0
+        samples, errors, elapsed = run_concurrently(app, tokens, concurrency)
+        identity_requests = keystone.requests
+    finally:
+        shutil.rmtree(signing_dir)
+
+    timing = benchutils.summarize(samples)
+
+    row = collections.OrderedDict()
+    row['requests_per_sec'] = number / elapsed
+    row['p50_ms'] = timing['p50_us'] / 1e3
+    row['p99_ms'] = timing['p99_us'] / 1e3
+    row['identity_requests'] = identity_requests
+    row['errors'] = errors
+    return row
+
+
+def run(args):
+    keystone = FakeKeystone(latency=args.latency)
+    keystone.start()
+
+    mode = 'eventlet' if args.eventlet else 'thread'
+    results = []
+
+    try:
+        for version in args.auth_versions:
+            for token_format in args.formats:
+                # every scenario uses a new middleware with an empty cache,
+                # so the same tokens can be used by each of them.
+                warm = [mint_token(keystone, token_format, version)
+                        for _ in range(WARM_TOKENS)]
+                cold = [mint_token(keystone, token_format, version)
+                        for _ in range(args.number)]
+
+                for strategy in args.strategies:
+                    conf = {'identity_uri': keystone.url,
+                            'auth_uri': keystone.url,
+                            'auth_version': version,
+                            'admin_user': 'admin',
+                            'admin_password': 'password',
+                            'admin_tenant_name': 'admin'}
+                    if strategy != 'none':
+                        conf['memcache_security_strategy'] = strategy
+                        conf['memcache_secret_key'] = 'secret'
+
+                    for hit_ratio in args.hit_ratios:
+                        for concurrency in args.concurrency:
+                            row = collections.OrderedDict()
+                            row['version'] = version
+                            row['format'] = token_format
+                            row['strategy'] = strategy
+                            row['hit_ratio'] = hit_ratio
+                            row['mode'] = mode
+                            row['concurrency'] = concurrency
+                            row.update(run_scenario(keystone, conf, warm,
+                                                    cold, hit_ratio,
+                                                    concurrency,
+                                                    args.number))
+                            results.append(row)
+    finally:
+        keystone.stop()
+
+    return results
+
+
+def main():
+    parser = benchutils.get_parser(__doc__.splitlines()[0], number=200)
+    parser.add_argument('--latency', type=float, default=0.005,
+                        help='Seconds the fake identity server takes to '
+                             'answer a request. Default: %(default)s')
+    parser.add_argument('--auth-versions', type=_csv(), default=['v2.0'],
+                        help='Comma separated identity API versions to '
+                             'validate tokens with, v2.0 or v3.0. '
+                             'Default: v2.0')
+    parser.add_argument('--formats', type=_csv(), default=list(FORMATS),
+                        help='Comma separated token formats. '
+                             'Default: %s' % ','.join(FORMATS))
+    parser.add_argument('--strategies', type=_csv(),
+                        default=list(STRATEGIES),
+                        help='Comma separated memcache protection '
+                             'strategies. Default: %s' % ','.join(STRATEGIES))
+    parser.add_argument('--hit-ratios', type=_csv(float), default=[0.0, 0.9],
+                        help='Comma separated proportions of requests made '
+                             'with a cached token. Default: 0.0,0.9')
+    parser.add_argument('--concurrency', type=_csv(int), default=[1, 8],
+                        help='Comma separated numbers of concurrent '
+                             'requests. Default: 1,8')
+    parser.add_argument('--eventlet', action='store_true',
+                        help='Make concurrent requests from eventlet '
+                             'greenthreads rather than threads.')
+    args = parser.parse_args()
+    benchutils.output(run(args), args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure how token and catalog processing scales with the catalog size.
+
+Run from the top of a source checkout::
+
+    $ python tools/benchmarks/bench_catalog.py [--json] [--scales 20:250:500]
+
+v2.0 and v3 tokens are generated with keystoneclient.fixture for each of
+--scales, given as services:regions:roles. Every service has an endpoint in
+every region, so a scale of 20:250:500 produces a catalog of 5000 endpoints
+(with a public, admin and internal URL each) and a token with 500 roles.
+
+For each token the time taken to decode it from JSON, create an AccessInfo
+from it, look up endpoints in its service catalog, convert a v3 catalog to
+the v2 format, build the headers that auth_token passes to the service and
+encode the token as JSON is reported. The lookups are for the last service
+and region in the catalog, which is the most that has to be searched.
+
+Discover.url_for is measured against a version document listing --versions
+versions. For these rows endpoints is the number of versions.
+"""
+
+import collections
+
+import benchutils  # noqa
+
+from keystoneclient import _discover  # noqa
+from keystoneclient import access  # noqa
+from keystoneclient import fixture  # noqa
+from keystoneclient.middleware import auth_token  # noqa
+from keystoneclient.openstack.common import jsonutils  # noqa
+
+
+DEFAULT_SCALES = [(5, 2, 5), (20, 50, 100), (20, 250, 500)]
+
+# the endpoint type of a public URL in each version of the catalog.
+PUBLIC = {'v2.0': 'publicURL', 'v3': 'public'}
+
+
+def _scale(value):
+    return tuple(int(v) for v in value.split(':'))
+
+
+def _scales(value):
+    return [_scale(v) for v in value.split(',')]
+
+
+def _service_type(i):
+    return 'service%d' % i
+
+
+def _region(i):
+    return 'Region%d' % i
+
+
+def _url(service, region, interface):
+    return 'https://%s.%s.example.com/%s' % (service, region, interface)
+
+
+def make_v2_token(services, regions, roles):
+    token = fixture.V2Token()
+    token.set_scope()
+
+    for i in range(roles):
+        token.add_role(name='role%d' % i)
+
+    for i in range(services):
+        service_type = _service_type(i)
+        service = token.add_service(service_type, name=service_type)
+        for j in range(regions):
+            region = _region(j)
+            service.add_endpoint(_url(service_type, region, 'public'),
+                                 admin=_url(service_type, region, 'admin'),
+                                 internal=_url(service_type, region,
+                                               'internal'),
+                                 region=region)
+
+    return token
+
+
+def make_v3_token(services, regions, roles):
+    token = fixture.V3Token()
+    token.set_project_scope()
+
+    for i in range(roles):
+        token.add_role(name='role%d' % i)
+
+    for i in range(services):
+        service_type = _service_type(i)
+        service = token.add_service(service_type, name=service_type)
+        for j in range(regions):
+            region = _region(j)
+            service.add_standard_endpoints(
+                public=_url(service_type, region, 'public'),
+                admin=_url(service_type, region, 'admin'),
+                internal=_url(service_type, region, 'internal'),
+                region=region)
+
+    return token
+
+
+def make_version_data(versions):
+    """Return a version document listing a number of v3 minor versions."""
+    values = [fixture.V2Discovery('https://identity.example.com/v2.0')]
+    for i in range(versions - 1):
+        values.append(fixture.V3Discovery('https://identity.example.com/v3',
+                                          id='v3.%d' % i))
+    return {'versions': {'values': values}}
+
+
+class _Response(object):
+
+    def __init__(self, body):
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+class _Session(object):
+    """Answer Discover's request for the version document."""
+
+    def __init__(self, body):
+        self.body = body
+
+    def get(self, url, **kwargs):
+        return _Response(self.body)
+
+
+def _time(row, operation, func, number):
+    timing = benchutils.time_calls(func, number)
+
+    row = collections.OrderedDict(row)
+    row['operation'] = operation
+    row['ops_per_sec'] = timing['ops_per_sec']
+    row['mean_us'] = timing['mean_us']
+    row['p99_us'] = timing['p99_us']
+    return row
+
+
+def run_token(app, version, token, scale, number):
+    services, regions, roles = scale
+    service_type = _service_type(services - 1)
+    region = _region(regions - 1)
+    endpoint_type = PUBLIC[version]
+
+    raw = jsonutils.dumps(token)
+    body = jsonutils.loads(raw)
+    auth_ref = access.AccessInfo.factory(body=body)
+    catalog = auth_ref.service_catalog
+
+    row = collections.OrderedDict()
+    row['token'] = version
+    row['services'] = services
+    row['regions'] = regions
+    row['roles'] = roles
+    row['endpoints'] = services * regions
+    row['bytes'] = len(raw)
+
+    def get_endpoints():
+        catalog.get_endpoints(service_type=service_type,
+                              endpoint_type=endpoint_type,
+                              region_name=region)
+
+    def url_for():
+        catalog.url_for(service_type=service_type,
+                        endpoint_type=endpoint_type,
+                        region_name=region)
+
+    operations = [('loads', lambda: jsonutils.loads(raw)),
+                  ('factory', lambda: access.AccessInfo.factory(body=body)),
+                  ('get_endpoints', get_endpoints),
+                  ('url_for', url_for)]
+
+    if version == 'v3':
+        data = catalog.get_data()
+        operations.append(('v3_to_v2_catalog',
+                           lambda: auth_token._v3_to_v2_catalog(data)))
+
+    operations.extend([('build_user_headers',
+                        lambda: app._build_user_headers(body)),
+                       ('dumps', lambda: jsonutils.dumps(body))])
+
+    return [_time(row, operation, func, number)
+            for operation, func in operations]
+
+
+def run_discover(versions, number):
+    body = make_version_data(versions)
+    session = _Session(body)
+    disc = _discover.Discover(session, 'https://identity.example.com')
+
+    row = collections.OrderedDict()
+    row['token'] = 'discovery'
+    row['services'] = 0
+    row['regions'] = 0
+    row['roles'] = 0
+    row['endpoints'] = versions
+    row['bytes'] = len(jsonutils.dumps(body))
+
+    return [
+        _time(row, 'discover',
+              lambda: _discover.Discover(session,
+                                         'https://identity.example.com'),
+              number),
+        _time(row, 'url_for', lambda: disc.url_for((3, 0)), number)]
+
+
+def run(args):
+    conf = {'identity_uri': 'https://identity.example.com:35357',
+            'auth_uri': 'https://identity.example.com:5000'}
+    app = auth_token.AuthProtocol(auth_token.echo_app, conf)
+
+    results = []
+    for scale in args.scales:
+        results.extend(run_token(app, 'v2.0', make_v2_token(*scale), scale,
+                                 args.number))
+        results.extend(run_token(app, 'v3', make_v3_token(*scale), scale,
+                                 args.number))
+
+    results.extend(run_discover(args.versions, args.number))
+    return results
+
+
+def main():
+    parser = benchutils.get_parser(__doc__.splitlines()[0], number=100)
+    parser.add_argument('--scales', type=_scales, default=DEFAULT_SCALES,
+                        help='Comma separated sizes of token to generate, '
+                             'each given as services:regions:roles. '
+                             'Default: %s' % ','.join('%d:%d:%d' % s for s
+                                                      in DEFAULT_SCALES))
+    parser.add_argument('--versions', type=int, default=100,
+                        help='The number of versions in the version '
+                             'document used for discovery. '
+                             'Default: %(default)s')
+    args = parser.parse_args()
+    benchutils.output(run(args), args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Time decoding and hashing PKI and PKIZ tokens of different sizes.
+
+Run from the top of a source checkout::
+
+    $ python tools/benchmarks/bench_cms.py [--json] [--sizes 2,8,64]
+
+Tokens of each size, in KB, are made of random bytes, so nothing is signed
+and openssl isn't run. Each operation is timed as keystoneclient.common.cms
+does it and, as "previous", as it was done before the tokens were decoded
+as bytes: slicing and concatenating lines, replacing characters in several
+passes and encoding the token for each hash algorithm.
+"""
+
+import base64
+import collections
+import os
+import zlib
+
+import benchutils  # noqa
+
+from keystoneclient.common import cms  # noqa
+
+
+HASH_ALGORITHMS = ['sha256', 'md5']
+
+
+def previous_token_to_cms(signed_text):
+    copy_of_text = signed_text.replace('-', '/')
+
+    formatted = '-----BEGIN CMS-----\n'
+    line_length = 64
+    while len(copy_of_text) > 0:
+        if (len(copy_of_text) > line_length):
+            formatted += copy_of_text[:line_length]
+            copy_of_text = copy_of_text[line_length:]
+        else:
+            formatted += copy_of_text
+            copy_of_text = ''
+        formatted += '\n'
+
+    formatted += '-----END CMS-----\n'
+    # cms_verify() encoded it.
+    return bytearray(formatted, 'utf-8')
+
+
+def previous_cms_to_token(cms_text):
+    signed_text = cms_text.replace('/', '-')
+    signed_text = signed_text.replace('-----BEGIN CMS-----', '')
+    signed_text = signed_text.replace('-----END CMS-----', '')
+    return signed_text.replace('\n', '')
+
+
+def previous_pkiz_uncompress(signed_text):
+    text = signed_text[len(cms.PKIZ_PREFIX):].encode('utf-8')
+    return zlib.decompress(base64.urlsafe_b64decode(text))
+
+
+def previous_hash(token_id):
+    return [cms.cms_hash_token(token_id, mode=mode)
+            for mode in HASH_ALGORITHMS]
+
+
+def make_tokens(size):
+    """Return a PKI token and a PKIZ token of about size bytes."""
+    der = os.urandom(size * 3 // 4)
+    pki = 'MII' + base64.b64encode(der).decode('ascii').replace('/', '-')
+
+    # compressed random data would be much larger than a real PKIZ token.
+    pem = cms.token_to_cms(pki).encode('utf-8')
+    pkiz = cms.PKIZ_PREFIX + base64.urlsafe_b64encode(
+        zlib.compress(pem)).decode('ascii')
+    return pki, pkiz
+
+
+def _sizes(value):
+    return [int(size) for size in value.split(',')]
+
+
+def run(args):
+    results = []
+
+    for size in args.sizes:
+        pki, pkiz = make_tokens(size * 1024)
+        formatted = cms.token_to_cms(pki)
+
+        operations = [
+            ('token_to_cms', pki,
+             cms.token_to_pem, previous_token_to_cms),
+            ('cms_to_token', formatted,
+             cms.cms_to_token, previous_cms_to_token),
+            ('pkiz_uncompress', pkiz,
+             cms.pkiz_uncompress, previous_pkiz_uncompress),
+            ('hash_token', pki,
+             lambda t: cms.cms_hash_token_modes(t, HASH_ALGORITHMS),
+             previous_hash),
+        ]
+
+        for name, value, func, previous in operations:
+            current = benchutils.time_calls(lambda: func(value), args.number)
+            before = benchutils.time_calls(lambda: previous(value),
+                                           args.number)
+
+            row = collections.OrderedDict()
+            row['operation'] = name
+            row['kb'] = size
+            row['bytes'] = len(value)
+            row['mean_us'] = current['mean_us']
+            row['p99_us'] = current['p99_us']
+            row['previous_mean_us'] = before['mean_us']
+            row['speedup'] = round(before['mean_us'] / current['mean_us'], 2)
+            results.append(row)
+
+    return results
+
+
+def main():
+    parser = benchutils.get_parser(__doc__.splitlines()[0], number=1000)
+    parser.add_argument('--sizes', type=_sizes, default=[2, 4, 8, 16, 32, 64],
+                        help='Comma separated token sizes, in KB. '
+                             'Default: 2,4,8,16,32,64')
+    args = parser.parse_args()
+    benchutils.output(run(args), args)
+
+
+if __name__ == '__main__':
+    main()
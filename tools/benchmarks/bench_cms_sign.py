@@ -0,0 +1,125 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure how many PKI and PKIZ tokens can be issued per second.
+
+Run from the top of a source checkout::
+
+    $ python tools/benchmarks/bench_cms_sign.py [--json] [--processes 4]
+
+v3 tokens with small and large catalogs are signed with the example
+certificates in examples/pki. "openssl" is cms_sign_token() and pkiz_sign(),
+which start openssl for every token. "signer" is a keystoneclient Signer
+signing one token at a time, and "sign_many" signs batches of --batch tokens
+in this process and then in --processes processes.
+"""
+
+import collections
+import multiprocessing
+import os
+
+import benchutils  # noqa
+import bench_catalog  # noqa
+
+from keystoneclient.common import cms  # noqa
+from keystoneclient.openstack.common import jsonutils  # noqa
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+SIGNING_CERT = os.path.join(ROOT, 'examples', 'pki', 'certs',
+                            'signing_cert.pem')
+SIGNING_KEY = os.path.join(ROOT, 'examples', 'pki', 'private',
+                           'signing_key.pem')
+
+
+def make_payloads():
+    return [('v3_token_small',
+             jsonutils.dumps(bench_catalog.make_v3_token(5, 2, 5))),
+            ('v3_token_large',
+             jsonutils.dumps(bench_catalog.make_v3_token(20, 50, 100)))]
+
+
+def _row(method, token_format, payload, processes, batch, result):
+    row = collections.OrderedDict()
+    row['method'] = method
+    row['format'] = token_format
+    row['payload'] = payload
+    row['processes'] = processes
+    row['tokens_per_sec'] = round(result['ops_per_sec'] * batch, 1)
+    row['mean_us_per_token'] = round(result['mean_us'] / batch, 2)
+    return row
+
+
+def run(args):
+    results = []
+    signer = cms.Signer(SIGNING_CERT, SIGNING_KEY)
+    pool_signer = cms.Signer(SIGNING_CERT, SIGNING_KEY,
+                             processes=args.processes)
+
+    try:
+        for name, text in make_payloads():
+            batch = [text] * args.batch
+            # start the processes before they are timed.
+            pool_signer.sign_many(batch[:2])
+
+            for token_format, pkiz in (('pki', False), ('pkiz', True)):
+                if pkiz:
+                    openssl = lambda: cms.pkiz_sign(text, SIGNING_CERT,
+                                                    SIGNING_KEY)
+                    one = lambda: signer.pkiz_sign(text)
+                else:
+                    openssl = lambda: cms.cms_sign_token(text, SIGNING_CERT,
+                                                         SIGNING_KEY)
+                    one = lambda: signer.sign_token(text)
+
+                if not args.skip_openssl:
+                    result = benchutils.time_calls(openssl,
+                                                   args.openssl_number)
+                    results.append(_row('openssl', token_format, name, 0, 1,
+                                        result))
+
+                result = benchutils.time_calls(one, args.number)
+                results.append(_row('signer', token_format, name, 0, 1,
+                                    result))
+
+                number = max(1, args.number // args.batch)
+                for each in (signer, pool_signer):
+                    result = benchutils.time_calls(
+                        lambda: each.sign_many(batch, pkiz=pkiz), number)
+                    results.append(_row('sign_many', token_format, name,
+                                        each.processes, args.batch, result))
+    finally:
+        pool_signer.close()
+
+    return results
+
+
+def main():
+    parser = benchutils.get_parser(__doc__.splitlines()[0], number=500)
+    parser.add_argument('--openssl-number', type=int, default=50,
+                        help='The number of tokens to sign with openssl. '
+                             'Default: 50')
+    parser.add_argument('--skip-openssl', action='store_true',
+                        help='Don\'t sign with openssl.')
+    parser.add_argument('--batch', type=int, default=100,
+                        help='The number of tokens signed by each call to '
+                             'sign_many. Default: 100')
+    parser.add_argument('--processes', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='The processes that sign_many signs with. '
+                             'Default: the number of CPUs')
+    args = parser.parse_args()
+    benchutils.output(run(args), args)
+
+
+if __name__ == '__main__':
+    main()
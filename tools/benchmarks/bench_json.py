@@ -0,0 +1,103 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the JSON implementations that keystoneclient can use.
+
+Run from the top of a source checkout::
+
+    $ python tools/benchmarks/bench_json.py [--json] [--backends orjson,json]
+
+Each installed implementation (see keystoneclient._json) decodes and encodes
+payloads like those keystoneclient handles: a password authentication
+request, a version discovery document and v2.0 and v3 tokens with small and
+large catalogs. Documents are decoded from text and from the bytes of a
+response body. The "json" backend is the standard library through jsonutils,
+which is what was used before.
+"""
+
+import collections
+
+import benchutils  # noqa
+import bench_catalog  # noqa
+
+from keystoneclient import _json  # noqa
+
+
+def make_payloads():
+    auth = {'auth': {'identity': {'methods': ['password'],
+                                  'password': {'user': {
+                                      'name': 'admin',
+                                      'domain': {'name': 'Default'},
+                                      'password': 'secret'}}},
+                     'scope': {'project': {'name': 'admin',
+                                           'domain': {'name': 'Default'}}}}}
+
+    return [('auth_request', auth),
+            ('versions', bench_catalog.make_version_data(10)),
+            ('v2_token_small', bench_catalog.make_v2_token(5, 2, 5)),
+            ('v3_token_small', bench_catalog.make_v3_token(5, 2, 5)),
+            ('v2_token_large', bench_catalog.make_v2_token(20, 50, 100)),
+            ('v3_token_large', bench_catalog.make_v3_token(20, 50, 100))]
+
+
+def _backends(value):
+    return value.split(',')
+
+
+def run(args):
+    payloads = make_payloads()
+    results = []
+
+    for backend in args.backends:
+        try:
+            _json.use(backend)
+        except ImportError:
+            continue
+
+        for name, payload in payloads:
+            text = _json.dumps(payload)
+            data = text.encode('utf-8')
+
+            loads_text = benchutils.time_calls(lambda: _json.loads(text),
+                                               args.number)
+            loads_bytes = benchutils.time_calls(lambda: _json.loads(data),
+                                                args.number)
+            dumps = benchutils.time_calls(lambda: _json.dumps(payload),
+                                          args.number)
+
+            row = collections.OrderedDict()
+            row['backend'] = backend
+            row['payload'] = name
+            row['bytes'] = len(data)
+            row['loads_text_us'] = loads_text['mean_us']
+            row['loads_bytes_us'] = loads_bytes['mean_us']
+            row['dumps_us'] = dumps['mean_us']
+            row['loads_mb_per_sec'] = (loads_bytes['ops_per_sec'] *
+                                       len(data) / 1e6)
+            results.append(row)
+
+    return results
+
+
+def main():
+    default = [name for name, _load in _json.BACKENDS]
+    parser = benchutils.get_parser(__doc__.splitlines()[0], number=200)
+    parser.add_argument('--backends', type=_backends, default=default,
+                        help='Comma separated implementations to compare. '
+                             'Those that aren\'t installed are skipped. '
+                             'Default: %s' % ','.join(default))
+    args = parser.parse_args()
+    benchutils.output(run(args), args)
+
+
+if __name__ == '__main__':
+    main()
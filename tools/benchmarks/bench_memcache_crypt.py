@@ -0,0 +1,73 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure the throughput of the memcache protection strategies.
+
+Run from the top of a source checkout::
+
+    $ python tools/benchmarks/bench_memcache_crypt.py [--json]
+
+For each strategy and payload size this reports how many values can be
+protected and unprotected per second, and how much larger the protected value
+stored in the cache is than the original data.
+"""
+
+import collections
+import os
+
+import benchutils  # noqa
+
+from keystoneclient.middleware import memcache_crypt  # noqa
+
+
+STRATEGIES = (b'MAC', b'ENCRYPT', b'AEAD')
+SIZES = (256, 1024, 4096, 16384, 65536)
+
+
+def run(number):
+    results = []
+
+    for strategy in STRATEGIES:
+        keys = memcache_crypt.derive_keys(b'token', b'secret', strategy)
+
+        for size in SIZES:
+            data = os.urandom(size)
+            protected = memcache_crypt.protect_data(keys, data)
+
+            protect = benchutils.time_calls(
+                lambda: memcache_crypt.protect_data(keys, data), number)
+            unprotect = benchutils.time_calls(
+                lambda: memcache_crypt.unprotect_data(keys, protected),
+                number)
+
+            row = collections.OrderedDict()
+            row['strategy'] = strategy.decode('ascii')
+            row['size'] = size
+            row['stored_size'] = len(protected)
+            row['protect_per_sec'] = protect['ops_per_sec']
+            row['protect_mb_per_sec'] = protect['ops_per_sec'] * size / 1e6
+            row['unprotect_per_sec'] = unprotect['ops_per_sec']
+            row['unprotect_mb_per_sec'] = (unprotect['ops_per_sec'] *
+                                           size / 1e6)
+            results.append(row)
+
+    return results
+
+
+def main():
+    parser = benchutils.get_parser(__doc__.splitlines()[0])
+    args = parser.parse_args()
+    benchutils.output(run(args.number), args)
+
+
+if __name__ == '__main__':
+    main()
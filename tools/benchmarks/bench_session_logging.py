@@ -0,0 +1,89 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure the overhead of Session.request with and without debug logging.
+
+Run from the top of a source checkout::
+
+    $ python tools/benchmarks/bench_session_logging.py [--json]
+
+Requests are answered in process by a fake transport, so the results are the
+time spent in the session itself. Debug log records are built but discarded
+by a null handler.
+"""
+
+import collections
+import logging
+
+import benchutils  # noqa
+import requests
+
+from keystoneclient import session  # noqa
+
+
+SIZES = (100, 10000, 1000000)
+
+
+class FakeTransport(object):
+    """Return a canned JSON response without any network traffic."""
+
+    def __init__(self, size):
+        body = '{"data": "%s"}' % ('x' * size)
+        self.content = body.encode('utf-8')
+
+    def request(self, method, url, **kwargs):
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.headers['Content-Type'] = 'application/json'
+        resp.headers['X-Subject-Token'] = 'token'
+        resp._content = self.content
+        resp.url = url
+        return resp
+
+
+def run(number):
+    logger = logging.getLogger(session.__name__)
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    results = []
+
+    for level in (logging.INFO, logging.DEBUG):
+        logger.setLevel(level)
+
+        for size in SIZES:
+            sess = session.Session(session=FakeTransport(size))
+            timing = benchutils.time_calls(
+                lambda: sess.post('http://127.0.0.1:5000/v3/auth/tokens',
+                                  headers={'X-Auth-Token': 'token'},
+                                  json={'password': 'secret'}),
+                number)
+
+            row = collections.OrderedDict()
+            row['debug_logging'] = level == logging.DEBUG
+            row['response_size'] = size
+            row['requests_per_sec'] = timing['ops_per_sec']
+            row['mean_us'] = timing['mean_us']
+            row['p99_us'] = timing['p99_us']
+            results.append(row)
+
+    return results
+
+
+def main():
+    parser = benchutils.get_parser(__doc__.splitlines()[0])
+    args = parser.parse_args()
+    benchutils.output(run(args.number), args)
+
+
+if __name__ == '__main__':
+    main()
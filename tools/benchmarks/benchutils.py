@@ -0,0 +1,92 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Helpers shared by the benchmark scripts in this directory.
+
+Each benchmark produces a list of result rows (dicts). The rows are printed as
+a table or, with --json, as a JSON document so that results can be collected
+and compared between runs.
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+import prettytable
+
+# make the benchmarks runnable from a source checkout.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+from keystoneclient.openstack.common import jsonutils  # noqa
+
+
+def get_parser(description, number=1000):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--number', type=int, default=number,
+                        help='How many times to run each measurement. '
+                             'Default: %(default)s')
+    parser.add_argument('--json', action='store_true',
+                        help='Output the results as JSON.')
+    return parser
+
+
+def percentile(samples, pct):
+    """Return the pct percentile of a sorted list of samples."""
+    if not samples:
+        return 0.0
+    index = int(round(pct / 100.0 * (len(samples) - 1)))
+    return samples[index]
+
+
+def summarize(samples):
+    """Summarize a list of durations in seconds."""
+    samples = sorted(samples)
+    total = sum(samples)
+    count = len(samples)
+    return {'count': count,
+            'ops_per_sec': count / total if total else 0.0,
+            'mean_us': total / count * 1e6 if count else 0.0,
+            'p50_us': percentile(samples, 50) * 1e6,
+            'p99_us': percentile(samples, 99) * 1e6}
+
+
+def time_calls(func, number):
+    """Call func number times and summarize how long each call took."""
+    timer = timeit.default_timer
+    samples = []
+
+    for _ in range(number):
+        start = timer()
+        func()
+        samples.append(timer() - start)
+
+    return summarize(samples)
+
+
+def output(results, args):
+    """Print a list of result rows in the format requested by args."""
+    if args.json:
+        print(jsonutils.dumps(results, indent=2, sort_keys=True))
+        return
+
+    if not results:
+        return
+
+    fields = list(results[0].keys())
+    table = prettytable.PrettyTable(fields)
+    table.align = 'r'
+    for row in results:
+        table.add_row([('%.2f' % row[f]) if isinstance(row[f], float)
+                       else row[f] for f in fields])
+    print(table)